@@ -0,0 +1,300 @@
+"""Persistent cache tier shared by all workers and kept across restarts.
+
+One SQLite database in WAL mode. Reads go through a memory-mapped file
+(``CACHE_MMAP_MB``), and every process and thread opens its own connection,
+so uvicorn workers share entries without a server. A small in-process LRU sits
+in front of it for the hottest entries, and :meth:`PersistentCache.warm`
+fills that LRU at startup from the most recently used rows.
+
+    cache = get_cache()
+    key = cache_key("search", payload)
+    hit = cache.get("search", key)
+    if hit is None:
+        cache.set("search", key, compute(), tag=version)
+
+Keys are SHA‑256 hashes of the namespace and a JSON payload. Callers put
+what makes a value stale into the payload: the model id, the version and its
+ingest stamp. ``tag`` groups entries for :meth:`invalidate`. Once
+``CACHE_BUDGET_MB`` is exceeded, entries are evicted by last access.
+Failures of the cache itself are logged and count as misses; they never fail
+a request.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterable, Tuple
+
+from app.metrics import metrics
+from config import (
+    CACHE_BUDGET_MB,
+    CACHE_MEMORY_ENTRIES,
+    CACHE_MMAP_MB,
+    CACHE_NAMESPACES,
+    CACHE_PATH,
+    CACHE_WARM_ENTRIES,
+)
+
+__all__ = ["PersistentCache", "cache_key", "get_cache"]
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key       TEXT PRIMARY KEY,
+    namespace TEXT NOT NULL,
+    tag       TEXT,
+    value     BLOB NOT NULL,
+    size      INTEGER NOT NULL,
+    accessed  REAL NOT NULL,
+    hits      INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed);
+CREATE INDEX IF NOT EXISTS entries_tag ON entries (namespace, tag);
+"""
+
+# access times are written back in batches – a write per read would serialise readers
+_TOUCH_FLUSH_SECONDS = 2.0
+# the size budget is checked every this many writes
+_EVICT_EVERY = 64
+
+
+def cache_key(namespace: str, payload: Any) -> str:
+    """Stable hash of *payload* (JSON‑serialisable, dict order irrelevant)."""
+    blob = json.dumps(payload, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(f"{namespace}\0{blob}".encode("utf-8")).hexdigest()
+
+
+class PersistentCache:
+    """SQLite‑backed key/value cache with an LRU size budget."""
+
+    def __init__(
+        self,
+        path: str | Path,
+        *,
+        budget_bytes: int = CACHE_BUDGET_MB * 2**20,
+        mmap_bytes: int = CACHE_MMAP_MB * 2**20,
+        memory_entries: int = CACHE_MEMORY_ENTRIES,
+        namespaces: Iterable[str] = CACHE_NAMESPACES,
+    ) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.budget_bytes = budget_bytes
+        self.mmap_bytes = mmap_bytes
+        self.memory_entries = memory_entries
+        self.namespaces = frozenset(namespaces)
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, Any]" = OrderedDict()
+        self._touched: Dict[str, float] = {}
+        self._last_flush = time.monotonic()
+        self._writes = 0
+        with self._conn() as conn:
+            conn.executescript(_SCHEMA)
+
+    def enabled(self, namespace: str) -> bool:
+        return namespace in self.namespaces
+
+    # ------------------------------------------------------------------
+    # connections
+    # ------------------------------------------------------------------
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA mmap_size={int(self.mmap_bytes)}")
+            self._local.conn = conn
+        return conn
+
+    # ------------------------------------------------------------------
+    # in-process tier
+    # ------------------------------------------------------------------
+
+    def _remember(self, key: str, value: Any) -> None:
+        if self.memory_entries <= 0:
+            return
+        with self._lock:
+            self._memory[key] = value
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def _touch(self, key: str) -> None:
+        with self._lock:
+            self._touched[key] = time.time()
+            if time.monotonic() - self._last_flush < _TOUCH_FLUSH_SECONDS:
+                return
+            touched, self._touched = self._touched, {}
+            self._last_flush = time.monotonic()
+        try:
+            with self._conn() as conn:
+                conn.executemany(
+                    "UPDATE entries SET accessed = ?, hits = hits + 1 WHERE key = ?",
+                    [(ts, k) for k, ts in touched.items()],
+                )
+        except sqlite3.Error as exc:
+            logger.warning("Cache access-time flush failed: %s", exc)
+
+    # ------------------------------------------------------------------
+    # public API
+    # ------------------------------------------------------------------
+
+    def get(self, namespace: str, key: str) -> Any | None:
+        if not self.enabled(namespace):
+            return None
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+        if value is None:
+            try:
+                row = self._conn().execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+            except sqlite3.Error as exc:
+                logger.warning("Cache read failed: %s", exc)
+                row = None
+            if row is None:
+                metrics.incr(f"cache.{namespace}.misses")
+                return None
+            value = pickle.loads(row[0])
+            self._remember(key, value)
+        metrics.incr(f"cache.{namespace}.hits")
+        self._touch(key)
+        return value
+
+    def set(self, namespace: str, key: str, value: Any, *, tag: str | None = None) -> None:
+        if not self.enabled(namespace):
+            return
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(blob) > self.budget_bytes // 16:
+            return  # one entry must not flush a sixteenth of the cache
+        self._remember(key, value)
+        try:
+            with self._conn() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO entries (key, namespace, tag, value, size, accessed) VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, namespace, tag, blob, len(blob), time.time()),
+                )
+        except sqlite3.Error as exc:
+            logger.warning("Cache write failed: %s", exc)
+            return
+        with self._lock:
+            self._writes += 1
+            due = self._writes % _EVICT_EVERY == 0
+        if due:
+            self.evict()
+
+    def get_many(self, namespace: str, keys: Iterable[str]) -> Dict[str, Any]:
+        return {k: v for k in keys if (v := self.get(namespace, k)) is not None}
+
+    def evict(self) -> int:
+        """Drop least recently used rows until the total is ≤ 90 % of the budget."""
+        target = int(self.budget_bytes * 0.9)
+        dropped: list[str] = []
+        try:
+            conn = self._conn()
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            while total > target:
+                rows = conn.execute("SELECT key, size FROM entries ORDER BY accessed LIMIT 256").fetchall()
+                if not rows:
+                    break
+                drop = []
+                for key, size in rows:
+                    drop.append((key,))
+                    total -= size
+                    if total <= target:
+                        break
+                with conn:
+                    conn.executemany("DELETE FROM entries WHERE key = ?", drop)
+                dropped += [k for (k,) in drop]
+        except sqlite3.Error as exc:
+            logger.warning("Cache eviction failed: %s", exc)
+        if dropped:
+            with self._lock:
+                for key in dropped:
+                    self._memory.pop(key, None)
+            metrics.incr("cache.evicted", len(dropped))
+        return len(dropped)
+
+    def invalidate(self, namespace: str | None = None, *, tag: str | None = None) -> int:
+        """Delete entries of *namespace* (all if None), optionally only those tagged *tag*."""
+        clauses, args = [], []
+        if namespace is not None:
+            clauses.append("namespace = ?")
+            args.append(namespace)
+        if tag is not None:
+            clauses.append("tag = ?")
+            args.append(tag)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        try:
+            with self._conn() as conn:
+                removed = conn.execute(f"DELETE FROM entries{where}", args).rowcount
+        except sqlite3.Error as exc:
+            logger.warning("Cache invalidation failed: %s", exc)
+            removed = 0
+        with self._lock:
+            self._memory.clear()  # cheap to refill; avoids tracking tags in memory
+        return removed
+
+    def warm(self, limit: int = CACHE_WARM_ENTRIES) -> int:
+        """Load the *limit* most recently used entries into the in‑process tier."""
+        limit = min(limit, self.memory_entries)
+        if limit <= 0:
+            return 0
+        try:
+            rows = self._conn().execute(
+                "SELECT key, value FROM entries ORDER BY accessed DESC LIMIT ?", (limit,)
+            ).fetchall()
+        except sqlite3.Error as exc:
+            logger.warning("Cache warm-up failed: %s", exc)
+            return 0
+        # oldest first so the most recent end up at the LRU's hot end
+        for key, blob in reversed(rows):
+            self._remember(key, pickle.loads(blob))
+        return len(rows)
+
+    def stats(self) -> Dict[str, Any]:
+        try:
+            rows: Iterable[Tuple[str, int, int]] = self._conn().execute(
+                "SELECT namespace, COUNT(*), COALESCE(SUM(size), 0) FROM entries GROUP BY namespace"
+            ).fetchall()
+        except sqlite3.Error:
+            rows = []
+        with self._lock:
+            memory = len(self._memory)
+        return {
+            "path": str(self.path),
+            "budget_bytes": self.budget_bytes,
+            "memory_entries": memory,
+            "namespaces": {ns: {"entries": n, "bytes": size} for ns, n, size in rows},
+        }
+
+
+_cache: PersistentCache | None = None
+_cache_lock = threading.Lock()
+_disabled = not CACHE_PATH
+
+
+def get_cache() -> PersistentCache | None:
+    """Process‑wide cache, or None when ``CACHE_PATH`` is empty or unusable."""
+    global _cache, _disabled
+    if _cache is None and not _disabled:
+        with _cache_lock:
+            if _cache is None and not _disabled:
+                try:
+                    _cache = PersistentCache(CACHE_PATH)
+                except (OSError, sqlite3.Error) as exc:
+                    logger.warning("Persistent cache at %s unavailable – running without it: %s", CACHE_PATH, exc)
+                    _disabled = True
+    return _cache
@@ -0,0 +1,189 @@
+"""Cooperative cancellation of in-flight requests.
+
+Each cancellable request gets a :class:`CancelToken`, registered under its
+request id (the ``X-Request-ID`` header, else a fresh uuid). A token is
+cancelled in two ways. The route's watcher does it when the client
+disconnects. ``POST /prompt/cancel/{request_id}`` does it explicitly.
+
+Cancellation is checked between pipeline stages: embedding, the modality
+searches, rerank, the generator queue, and every streamed token. Callbacks
+registered with :meth:`CancelToken.on_cancel` interrupt blocking I/O, such as
+closing the upstream Ollama stream.
+
+With several workers, the cancel call may land on a different worker from
+the request. It then leaves a marker file in ``CANCEL_DIR``, which the
+owning worker's token notices at its next check.
+"""
+
+from __future__ import annotations
+
+import logging
+import re
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from app.metrics import metrics
+from config import CANCEL_DIR
+
+__all__ = ["CancelToken", "CancelledRequestError", "CancelRegistry", "cancellations"]
+
+logger = logging.getLogger(__name__)
+
+# how often a token looks for a cross-worker marker file
+_MARKER_CHECK_SECONDS = 0.25
+# markers of requests no worker picked up are removed after this long
+_MARKER_TTL_SECONDS = 3600.0
+_REQUEST_ID = re.compile(r"^[A-Za-z0-9_-]{1,128}$")
+
+
+class CancelledRequestError(RuntimeError):
+    """Raised inside the pipeline once its request was cancelled."""
+
+    def __init__(self, request_id: str, stage: str, reason: str) -> None:
+        super().__init__(f"Request {request_id} cancelled during {stage}: {reason}")
+        self.request_id = request_id
+        self.stage = stage
+        self.reason = reason
+
+
+class CancelToken:
+    def __init__(self, request_id: str, *, marker: Path | None = None) -> None:
+        self.request_id = request_id
+        self.reason = ""
+        self._event = threading.Event()
+        self._callbacks: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+        self._marker = marker
+        self._marker_checked = 0.0
+        self.created = time.monotonic()
+
+    @property
+    def cancelled(self) -> bool:
+        if self._event.is_set():
+            return True
+        if self._marker is not None and time.monotonic() - self._marker_checked > _MARKER_CHECK_SECONDS:
+            self._marker_checked = time.monotonic()
+            if self._marker.exists():
+                self.cancel("cancelled by request id")
+        return self._event.is_set()
+
+    def cancel(self, reason: str = "cancelled") -> bool:
+        """Cancel once; runs the registered callbacks. False if already cancelled."""
+        with self._lock:
+            if self._event.is_set():
+                return False
+            self.reason = reason
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for cb in callbacks:
+            try:
+                cb()
+            except Exception:  # pragma: no cover – best effort
+                logger.debug("Cancel callback failed", exc_info=True)
+        return True
+
+    def on_cancel(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """Run *callback* on cancellation (at once if already cancelled); returns an unregister function."""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+
+                def remove() -> None:
+                    with self._lock:
+                        if callback in self._callbacks:
+                            self._callbacks.remove(callback)
+
+                return remove
+        callback()
+        return lambda: None
+
+    def raise_if_cancelled(self, stage: str) -> None:
+        if self.cancelled:
+            metrics.incr("cancel.requests")
+            metrics.incr(f"cancel.stage.{stage}")
+            metrics.observe("cancel.after_seconds", time.monotonic() - self.created)
+            raise CancelledRequestError(self.request_id, stage, self.reason)
+
+    def wait(self, timeout: float) -> bool:
+        """Sleep up to *timeout* seconds; True as soon as the token is cancelled."""
+        return self._event.wait(timeout) or self.cancelled
+
+
+class CancelRegistry:
+    """Request id → :class:`CancelToken` of this worker."""
+
+    def __init__(self, marker_dir: str | Path | None = CANCEL_DIR) -> None:
+        self.marker_dir = Path(marker_dir) if marker_dir else None
+        self._tokens: Dict[str, CancelToken] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def new_id() -> str:
+        return uuid.uuid4().hex
+
+    @staticmethod
+    def validate(request_id: str) -> str:
+        if not _REQUEST_ID.match(request_id):
+            raise ValueError("Request ids are 1–128 characters of A–Z, a–z, 0–9, '_' and '-'")
+        return request_id
+
+    def _marker(self, request_id: str) -> Path | None:
+        return self.marker_dir / request_id if self.marker_dir is not None else None
+
+    def register(self, request_id: str | None = None) -> CancelToken:
+        """Token for a new request; ValueError for a malformed or already active id."""
+        request_id = self.validate(request_id) if request_id else self.new_id()
+        marker = self._marker(request_id)
+        token = CancelToken(request_id, marker=marker)
+        with self._lock:
+            if request_id in self._tokens:
+                raise ValueError(f"Request id '{request_id}' is already in flight")
+            self._tokens[request_id] = token
+        if marker is not None:
+            marker.unlink(missing_ok=True)  # a stale cancel must not hit a new request
+        return token
+
+    def unregister(self, token: CancelToken) -> None:
+        with self._lock:
+            if self._tokens.get(token.request_id) is token:
+                del self._tokens[token.request_id]
+        marker = self._marker(token.request_id)
+        if marker is not None:
+            marker.unlink(missing_ok=True)
+
+    def cancel(self, request_id: str, reason: str = "cancelled by request id") -> bool:
+        """Cancel *request_id* here, or leave a marker for the worker that owns it.
+
+        Returns True if the request was found in this worker.
+        """
+        self.validate(request_id)
+        with self._lock:
+            token = self._tokens.get(request_id)
+        if token is not None:
+            token.cancel(reason)
+            return True
+        marker = self._marker(request_id)
+        if marker is not None:
+            marker.parent.mkdir(parents=True, exist_ok=True)
+            marker.touch()
+            self._prune_markers()
+        return False
+
+    def _prune_markers(self) -> None:
+        cutoff = time.time() - _MARKER_TTL_SECONDS
+        try:
+            for path in self.marker_dir.iterdir():
+                if path.stat().st_mtime < cutoff:
+                    path.unlink(missing_ok=True)
+        except OSError:
+            pass
+
+    def active(self) -> List[str]:
+        with self._lock:
+            return list(self._tokens)
+
+
+cancellations = CancelRegistry()
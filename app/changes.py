@@ -0,0 +1,482 @@
+"""Cross-version change index: which chunks differ between two versions.
+
+Every ingest records a fingerprint of each chunk of the version in one SQLite
+database (``CHANGE_INDEX_PATH``). A fingerprint holds the title, a SHA‑256 of
+title + text + code, and both dense vectors as float16, next to the
+compressed content. The version is then diffed against its nearest recorded
+neighbours in ``supported_versions.txt`` order, and each diff is stored as a
+*pair*. A pair is a list of ``added`` / ``removed`` / ``changed`` chunks with
+their embedding distance. Unchanged chunks are only counted.
+
+Chunks of two versions are matched in this order:
+
+1. By ``entry_id`` without its version prefix, when the titles agree too.
+2. By title. Among chunks sharing a title, identical content pairs first,
+   then the most similar text vectors.
+
+A matched pair whose hashes differ is ``changed``. Its distance is the larger
+cosine distance of the text and code vectors, so :meth:`ChangeIndex.diff`
+can hide edits that barely move the embedding (``CHANGE_MIN_DISTANCE``).
+Pairs of non-adjacent versions are diffed on first request and stored too.
+
+Like the cache tier, failures of the index are logged and never fail an
+ingest.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from collections import defaultdict
+from dataclasses import dataclass
+from hashlib import sha256
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+from app.metrics import metrics
+from config import CHANGE_INDEX_PATH, CHANGE_MIN_DISTANCE, DENSE_VECTOR_DIM
+
+__all__ = ["ChangeIndex", "ChunkRecorder", "UnknownVersionError", "forget_version", "get_change_index"]
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (
+    version  TEXT NOT NULL,
+    key      TEXT NOT NULL,
+    entry_id TEXT NOT NULL,
+    title    TEXT NOT NULL,
+    digest   TEXT NOT NULL,
+    dense    BLOB NOT NULL,
+    body     BLOB NOT NULL,
+    PRIMARY KEY (version, key)
+);
+CREATE TABLE IF NOT EXISTS pairs (
+    from_version TEXT NOT NULL,
+    to_version   TEXT NOT NULL,
+    added        INTEGER NOT NULL,
+    removed      INTEGER NOT NULL,
+    changed      INTEGER NOT NULL,
+    unchanged    INTEGER NOT NULL,
+    built        REAL NOT NULL,
+    PRIMARY KEY (from_version, to_version)
+);
+CREATE TABLE IF NOT EXISTS changes (
+    from_version TEXT NOT NULL,
+    to_version   TEXT NOT NULL,
+    status       TEXT NOT NULL,
+    from_key     TEXT,
+    to_key       TEXT,
+    distance     REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS changes_pair ON changes (from_version, to_version);
+"""
+
+STATUSES = ("added", "removed", "changed")
+# only release-like names get adjacent pairs at ingest (not e.g. local project versions)
+_RELEASE = re.compile(r"^v?\d+(\.\d+)*")
+
+
+class UnknownVersionError(LookupError):
+    """The version has no recorded chunks (not ingested since the index existed)."""
+
+
+def _digest(ent: Dict[str, Any]) -> str:
+    blob = "\0".join((str(ent["title"]), str(ent["text_content"]), str(ent["code_content"])))
+    return sha256(blob.encode("utf-8")).hexdigest()[:32]
+
+
+def _key(version: str, entry_id: str) -> str:
+    return entry_id[len(version) + 1 :] if entry_id.startswith(f"{version}-") else entry_id
+
+
+def _norm_title(title: str) -> str:
+    return " ".join(title.lower().split())
+
+
+def _dense(ent: Dict[str, Any]) -> bytes:
+    vecs = np.zeros((2, DENSE_VECTOR_DIM), dtype=np.float32)
+    for i, fld in enumerate(("dense_text_content", "dense_code_snippet")):
+        vec = ent.get(fld)
+        if vec is None:
+            continue
+        # lists from the CSV path, mapped numpy rows from snapshots
+        vec = np.asarray(vec, dtype=np.float32).ravel()
+        if vec.size == DENSE_VECTOR_DIM:
+            norm = np.linalg.norm(vec)
+            vecs[i] = vec / norm if norm else vec
+    return vecs.astype(np.float16).tobytes()
+
+
+def _distance(a: np.ndarray, b: np.ndarray) -> float:
+    """Larger cosine distance of the text and code rows of two chunks (2, dim)."""
+    worst = 0.0
+    for x, y in zip(a.astype(np.float32), b.astype(np.float32)):
+        nx, ny = np.linalg.norm(x), np.linalg.norm(y)
+        if nx == 0 and ny == 0:
+            continue
+        if nx == 0 or ny == 0:
+            return 1.0
+        worst = max(worst, 1.0 - float(x @ y) / (nx * ny))
+    return round(max(worst, 0.0), 6)
+
+
+@dataclass
+class _Chunk:
+    key: str
+    title: str
+    digest: str
+    dense: np.ndarray  # (2, dim) float16: text, code
+
+
+class ChunkRecorder:
+    """Collects the fingerprints of a version while it is being ingested.
+
+    ``add`` every entity, then ``commit`` once the build succeeded. Does
+    nothing when the change index is disabled.
+    """
+
+    def __init__(self, version: str, index: "ChangeIndex | None" = None) -> None:
+        self.version = version
+        self.index = index if index is not None else get_change_index()
+        self._rows: List[Tuple[Any, ...]] = []
+
+    def add(self, ent: Dict[str, Any]) -> None:
+        if self.index is None:
+            return
+        body = {k: ent.get(k) for k in ("text_content", "code_content", "metadata", "tag")}
+        self._rows.append(
+            (
+                self.version,
+                _key(self.version, str(ent["entry_id"])),
+                str(ent["entry_id"]),
+                str(ent["title"]),
+                _digest(ent),
+                _dense(ent),
+                zlib.compress(json.dumps(body, default=str).encode("utf-8")),
+            )
+        )
+
+    def add_many(self, entities: Iterable[Dict[str, Any]]) -> None:
+        if self.index is None:
+            return
+        for ent in entities:
+            self.add(ent)
+
+    def commit(self, order: Sequence[str] | None = None) -> None:
+        if self.index is None:
+            return
+        rows, self._rows = self._rows, []
+        try:
+            self.index.record(self.version, rows)
+            self.index.diff_neighbours(self.version, order)
+        except Exception:  # the ingest itself succeeded – never fail it here
+            logger.warning("Change index update for %s failed", self.version, exc_info=True)
+
+
+class ChangeIndex:
+    """SQLite store of chunk fingerprints and version-pair diffs."""
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30.0, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # ------------------------------------------------------------------
+    # versions
+    # ------------------------------------------------------------------
+
+    def _drop_pairs(self, conn: sqlite3.Connection, version: str) -> None:
+        for table in ("pairs", "changes"):
+            conn.execute(f"DELETE FROM {table} WHERE from_version = ? OR to_version = ?", (version, version))
+
+    def record(self, version: str, rows: List[Tuple[Any, ...]]) -> None:
+        """Replace the chunks of *version*; its stored pairs are stale from now on."""
+        with self._conn() as conn:
+            conn.execute("DELETE FROM chunks WHERE version = ?", (version,))
+            self._drop_pairs(conn, version)
+            conn.executemany("INSERT OR REPLACE INTO chunks VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        logger.info("Recorded %d chunk fingerprints for version %s", len(rows), version)
+
+    def forget(self, version: str) -> None:
+        with self._conn() as conn:
+            conn.execute("DELETE FROM chunks WHERE version = ?", (version,))
+            self._drop_pairs(conn, version)
+
+    def versions(self) -> List[str]:
+        return [v for (v,) in self._conn().execute("SELECT DISTINCT version FROM chunks")]
+
+    def _chunks(self, version: str) -> List[_Chunk]:
+        rows = self._conn().execute("SELECT key, title, digest, dense FROM chunks WHERE version = ?", (version,))
+        chunks = [
+            _Chunk(key, title, digest, np.frombuffer(dense, dtype=np.float16).reshape(2, -1))
+            for key, title, digest, dense in rows
+        ]
+        if not chunks:
+            raise UnknownVersionError(f"No change catalog for version '{version}' – re-ingest it")
+        return chunks
+
+    # ------------------------------------------------------------------
+    # pairs
+    # ------------------------------------------------------------------
+
+    def diff_neighbours(self, version: str, order: Sequence[str] | None = None) -> List[Tuple[str, str]]:
+        """Diff *version* against its nearest recorded release neighbours in *order*."""
+        if order is None:
+            from app.registry import registry
+
+            order = registry.supported()
+        if version not in order or not _RELEASE.match(version):
+            return []
+        recorded = set(self.versions())
+        candidates = [v for v in order if (v == version or v in recorded) and _RELEASE.match(v)]
+        pos = candidates.index(version)
+        pairs = []
+        if pos > 0:
+            pairs.append((candidates[pos - 1], version))
+        if pos + 1 < len(candidates):
+            pairs.append((version, candidates[pos + 1]))
+        for old, new in pairs:
+            self.build_pair(old, new)
+        return pairs
+
+    def build_pair(self, from_version: str, to_version: str) -> Dict[str, int]:
+        """Diff two recorded versions and store the result; returns the counts."""
+        start = time.perf_counter()
+        old, new = self._chunks(from_version), self._chunks(to_version)
+        matched, added, removed = _match(old, new)
+
+        changes: List[Tuple[Any, ...]] = []
+        unchanged = 0
+        for o, n in matched:
+            if o.digest == n.digest:
+                unchanged += 1
+            else:
+                changes.append((from_version, to_version, "changed", o.key, n.key, _distance(o.dense, n.dense)))
+        changes += [(from_version, to_version, "added", None, n.key, 1.0) for n in added]
+        changes += [(from_version, to_version, "removed", o.key, None, 1.0) for o in removed]
+        counts = {
+            "added": len(added),
+            "removed": len(removed),
+            "changed": len(changes) - len(added) - len(removed),
+            "unchanged": unchanged,
+        }
+        with self._conn() as conn:
+            conn.execute("DELETE FROM changes WHERE from_version = ? AND to_version = ?", (from_version, to_version))
+            conn.executemany("INSERT INTO changes VALUES (?, ?, ?, ?, ?, ?)", changes)
+            conn.execute(
+                "INSERT OR REPLACE INTO pairs VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (from_version, to_version, counts["added"], counts["removed"], counts["changed"], unchanged, time.time()),
+            )
+        elapsed = time.perf_counter() - start
+        metrics.observe("changes.build_seconds", elapsed)
+        logger.info("Change index %s → %s built in %.2fs: %s", from_version, to_version, elapsed, counts)
+        return counts
+
+    def _pair(self, from_version: str, to_version: str) -> Dict[str, int] | None:
+        row = self._conn().execute(
+            "SELECT added, removed, changed, unchanged FROM pairs WHERE from_version = ? AND to_version = ?",
+            (from_version, to_version),
+        ).fetchone()
+        return dict(zip(("added", "removed", "changed", "unchanged"), row)) if row else None
+
+    def diff(
+        self,
+        from_version: str,
+        to_version: str,
+        *,
+        statuses: Sequence[str] = STATUSES,
+        min_distance: float = CHANGE_MIN_DISTANCE,
+        query_vector: np.ndarray | None = None,
+        top_k: int | None = None,
+        include_content: bool = True,
+    ) -> Dict[str, Any]:
+        """Changed chunks from *from_version* to *to_version* (diffed now if not stored yet).
+
+        ``changed`` chunks closer than *min_distance* are left out (and
+        counted as ``below_distance``). With *query_vector* the chunks are
+        ranked by similarity to it, else by distance. *top_k* caps the list.
+        """
+        unknown = set(statuses) - set(STATUSES)
+        if unknown:
+            raise ValueError(f"Unknown change status(es): {', '.join(sorted(unknown))}")
+        counts = self._pair(from_version, to_version)
+        if counts is None:
+            metrics.incr("changes.pair_misses")
+            counts = self.build_pair(from_version, to_version)
+        else:
+            metrics.incr("changes.pair_hits")
+
+        marks = ",".join("?" * len(statuses))
+        rows = self._conn().execute(
+            f"""
+            SELECT c.status, c.distance, c.from_key, c.to_key,
+                   f.entry_id, f.title, f.dense, t.entry_id, t.title, t.dense
+              FROM changes c
+              LEFT JOIN chunks f ON f.version = c.from_version AND f.key = c.from_key
+              LEFT JOIN chunks t ON t.version = c.to_version AND t.key = c.to_key
+             WHERE c.from_version = ? AND c.to_version = ? AND c.status IN ({marks})
+            """,
+            (from_version, to_version, *statuses),
+        ).fetchall()
+
+        below = 0
+        out: List[Dict[str, Any]] = []
+        for status, distance, from_key, to_key, f_id, f_title, f_dense, t_id, t_title, t_dense in rows:
+            if status == "changed" and distance < min_distance:
+                below += 1
+                continue
+            change = {
+                "status": status,
+                "title": t_title if t_title is not None else f_title,
+                "from_entry_id": f_id,
+                "to_entry_id": t_id,
+                "distance": distance,
+                "_keys": (from_key, to_key),
+            }
+            if query_vector is not None:
+                dense = np.frombuffer(t_dense if t_dense is not None else f_dense, dtype=np.float16)
+                change["score"] = round(float(dense[: len(query_vector)].astype(np.float32) @ query_vector), 6)
+            out.append(change)
+
+        rank = "score" if query_vector is not None else "distance"
+        out.sort(key=lambda c: c[rank], reverse=True)
+        if top_k is not None:
+            out = out[:top_k]
+        for change in out:
+            from_key, to_key = change.pop("_keys")
+            if include_content:
+                change["from"] = self._body(from_version, from_key)
+                change["to"] = self._body(to_version, to_key)
+        return {
+            "from_version": from_version,
+            "to_version": to_version,
+            "counts": {**counts, "below_distance": below},
+            "changes": out,
+        }
+
+    def _body(self, version: str, key: str | None) -> Dict[str, Any] | None:
+        if key is None:
+            return None
+        row = self._conn().execute("SELECT body FROM chunks WHERE version = ? AND key = ?", (version, key)).fetchone()
+        return json.loads(zlib.decompress(row[0])) if row else None
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self._conn()
+        pairs = conn.execute("SELECT from_version, to_version, added, removed, changed, unchanged FROM pairs").fetchall()
+        return {
+            "path": str(self.path),
+            "versions": dict(conn.execute("SELECT version, COUNT(*) FROM chunks GROUP BY version").fetchall()),
+            "pairs": [
+                {"from_version": f, "to_version": t, "added": a, "removed": r, "changed": c, "unchanged": u}
+                for f, t, a, r, c, u in pairs
+            ],
+        }
+
+
+def _match(old: List[_Chunk], new: List[_Chunk]) -> Tuple[List[Tuple[_Chunk, _Chunk]], List[_Chunk], List[_Chunk]]:
+    """(matched pairs, added, removed) – see the module docstring for the rules."""
+    by_key = {c.key: c for c in old}
+    matched: List[Tuple[_Chunk, _Chunk]] = []
+    rest_new: List[_Chunk] = []
+    for n in new:
+        o = by_key.get(n.key)
+        if o is not None and _norm_title(o.title) == _norm_title(n.title):
+            del by_key[n.key]
+            matched.append((o, n))
+        else:
+            rest_new.append(n)
+
+    old_groups: Dict[str, List[_Chunk]] = defaultdict(list)
+    for o in by_key.values():
+        old_groups[_norm_title(o.title)].append(o)
+    new_groups: Dict[str, List[_Chunk]] = defaultdict(list)
+    for n in rest_new:
+        new_groups[_norm_title(n.title)].append(n)
+
+    added: List[_Chunk] = []
+    for title, news in new_groups.items():
+        olds = old_groups.pop(title, [])
+        # identical content first
+        digests: Dict[str, List[_Chunk]] = defaultdict(list)
+        for o in olds:
+            digests[o.digest].append(o)
+        pending = []
+        for n in news:
+            if digests.get(n.digest):
+                o = digests[n.digest].pop()
+                olds.remove(o)
+                matched.append((o, n))
+            else:
+                pending.append(n)
+        # then greedily by text-vector similarity
+        if olds and pending:
+            sims = np.stack([n.dense[0] for n in pending]).astype(np.float32) @ np.stack(
+                [o.dense[0] for o in olds]
+            ).astype(np.float32).T
+            used_new, used_old = set(), set()
+            for flat in np.argsort(-sims, axis=None):
+                i, j = divmod(int(flat), len(olds))
+                if i in used_new or j in used_old:
+                    continue
+                used_new.add(i)
+                used_old.add(j)
+                matched.append((olds[j], pending[i]))
+                if len(used_new) == len(pending) or len(used_old) == len(olds):
+                    break
+            added += [n for i, n in enumerate(pending) if i not in used_new]
+            olds = [o for j, o in enumerate(olds) if j not in used_old]
+        else:
+            added += pending
+        if olds:
+            old_groups[title] = olds
+    removed = [o for group in old_groups.values() for o in group]
+    return matched, added, removed
+
+
+_index: ChangeIndex | None = None
+_index_lock = threading.Lock()
+_disabled = not CHANGE_INDEX_PATH
+
+
+def get_change_index() -> ChangeIndex | None:
+    """Process‑wide change index, or None when ``CHANGE_INDEX_PATH`` is empty or unusable."""
+    global _index, _disabled
+    if _index is None and not _disabled:
+        with _index_lock:
+            if _index is None and not _disabled:
+                try:
+                    _index = ChangeIndex(CHANGE_INDEX_PATH)
+                except (OSError, sqlite3.Error) as exc:
+                    logger.warning("Change index at %s unavailable – running without it: %s", CHANGE_INDEX_PATH, exc)
+                    _disabled = True
+    return _index
+
+
+def forget_version(version: str) -> None:
+    """Drop the fingerprints and pairs of a deleted version."""
+    index = get_change_index()
+    if index is None:
+        return
+    try:
+        index.forget(version)
+    except sqlite3.Error as exc:
+        logger.warning("Change index cleanup for %s failed: %s", version, exc)
@@ -30,6 +30,14 @@ class RetrieveRequest(_SnakeModel):
     ef_text: Optional[int] = None
     m_code: Optional[int] = None
     ef_code: Optional[int] = None
+    # fraction of each title's smallest sparse weights left out of the index
+    drop_ratio_build: Optional[float] = None
+
+
+class SnapshotImportRequest(RetrieveRequest):
+    # directory under SNAPSHOT_DIR; defaults to SNAPSHOT_DIR/<version_name>
+    snapshot_path: Optional[str] = None
+    verify: bool = True
 
 
 # -----------------------------------------------------------------------------
@@ -55,6 +63,7 @@ class SearchRequest(_SnakeModel):
     sparse_weight: float = 1.0
     dense_text_weight: float = 1.0
     dense_code_weight: float = 1.0
+    bm25_weight: float = 0.0
     top_k: int = 10
 
     filter_expr: Optional[str] = None
@@ -67,6 +76,34 @@ class SearchRequest(_SnakeModel):
     radius_dense_code: float = 0.5
     range_dense_code: float = 0.5
 
+    rerank: bool = False
+    rerank_candidates: Optional[int] = None
+    rerank_budget_ms: Optional[float] = None
+
+    # fraction of the sparse query's smallest weights ignored (default SPARSE_DROP_RATIO_SEARCH)
+    drop_ratio_search: Optional[float] = None
+
+    # extra code-query vectors (e.g. chunks of uploaded files)
+    code_chunks: Optional[List[str]] = None
+
+    # per-modality candidate counts (sparse / dense_text / dense_code / bm25)
+    modality_limits: Optional[Dict[str, int]] = None
+    # include the query plan in the response
+    debug: bool = False
+
+
+class DiffRequest(_SnakeModel):
+    from_version: str
+    to_version: str
+    # subset of added / removed / changed
+    statuses: List[str] = Field(default_factory=lambda: ["added", "removed", "changed"])
+    # hide changed chunks closer than this (default CHANGE_MIN_DISTANCE)
+    min_distance: Optional[float] = None
+    # rank the changes by similarity to this question instead of by distance
+    text_query: Optional[str] = None
+    top_k: Optional[int] = None
+    include_content: bool = True
+
 
 # -----------------------------------------------------------------------------
 # Retriever / generator option structures
@@ -81,6 +118,7 @@ class RetrieverOptions(_SnakeModel):
     sparse_weight: float = 1.0
     dense_text_weight: float = 1.0
     dense_code_weight: float = 1.0
+    bm25_weight: float = 0.0
     top_k: Optional[int] = None
 
     filter_expr: Optional[str] = None
@@ -93,6 +131,13 @@ class RetrieverOptions(_SnakeModel):
     radius_dense_code: float = 0.5
     range_dense_code: float = 0.5
 
+    rerank: bool = False
+    rerank_candidates: Optional[int] = None
+    rerank_budget_ms: Optional[float] = None
+    drop_ratio_search: Optional[float] = None
+
+    modality_limits: Optional[Dict[str, int]] = None
+
 
 class GeneratorOptions(_SnakeModel):
     mirostat: Optional[int] = Field(None, alias="microstat")
@@ -118,6 +163,8 @@ class GeneratorOptions(_SnakeModel):
 class APIOptions(_SnakeModel):
     retriever_options: Optional[RetrieverOptions] = None
     generator_options: Optional[GeneratorOptions] = None
+    # overlap model warm‑up / rendering with retrieval; None → server default
+    pipelined: Optional[bool] = None
 
 
 # -----------------------------------------------------------------------------
@@ -140,6 +187,9 @@ class GeneratorRequest(_SnakeModel):
     query: str
     model: str
     history: Optional[List[ChatHistory]] = None
+    # server-side history: only the new query is sent; an unknown id starts a
+    # session (seeded with *history*, if given)
+    session_id: Optional[str] = None
     file_list: Optional[List[FileModel]] = None
     additional_options: Optional[APIOptions] = None
 
@@ -0,0 +1,155 @@
+"""Content-addressed download cache shared by all API workers.
+
+Layout under ``root``::
+
+    blobs/sha256/<hex>      immutable file content, named by its digest
+    partial/                in-flight and resumable downloads
+    index.json              source fingerprint → {sha256, size, fetched_at}
+
+A *fingerprint* is whatever cheaply identifies the upstream content (Kaggle
+dataset version + file, mirror size/mtime, HTTP ETag). When a fingerprint is
+already indexed and its blob is intact, nothing is fetched again.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import BinaryIO, Dict
+
+from filelock import FileLock
+
+__all__ = ["DownloadCache", "ChecksumMismatchError", "sha256_file"]
+
+logger = logging.getLogger(__name__)
+
+_CHUNK = 1 << 20
+
+
+class ChecksumMismatchError(RuntimeError):
+    """Raised when fetched or cached content does not match its digest."""
+
+
+def sha256_file(path: str | os.PathLike[str]) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class DownloadCache:
+    """Blob store + fingerprint index; safe across threads and processes."""
+
+    def __init__(self, root: str | os.PathLike[str]) -> None:
+        self.root = Path(root).expanduser().resolve()
+        self.blob_dir = self.root / "blobs" / "sha256"
+        self.partial_dir = self.root / "partial"
+        self.blob_dir.mkdir(parents=True, exist_ok=True)
+        self.partial_dir.mkdir(parents=True, exist_ok=True)
+        self._index_path = self.root / "index.json"
+        self._file_lock = FileLock(str(self.root / "index.lock"))
+        self._thread_lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Index
+    # ------------------------------------------------------------------
+
+    def _read_index(self) -> Dict[str, Dict[str, object]]:
+        try:
+            with open(self._index_path, "r", encoding="utf-8") as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return {}
+
+    def lookup(self, fingerprint: str) -> str | None:
+        """Digest recorded for *fingerprint* if its blob is still present."""
+        entry = self._read_index().get(fingerprint)
+        if not entry:
+            return None
+        digest = str(entry["sha256"])
+        blob = self.blob_path(digest)
+        try:
+            if blob.stat().st_size != entry.get("size"):
+                return None
+        except OSError:
+            return None
+        return digest
+
+    def record(self, fingerprint: str, digest: str) -> None:
+        with self._thread_lock, self._file_lock:
+            index = self._read_index()
+            index[fingerprint] = {
+                "sha256": digest,
+                "size": self.blob_path(digest).stat().st_size,
+                "fetched_at": time.time(),
+            }
+            tmp = self._index_path.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp, "w", encoding="utf-8") as fh:
+                json.dump(index, fh, indent=1, sort_keys=True)
+            os.replace(tmp, self._index_path)
+
+    # ------------------------------------------------------------------
+    # Blobs
+    # ------------------------------------------------------------------
+
+    def blob_path(self, digest: str) -> Path:
+        return self.blob_dir / digest
+
+    def verify(self, digest: str) -> bool:
+        """Re-hash the blob; a corrupt blob is removed so it is fetched again."""
+        blob = self.blob_path(digest)
+        if not blob.is_file():
+            return False
+        if sha256_file(blob) == digest:
+            return True
+        logger.warning("Cached blob %s is corrupt – discarding", digest)
+        blob.unlink(missing_ok=True)
+        return False
+
+    def put_stream(self, stream: BinaryIO, *, expected_sha256: str | None = None) -> str:
+        """Copy *stream* into the store while hashing it; returns the digest."""
+        h = hashlib.sha256()
+        tmp = self.partial_dir / f"put.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "wb") as out:
+                for chunk in iter(lambda: stream.read(_CHUNK), b""):
+                    h.update(chunk)
+                    out.write(chunk)
+            digest = h.hexdigest()
+            if expected_sha256 and digest != expected_sha256.lower():
+                raise ChecksumMismatchError(f"sha256 {digest} != expected {expected_sha256}")
+            os.replace(tmp, self.blob_path(digest))
+            return digest
+        finally:
+            tmp.unlink(missing_ok=True)
+
+    def materialize(self, digest: str, dst: str | os.PathLike[str]) -> Path:
+        """Place the blob at *dst* (hard link, else copy), atomically.
+
+        A *dst* that already is this blob is left untouched, so an unchanged
+        version keeps its mtime and the registry sees no change.
+        """
+        blob = self.blob_path(digest)
+        dst = Path(dst)
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            if dst.exists() and os.path.samefile(dst, blob):
+                return dst
+        except OSError:
+            pass
+
+        tmp = dst.with_name(f".{dst.name}.{os.getpid()}.tmp")
+        tmp.unlink(missing_ok=True)
+        try:
+            os.link(blob, tmp)
+        except OSError:  # different filesystem / no hard links
+            shutil.copyfile(blob, tmp)
+        os.replace(tmp, dst)
+        return dst
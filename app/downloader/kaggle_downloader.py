@@ -1,14 +1,24 @@
+"""Fetch version CSVs through the content-addressed download cache.
+
+CLI for prefetching / air-gapped installs::
+
+    python -m app.downloader.kaggle_downloader v15.0.0 v14.2.0 --mirror /srv/mirror
+"""
+
 from __future__ import annotations
 
+import argparse
 import logging
 import os
 import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Dict, Iterable, List
 
-import kagglehub
-from kagglehub import KaggleDatasetAdapter
-
-from config import DOWNLOADS_DIR
+from app.downloader.cache import ChecksumMismatchError, DownloadCache
+from app.downloader.sources import Source, source_for
+from config import DOWNLOAD_CACHE_DIR, DOWNLOAD_MIRROR, DOWNLOAD_WORKERS, DOWNLOADS_DIR
 
 __all__ = ["KaggleDocumentationDownloader"]
 
@@ -16,17 +26,38 @@ VERSION_RE = re.compile(r"^v\d+\.\d+\.\d+\.csv$")
 
 
 class KaggleDocumentationDownloader:
-    """Download a single version CSV from the Kaggle dataset and save it locally."""
-
-    def __init__(self, dataset_id: str = "jiyujizai/nextjs-documentation-for-raggin") -> None:
+    """Download version CSVs from the Kaggle dataset (or a mirror) and save them locally.
+
+    Content goes through :class:`DownloadCache`: an unchanged upstream file
+    is never transferred twice, and a destination that already holds the
+    cached content is left untouched.
+    """
+
+    def __init__(
+        self,
+        dataset_id: str = "jiyujizai/nextjs-documentation-for-raggin",
+        *,
+        mirror: str = DOWNLOAD_MIRROR,
+        cache_dir: str | os.PathLike[str] = DOWNLOAD_CACHE_DIR,
+    ) -> None:
         self.dataset_id = dataset_id
-        logging.info("Downloader initialised for dataset '%s'", dataset_id)
+        self.cache = DownloadCache(cache_dir)
+        self.source: Source = source_for(mirror, dataset_id=dataset_id, partial_dir=self.cache.partial_dir)
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        logging.info("Downloader initialised for dataset '%s' (source: %s)", dataset_id, self.source.name)
 
     # ------------------------------------------------------------------
     # Public API
     # ------------------------------------------------------------------
-    def load_and_save_version(self, version: str, destination: str | os.PathLike[str] = DOWNLOADS_DIR) -> Path:
-        """Fetch `<version>.csv` from Kaggle Hub and write it into *destination*.
+    def load_and_save_version(
+        self,
+        version: str,
+        destination: str | os.PathLike[str] = DOWNLOADS_DIR,
+        *,
+        verify: bool = False,
+    ) -> Path:
+        """Fetch `<version>.csv` and place it into *destination*.
 
         Parameters
         ----------
@@ -34,6 +65,9 @@ class KaggleDocumentationDownloader:
             Semantic version string like ``15.0.0`` or ``v15.0.0``.
         destination : str | PathLike, default ``config.DOWNLOADS_DIR``
             Folder to write the CSV into. Will be created if missing.
+        verify : bool, default ``False``
+            Re-hash the cached copy before reusing it (used by repair);
+            a corrupt copy is fetched again.
 
         Returns
         -------
@@ -47,34 +81,67 @@ class KaggleDocumentationDownloader:
         RuntimeError
             If the file cannot be downloaded or saved.
         """
-
         normalised = self._normalise_version(version)
-
-        logging.info("Loading '%s' from Kaggle dataset '%s'", normalised, self.dataset_id)
-        try:
-            df = kagglehub.dataset_load(
-                KaggleDatasetAdapter.PANDAS,
-                self.dataset_id,
-                normalised,
-            )
-        except Exception as exc:  # pragma: no cover – kagglehub failure
-            raise RuntimeError(f"Error downloading '{normalised}': {exc}") from exc
-
-        dst_dir = Path(destination).expanduser().resolve()
-        dst_dir.mkdir(parents=True, exist_ok=True)
-        dst_path = dst_dir / normalised
-
-        try:
-            df.to_csv(dst_path, index=False)
+        dst_path = Path(destination).expanduser().resolve() / normalised
+
+        with self._lock_for(normalised):
+            try:
+                fingerprint = self.source.fingerprint(normalised)
+            except Exception as exc:  # pragma: no cover – source failure
+                raise RuntimeError(f"Error downloading '{normalised}': {exc}") from exc
+
+            digest = self.cache.lookup(fingerprint)
+            if digest and verify and not self.cache.verify(digest):
+                digest = None
+            if digest:
+                logging.info("'%s' unchanged upstream – using cached %s", normalised, digest[:12])
+            else:
+                digest = self._fetch(normalised, fingerprint)
+
+            try:
+                self.cache.materialize(digest, dst_path)
+            except OSError as exc:  # pragma: no cover – IO error
+                raise RuntimeError(f"Error writing csv to '{dst_path}': {exc}") from exc
             logging.info("CSV saved → %s", dst_path)
             return dst_path
-        except Exception as exc:  # pragma: no cover – IO error
-            raise RuntimeError(f"Error writing csv to '{dst_path}': {exc}") from exc
+
+    def fetch_many(
+        self,
+        versions: Iterable[str],
+        destination: str | os.PathLike[str] = DOWNLOADS_DIR,
+        *,
+        workers: int = DOWNLOAD_WORKERS,
+        verify: bool = False,
+    ) -> List[Path]:
+        """Fetch several versions concurrently; fails if any of them fails."""
+        versions = list(versions)
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(versions) or 1))) as pool:
+            futures = [pool.submit(self.load_and_save_version, v, destination, verify=verify) for v in versions]
+            return [f.result() for f in futures]
 
     # ------------------------------------------------------------------
     # Internals
     # ------------------------------------------------------------------
 
+    def _lock_for(self, name: str) -> threading.Lock:
+        # concurrent requests for the same file wait for one transfer
+        with self._locks_guard:
+            return self._locks.setdefault(name, threading.Lock())
+
+    def _fetch(self, name: str, fingerprint: str) -> str:
+        """Stream *name* from the source into the cache, verifying any published checksum."""
+        logging.info("Downloading '%s' via %s", name, self.source.name)
+        try:
+            expected = self.source.expected_sha256(name)
+            with self.source.open(name) as stream:
+                digest = self.cache.put_stream(stream, expected_sha256=expected)
+        except ChecksumMismatchError as exc:
+            raise RuntimeError(f"Checksum mismatch for '{name}': {exc}") from exc
+        except Exception as exc:  # pragma: no cover – source failure
+            raise RuntimeError(f"Error downloading '{name}': {exc}") from exc
+        self.cache.record(fingerprint, digest)
+        return digest
+
     @staticmethod
     def _normalise_version(raw: str) -> str:
         """Ensure leading 'v' and trailing '.csv', validate format."""
@@ -87,4 +154,23 @@ class KaggleDocumentationDownloader:
             raise ValueError(
                 f"Invalid version '{raw}'. Expected semantic format like 'v15.0.0' or '15.0.0'"
             )
-        return ver
\ No newline at end of file
+        return ver
+
+
+def main(argv: List[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Download version CSVs into the local cache.")
+    parser.add_argument("versions", nargs="+", help="versions like v15.0.0")
+    parser.add_argument("--mirror", default=DOWNLOAD_MIRROR, help="local directory, tarball or http(s) base URL")
+    parser.add_argument("--destination", default=str(DOWNLOADS_DIR))
+    parser.add_argument("--workers", type=int, default=DOWNLOAD_WORKERS)
+    parser.add_argument("--verify", action="store_true", help="re-hash cached copies before reuse")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    downloader = KaggleDocumentationDownloader(mirror=args.mirror)
+    for path in downloader.fetch_many(args.versions, args.destination, workers=args.workers, verify=args.verify):
+        print(path)
+
+
+if __name__ == "__main__":
+    main()
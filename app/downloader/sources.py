@@ -0,0 +1,254 @@
+"""Where version CSVs come from: Kaggle Hub or an offline mirror.
+
+Every source answers two questions for a file name like ``v15.0.0.csv``:
+
+* ``fingerprint(name)`` – cheap identifier of the upstream content, used as
+  the download-cache key (no content is transferred);
+* ``open(name)`` – a binary stream of the content, used as a context manager.
+
+``expected_sha256(name)`` returns a published checksum when the mirror ships
+a ``SHA256SUMS`` file (``<hex>  <name>`` per line).
+
+``source_for(mirror)`` picks the implementation: empty → Kaggle, a directory
+→ :class:`DirectorySource`, ``*.tar``/``*.tar.gz``/``*.tgz`` →
+:class:`TarballSource`, ``http(s)://`` → :class:`HttpSource`.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import re
+import tarfile
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, Mapping
+
+import requests
+
+__all__ = [
+    "Source",
+    "KaggleSource",
+    "DirectorySource",
+    "TarballSource",
+    "HttpSource",
+    "source_for",
+]
+
+logger = logging.getLogger(__name__)
+
+CHECKSUM_FILE = "SHA256SUMS"
+
+
+def _parse_checksums(text: str) -> Dict[str, str]:
+    sums: Dict[str, str] = {}
+    for line in text.splitlines():
+        parts = line.split()
+        if len(parts) == 2:
+            sums[parts[1].lstrip("*")] = parts[0].lower()
+    return sums
+
+
+class Source(ABC):
+    """Interface shared by all download sources."""
+
+    name = "source"
+
+    @abstractmethod
+    def fingerprint(self, name: str) -> str: ...
+
+    @abstractmethod
+    def open(self, name: str) -> BinaryIO: ...
+
+    def expected_sha256(self, name: str) -> str | None:
+        return None
+
+
+class KaggleSource(Source):
+    """Kaggle Hub dataset; transfers go through kagglehub's own file cache.
+
+    ``kagglehub.dataset_download(handle, path=...)`` fetches a single file,
+    resumes interrupted transfers and returns the cached copy when the
+    dataset version has not changed – the returned path (which embeds the
+    dataset version) plus size and mtime is the fingerprint.
+    """
+
+    name = "kaggle"
+
+    def __init__(self, dataset_id: str) -> None:
+        self.dataset_id = dataset_id
+        self._paths: Dict[str, Path] = {}
+
+    def _local(self, name: str) -> Path:
+        # kagglehub is imported lazily – it is only needed when downloading
+        import kagglehub
+
+        path = self._paths.get(name)
+        if path is None or not path.is_file():
+            path = Path(kagglehub.dataset_download(self.dataset_id, path=name))
+            self._paths[name] = path
+        return path
+
+    def fingerprint(self, name: str) -> str:
+        path = self._local(name)
+        st = path.stat()
+        return f"kaggle:{self.dataset_id}:{path}:{st.st_size}:{int(st.st_mtime)}"
+
+    def open(self, name: str) -> BinaryIO:
+        return open(self._local(name), "rb")
+
+
+class DirectorySource(Source):
+    """Plain directory holding ``v*.csv`` files (air-gapped installs, fixtures)."""
+
+    name = "directory"
+
+    def __init__(self, root: str | os.PathLike[str]) -> None:
+        self.root = Path(root).expanduser().resolve()
+
+    def _path(self, name: str) -> Path:
+        path = self.root / name
+        if not path.is_file():
+            raise FileNotFoundError(f"'{name}' not found in mirror {self.root}")
+        return path
+
+    def fingerprint(self, name: str) -> str:
+        st = self._path(name).stat()
+        return f"dir:{self.root}:{name}:{st.st_size}:{st.st_mtime_ns}"
+
+    def open(self, name: str) -> BinaryIO:
+        return open(self._path(name), "rb")
+
+    def expected_sha256(self, name: str) -> str | None:
+        sums = self.root / CHECKSUM_FILE
+        if not sums.is_file():
+            return None
+        return _parse_checksums(sums.read_text(encoding="utf-8")).get(name)
+
+
+class TarballSource(Source):
+    """Tarball mirror; members are matched by basename and streamed out."""
+
+    name = "tarball"
+
+    def __init__(self, archive: str | os.PathLike[str]) -> None:
+        self.archive = Path(archive).expanduser().resolve()
+        self._members: Dict[str, tarfile.TarInfo] | None = None
+
+    def _index(self) -> Dict[str, tarfile.TarInfo]:
+        if self._members is None:
+            with tarfile.open(self.archive, "r:*") as tar:
+                self._members = {os.path.basename(m.name): m for m in tar.getmembers() if m.isfile()}
+        return self._members
+
+    def _member(self, name: str) -> tarfile.TarInfo:
+        member = self._index().get(name)
+        if member is None:
+            raise FileNotFoundError(f"'{name}' not found in mirror {self.archive}")
+        return member
+
+    def fingerprint(self, name: str) -> str:
+        m = self._member(name)
+        return f"tar:{self.archive}:{self.archive.stat().st_mtime_ns}:{name}:{m.size}:{m.mtime}"
+
+    @contextmanager
+    def open(self, name: str) -> Iterator[BinaryIO]:  # type: ignore[override]
+        member = self._member(name)
+        # a private handle per stream so concurrent fetches do not share offsets
+        with tarfile.open(self.archive, "r:*") as tar:
+            fh = tar.extractfile(member)
+            if fh is None:  # pragma: no cover – filtered by isfile()
+                raise FileNotFoundError(name)
+            with fh:
+                yield fh
+
+    def expected_sha256(self, name: str) -> str | None:
+        if CHECKSUM_FILE not in self._index():
+            return None
+        with self.open(CHECKSUM_FILE) as fh:
+            return _parse_checksums(fh.read().decode("utf-8")).get(name)
+
+
+class HttpSource(Source):
+    """HTTP mirror (``<base>/<name>``) with ``Range``-resumed transfers."""
+
+    name = "http"
+
+    def __init__(self, base_url: str, partial_dir: str | os.PathLike[str], *, timeout: float = 60) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.partial_dir = Path(partial_dir)
+        self.timeout = timeout
+        self._session = requests.Session()
+
+    def _url(self, name: str) -> str:
+        return f"{self.base_url}/{name}"
+
+    def fingerprint(self, name: str) -> str:
+        resp = self._session.head(self._url(name), timeout=self.timeout, allow_redirects=True)
+        resp.raise_for_status()
+        tag = resp.headers.get("ETag") or resp.headers.get("Last-Modified") or ""
+        return f"http:{self._url(name)}:{tag}:{resp.headers.get('Content-Length', '')}"
+
+    def open(self, name: str) -> BinaryIO:
+        url = self._url(name)
+        part = self.partial_dir / (hashlib.sha1(url.encode()).hexdigest() + ".part")
+        # validator of the content the partial holds; resume only while it still matches
+        validator_file = part.with_suffix(".validator")
+        have = part.stat().st_size if part.exists() else 0
+        validator = validator_file.read_text(encoding="utf-8") if have and validator_file.is_file() else ""
+        headers = {"Range": f"bytes={have}-", "If-Range": validator} if validator else {}
+        with self._session.get(url, headers=headers, stream=True, timeout=self.timeout) as resp:
+            if resp.status_code == 416:
+                # "nothing left" only holds when the partial is the whole current file
+                if have != _total_size(resp.headers.get("Content-Range", "")):
+                    part.unlink(missing_ok=True)
+                    validator_file.unlink(missing_ok=True)
+                    raise IOError(f"Partial download of {url} does not match the mirror – retry")
+            else:
+                resp.raise_for_status()
+                # 206 → If-Range matched; 200 → changed (or no range support), start over
+                mode = "ab" if validator and resp.status_code == 206 else "wb"
+                if mode == "ab":
+                    logger.info("Resuming %s at byte %d", url, have)
+                validator_file.write_text(_validator(resp.headers), encoding="utf-8")
+                with open(part, mode) as out:
+                    for chunk in resp.iter_content(1 << 20):
+                        out.write(chunk)
+        fh = open(part, "rb")
+        validator_file.unlink(missing_ok=True)
+        # the partial is consumed once handed out; the cache keeps the blob
+        part.unlink()
+        return fh
+
+    def expected_sha256(self, name: str) -> str | None:
+        resp = self._session.get(self._url(CHECKSUM_FILE), timeout=self.timeout)
+        if resp.status_code != 200:
+            return None
+        return _parse_checksums(resp.text).get(name)
+
+
+def _validator(headers: Mapping[str, str]) -> str:
+    """``If-Range`` value for a reply: a strong ETag, else Last-Modified (weak ETags are not allowed)."""
+    etag = headers.get("ETag") or ""
+    return etag if etag and not etag.startswith("W/") else headers.get("Last-Modified") or ""
+
+
+def _total_size(content_range: str) -> int:
+    """Total length from a ``Content-Range`` header (``bytes */1234``); -1 if unknown."""
+    m = re.search(r"/(\d+)\s*$", content_range)
+    return int(m.group(1)) if m else -1
+
+
+def source_for(mirror: str, *, dataset_id: str, partial_dir: str | os.PathLike[str]) -> Source:
+    if not mirror:
+        return KaggleSource(dataset_id)
+    if mirror.startswith(("http://", "https://")):
+        return HttpSource(mirror, partial_dir)
+    path = Path(mirror).expanduser()
+    if path.is_dir():
+        return DirectorySource(path)
+    if path.name.endswith((".tar", ".tar.gz", ".tgz", ".tar.xz", ".tar.bz2")):
+        return TarballSource(path)
+    raise ValueError(f"Unsupported download mirror '{mirror}'")
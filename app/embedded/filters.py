@@ -0,0 +1,222 @@
+"""Tiny evaluator for the subset of Milvus boolean expressions we use.
+
+Supported grammar (case‑insensitive keywords)::
+
+    expr    := or
+    or      := and (("||" | "or") and)*
+    and     := not (("&&" | "and") not)*
+    not     := ("!" | "not") not | atom
+    atom    := "(" expr ")" | operand OP value | operand ["not"] "in" list
+             | operand "like" STRING
+    operand := IDENT ("[" STRING "]")*
+
+which covers filters such as ``tag == "api"``, ``title like "use%"`` or
+``metadata["section"] in ["app", "pages"]``.
+"""
+
+from __future__ import annotations
+
+import re
+from typing import Any, Callable, Dict, List, Tuple
+
+__all__ = ["compile_filter"]
+
+Predicate = Callable[[Dict[str, Any]], bool]
+
+_TOKEN_RE = re.compile(
+    r"""\s*(?:
+        (?P<str>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+      | (?P<num>-?\d+(?:\.\d+)?)
+      | (?P<op>==|!=|>=|<=|&&|\|\||[<>()\[\],!])
+      | (?P<ident>[A-Za-z_][A-Za-z0-9_]*)
+    )""",
+    re.VERBOSE,
+)
+
+# backslash escapes inside string literals; anything else keeps its backslash
+_ESCAPE_RE = re.compile(r"\\(.)", re.DOTALL)
+_ESCAPES = {"n": "\n", "t": "\t", "r": "\r", "\\": "\\", '"': '"', "'": "'"}
+
+_COMPARATORS: Dict[str, Callable[[Any, Any], bool]] = {
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    ">": lambda a, b: a is not None and a > b,
+    ">=": lambda a, b: a is not None and a >= b,
+    "<": lambda a, b: a is not None and a < b,
+    "<=": lambda a, b: a is not None and a <= b,
+}
+
+
+def _tokenise(expr: str) -> List[Tuple[str, str]]:
+    tokens: List[Tuple[str, str]] = []
+    pos = 0
+    expr = expr.rstrip()
+    while pos < len(expr):
+        m = _TOKEN_RE.match(expr, pos)
+        if not m or m.end() == pos:
+            raise ValueError(f"Unsupported filter expression near: {expr[pos:]!r}")
+        kind = m.lastgroup or ""
+        tokens.append((kind, m.group(kind)))
+        pos = m.end()
+    return tokens
+
+
+def _like_to_regex(pattern: str) -> re.Pattern[str]:
+    out = []
+    for ch in pattern:
+        if ch == "%":
+            out.append(".*")
+        elif ch == "_":
+            out.append(".")
+        else:
+            out.append(re.escape(ch))
+    return re.compile("".join(out), re.DOTALL)
+
+
+class _Parser:
+    def __init__(self, expr: str) -> None:
+        self.tokens = _tokenise(expr)
+        self.pos = 0
+
+    # token helpers ---------------------------------------------------------
+
+    def _peek(self) -> Tuple[str, str] | None:
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def _next(self) -> Tuple[str, str]:
+        tok = self._peek()
+        if tok is None:
+            raise ValueError("Unexpected end of filter expression")
+        self.pos += 1
+        return tok
+
+    def _accept(self, *values: str) -> bool:
+        tok = self._peek()
+        if tok and (tok[1] in values or (tok[0] == "ident" and tok[1].lower() in values)):
+            self.pos += 1
+            return True
+        return False
+
+    def _expect(self, value: str) -> None:
+        if not self._accept(value):
+            raise ValueError(f"Expected '{value}' in filter expression")
+
+    # grammar ---------------------------------------------------------------
+
+    def parse(self) -> Predicate:
+        pred = self._or()
+        if self._peek() is not None:
+            raise ValueError(f"Unexpected token '{self._peek()[1]}' in filter expression")
+        return pred
+
+    def _or(self) -> Predicate:
+        parts = [self._and()]
+        while self._accept("||", "or"):
+            parts.append(self._and())
+        return parts[0] if len(parts) == 1 else (lambda row: any(p(row) for p in parts))
+
+    def _and(self) -> Predicate:
+        parts = [self._not()]
+        while self._accept("&&", "and"):
+            parts.append(self._not())
+        return parts[0] if len(parts) == 1 else (lambda row: all(p(row) for p in parts))
+
+    def _not(self) -> Predicate:
+        if self._accept("!", "not"):
+            inner = self._not()
+            return lambda row: not inner(row)
+        return self._atom()
+
+    def _atom(self) -> Predicate:
+        if self._accept("("):
+            inner = self._or()
+            self._expect(")")
+            return inner
+
+        getter = self._operand()
+        negate = self._accept("not")
+        if self._accept("in"):
+            values = set(map(_hashable, self._list()))
+            if negate:
+                return lambda row: _hashable(getter(row)) not in values
+            return lambda row: _hashable(getter(row)) in values
+        if negate:
+            raise ValueError("'not' must be followed by 'in' in filter expression")
+        if self._accept("like"):
+            kind, raw = self._next()
+            if kind != "str":
+                raise ValueError("'like' expects a string pattern")
+            regex = _like_to_regex(_literal(kind, raw))
+            return lambda row: isinstance(getter(row), str) and bool(regex.fullmatch(getter(row)))
+
+        kind, op = self._next()
+        if op not in _COMPARATORS:
+            raise ValueError(f"Unsupported operator '{op}' in filter expression")
+        value = _literal(*self._next())
+        compare = _COMPARATORS[op]
+
+        def _cmp(row: Dict[str, Any]) -> bool:
+            try:
+                return compare(getter(row), value)
+            except TypeError:
+                return False
+
+        return _cmp
+
+    def _operand(self) -> Callable[[Dict[str, Any]], Any]:
+        kind, name = self._next()
+        if kind != "ident":
+            raise ValueError(f"Expected a field name, got '{name}'")
+        path: List[str] = []
+        while self._accept("["):
+            k_kind, key = self._next()
+            if k_kind != "str":
+                raise ValueError("JSON keys must be quoted strings")
+            path.append(_literal(k_kind, key))
+            self._expect("]")
+
+        def _get(row: Dict[str, Any]) -> Any:
+            val: Any = row.get(name)
+            for key in path:
+                val = val.get(key) if isinstance(val, dict) else None
+            return val
+
+        return _get
+
+    def _list(self) -> List[Any]:
+        self._expect("[")
+        values: List[Any] = []
+        if self._accept("]"):
+            return values
+        while True:
+            values.append(_literal(*self._next()))
+            if self._accept("]"):
+                return values
+            self._expect(",")
+
+
+def _literal(kind: str, raw: str) -> Any:
+    if kind == "str":
+        return _ESCAPE_RE.sub(lambda m: _ESCAPES.get(m.group(1), m.group(0)), raw[1:-1])
+    if kind == "num":
+        return float(raw) if "." in raw else int(raw)
+    if kind == "ident" and raw.lower() in ("true", "false"):
+        return raw.lower() == "true"
+    raise ValueError(f"Expected a literal value, got '{raw}'")
+
+
+def _hashable(val: Any) -> Any:
+    return tuple(val) if isinstance(val, list) else val
+
+
+def compile_filter(expr: str | None) -> Predicate | None:
+    """Compile *expr* into a row predicate; ``None`` for an empty expression.
+
+    Raises
+    ------
+    ValueError
+        If *expr* uses syntax outside the supported subset.
+    """
+    if not expr or not expr.strip():
+        return None
+    return _Parser(expr).parse()
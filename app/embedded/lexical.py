@@ -0,0 +1,88 @@
+"""Local BM25 inverted index over ``text_content`` + ``code_content``.
+
+The embedded counterpart of the Milvus BM25 function: exact identifiers such
+as ``revalidatePath`` are matched as whole, lower-cased tokens (like Milvus'
+``standard`` analyzer). Stored per generation as::
+
+    bm25_terms.json            sorted vocabulary
+    bm25_{offsets,rows,tf}.npy postings (term-major)
+    bm25_doclen.npy            tokens per row
+"""
+
+from __future__ import annotations
+
+import json
+import re
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+from config import BM25_B, BM25_K1
+
+__all__ = ["tokenize", "write_bm25", "BM25Index"]
+
+_TOKEN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(text.lower())
+
+
+def write_bm25(texts: Iterable[str], dest: Path) -> Dict[str, float]:
+    """Write the index for *texts* (one per row) into *dest*; returns stats for the manifest."""
+    counts = [Counter(tokenize(t)) for t in texts]
+    terms = sorted({tok for c in counts for tok in c})
+    term_id = {t: i for i, t in enumerate(terms)}
+
+    postings: List[List[Tuple[int, int]]] = [[] for _ in terms]
+    for row, c in enumerate(counts):
+        for tok, tf in c.items():
+            postings[term_id[tok]].append((row, tf))
+
+    offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(p) for p in postings])
+    rows = np.fromiter((r for p in postings for r, _ in p), dtype=np.int32, count=int(offsets[-1]))
+    tf = np.fromiter((f for p in postings for _, f in p), dtype=np.float32, count=int(offsets[-1]))
+    doclen = np.asarray([sum(c.values()) for c in counts], dtype=np.float32)
+
+    (dest / "bm25_terms.json").write_text(json.dumps(terms, ensure_ascii=False), encoding="utf-8")
+    np.save(dest / "bm25_offsets.npy", offsets)
+    np.save(dest / "bm25_rows.npy", rows)
+    np.save(dest / "bm25_tf.npy", tf)
+    np.save(dest / "bm25_doclen.npy", doclen)
+    return {"terms": len(terms), "avgdl": float(doclen.mean()) if len(doclen) else 0.0}
+
+
+class BM25Index:
+    """Memory-mapped BM25 postings of one generation."""
+
+    def __init__(self, path: Path, avgdl: float, *, k1: float = BM25_K1, b: float = BM25_B) -> None:
+        terms = json.loads((path / "bm25_terms.json").read_text(encoding="utf-8"))
+        self._term_id = {t: i for i, t in enumerate(terms)}
+        self._offsets = np.load(path / "bm25_offsets.npy", mmap_mode="r")
+        self._rows = np.load(path / "bm25_rows.npy", mmap_mode="r")
+        self._tf = np.load(path / "bm25_tf.npy", mmap_mode="r")
+        doclen = np.load(path / "bm25_doclen.npy")
+        self.size = len(doclen)
+        self.k1 = k1
+        # per-row length normalisation, precomputed once
+        self._norm = (k1 * (1 - b + b * doclen / (avgdl or 1.0))).astype(np.float32)
+
+    def scores(self, query: str) -> Tuple[np.ndarray, np.ndarray]:
+        """BM25 score per row and a mask of rows that matched any query term."""
+        scores = np.zeros(self.size, dtype=np.float32)
+        touched = np.zeros(self.size, dtype=bool)
+        for tok, qtf in Counter(tokenize(query)).items():
+            tid = self._term_id.get(tok)
+            if tid is None:
+                continue
+            lo, hi = self._offsets[tid], self._offsets[tid + 1]
+            rows = self._rows[lo:hi]
+            tf = self._tf[lo:hi]
+            df = hi - lo
+            idf = np.log(1.0 + (self.size - df + 0.5) / (df + 0.5))
+            scores[rows] += qtf * idf * tf * (self.k1 + 1) / (tf + self._norm[rows])
+            touched[rows] = True
+        return scores, touched
@@ -0,0 +1,93 @@
+"""In-process drop-in for :class:`SearchManager` – no Milvus server needed."""
+
+from __future__ import annotations
+
+import logging
+from pathlib import Path
+from typing import Any, Dict, List
+
+from app.embedded.store import EmbeddedHit, VersionIndex
+from app.milvus.search_manager import SearchManager
+from app.residency import ResidencyManager
+from config import EMBEDDED_INDEX_DIR, RESIDENCY_MAX_VERSIONS, RESIDENCY_MEMORY_BUDGET_MB
+
+__all__ = ["EmbeddedSearchManager"]
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddedSearchManager(SearchManager):
+    """Serve hybrid search from memory-mapped per-version NumPy indices.
+
+    Only the backend hooks are replaced; embedding, ``_merge_hits`` and the
+    score blending are inherited unchanged.
+    """
+
+    def __init__(self, collection_name: str, *, index_dir: str | Path = EMBEDDED_INDEX_DIR) -> None:
+        self.index_dir = Path(index_dir)
+        super().__init__(collection_name, uri=str(self.index_dir))
+
+    # ------------------------------------------------------------------
+    # Backend hooks
+    # ------------------------------------------------------------------
+
+    def _open_backend(self) -> None:
+        # releasing just drops the reference; the OS reclaims the mapped pages
+        self.residency: ResidencyManager[VersionIndex] = ResidencyManager(
+            load=lambda version: VersionIndex(self._version_dir(version)),
+            release=lambda _version, _idx: None,
+            size_of=lambda _version, idx: idx.nbytes,
+            budget_bytes=RESIDENCY_MEMORY_BUDGET_MB * 2**20,
+            max_resident=RESIDENCY_MAX_VERSIONS,
+        )
+
+    def _ensure_conn(self) -> None:  # nothing to (re)connect to
+        return None
+
+    def _version_dir(self, version: str) -> Path:
+        return self.index_dir / self.collection_name / version
+
+    def invalidate(self, version: str) -> None:
+        self.residency.discard(version)
+
+    def _search_many(
+        self,
+        field: str,
+        queries: List[Any],
+        *,
+        top_k: int,
+        expr: str,
+        metric: str,
+        version: str,
+        radius: float = 0.5,
+        range_filter: float = 1,
+        extra_params: Dict[str, Any] | None = None,
+        iterative_filter: bool = False,
+    ) -> List[List[EmbeddedHit]]:
+        # radius / range are accepted for interface parity; like the Milvus
+        # path this returns plain top‑k hits. iterative_filter walks the HNSW
+        # graph with the filter applied instead of falling back to exact search.
+        if version not in self.residency and not (self._version_dir(version) / "manifest.json").is_file():
+            raise ValueError(f"Version '{version}' has not been ingested")
+
+        base = self._filter_expr(version)
+        extra = expr[len(base):].strip().lstrip("&").strip() if expr.startswith(base) else expr
+
+        results: List[List[EmbeddedHit]] = []
+        with self.residency.lease(version) as idx:
+            mask = idx.mask(extra)
+            for query in queries:
+                if metric == "BM25":
+                    ranked = idx.bm25_search(query, top_k, mask)
+                elif metric == "IP":
+                    drop = ((extra_params or {}).get("params") or {}).get("drop_ratio_search", 0.0)
+                    ranked = idx.sparse_search(query, top_k, mask, drop_ratio=drop)
+                else:
+                    ranked = idx.dense_search(field, query, top_k, mask, iterative=iterative_filter)
+
+                hits = []
+                for row, score in ranked:
+                    ent = idx.entity(row)
+                    hits.append(EmbeddedHit(id=ent["entry_id"], distance=score, entity=ent))
+                results.append(hits)
+        return results
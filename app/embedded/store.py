@@ -0,0 +1,447 @@
+"""On-disk per-version index used by the embedded (in-process) backend.
+
+``<EMBEDDED_INDEX_DIR>/<collection>/<version>`` is a symlink to the current
+generation directory ``<version>.<millis>``; rebuilds write a new generation
+and swap the link atomically. Each generation contains::
+
+    manifest.json              row count, dimension, ANN type
+    scalars.json               entry_id / title / metadata / version / tag per row
+    rows.jsonl                 full row payload (text + code), read lazily
+    row_offsets.npy            byte offsets into rows.jsonl (n + 1)
+    dense_text_content.npy     float32 (n, dim), L2-normalised, memory-mapped
+    dense_code_snippet.npy     float32 (n, dim), L2-normalised, memory-mapped
+    <dense field>.reduced.npy  float32 (n, reduced dim), two-stage mode only
+    <dense field>.reducer.npz  the fitted projection (see ``embedding.reduction``)
+    sparse_{tokens,offsets,rows,weights}.npy
+                               inverted index for ``sparse_title``
+    bm25_*                     BM25 index over text + code (see ``lexical``)
+    <dense field>.hnsw         optional hnswlib graph (over the reduced vectors
+                               in two-stage mode)
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.changes import ChunkRecorder, forget_version
+from app.embedded.filters import compile_filter
+from app.embedded.lexical import BM25Index, write_bm25
+from app.embedding.reduction import DenseReducer, rescore
+from app.embedding.sparse import prune_build, prune_sparse, validate_drop_ratio
+from app.milvus.schema_manager import MilvusSchemaManager
+from config import (
+    DENSE_REDUCED_DIM,
+    DENSE_REDUCTION,
+    DENSE_RESCORE_FACTOR,
+    DENSE_VECTOR_DIM,
+    EMBEDDED_ANN,
+    EMBEDDED_INDEX_DIR,
+    SPARSE_DROP_RATIO_BUILD,
+)
+
+try:  # optional – exact search is used when hnswlib is not installed
+    import hnswlib
+except ImportError:  # pragma: no cover – depends on environment
+    hnswlib = None
+
+__all__ = ["EmbeddedHit", "VersionIndex", "EmbeddedSchemaManager", "write_version_index"]
+
+logger = logging.getLogger(__name__)
+
+DENSE_FIELDS = ("dense_text_content", "dense_code_snippet")
+SCALAR_FIELDS = ("entry_id", "title", "metadata", "version", "tag")
+
+
+# -----------------------------------------------------------------------------
+# Hit structure – mirrors the attributes of a pymilvus ``Hit``
+# -----------------------------------------------------------------------------
+
+@dataclass
+class EmbeddedHit:
+    id: str
+    distance: float
+    entity: Dict[str, Any] = field(default_factory=dict)
+
+
+# -----------------------------------------------------------------------------
+# Writing
+# -----------------------------------------------------------------------------
+
+def _normalised(vectors: List[List[float]]) -> np.ndarray:
+    mat = np.asarray(vectors, dtype=np.float32).reshape(len(vectors), DENSE_VECTOR_DIM)
+    norms = np.linalg.norm(mat, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return mat / norms
+
+
+def _sparse_postings(sparse_rows: List[Dict[int, float]]) -> Dict[str, np.ndarray]:
+    """Transpose per-row sparse dicts into token-sorted posting lists."""
+    tokens, rows, weights = [], [], []
+    for row_idx, weights_map in enumerate(sparse_rows):
+        for tok, w in weights_map.items():
+            tokens.append(int(tok))
+            rows.append(row_idx)
+            weights.append(float(w))
+
+    tok_arr = np.asarray(tokens, dtype=np.int64)
+    order = np.argsort(tok_arr, kind="stable")
+    tok_sorted = tok_arr[order]
+    uniq, starts = np.unique(tok_sorted, return_index=True)
+    offsets = np.append(starts, len(tok_sorted)).astype(np.int64)
+    return {
+        "tokens": uniq.astype(np.int64),
+        "offsets": offsets,
+        "rows": np.asarray(rows, dtype=np.int32)[order],
+        "weights": np.asarray(weights, dtype=np.float32)[order],
+    }
+
+
+def write_version_index(
+    entities: List[Dict[str, Any]],
+    dest: str | Path,
+    *,
+    ann: str = EMBEDDED_ANN,
+    hnsw_params: Dict[str, Tuple[int, int]] | None = None,
+    reduced_dim: int = DENSE_REDUCED_DIM,
+    reduction: str = DENSE_REDUCTION,
+) -> Path:
+    """Persist *entities* (``MilvusSchemaManager._row_to_entity`` dicts) as *dest*.
+
+    The data goes into a new generation directory next to *dest*; *dest* is
+    then atomically re‑pointed at it, so readers never observe a half‑written
+    version and open readers keep their (unlinked) files until they close.
+
+    With *reduced_dim* the dense fields also get a reduced copy, which the
+    HNSW graph and the coarse search use (two-stage retrieval).
+    """
+    dest = Path(dest)
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    gen = dest.with_name(f"{dest.name}.{time.time_ns() // 1_000_000}")
+    gen.mkdir()
+
+    offsets = [0]
+    with open(gen / "rows.jsonl", "wb") as fh:
+        for ent in entities:
+            payload = {
+                "entry_id": ent["entry_id"],
+                "text_content": ent["text_content"],
+                "code_content": ent["code_content"],
+            }
+            fh.write(json.dumps(payload, ensure_ascii=False).encode("utf-8") + b"\n")
+            offsets.append(fh.tell())
+    np.save(gen / "row_offsets.npy", np.asarray(offsets, dtype=np.int64))
+
+    scalars = [{k: ent[k] for k in SCALAR_FIELDS} for ent in entities]
+    (gen / "scalars.json").write_text(json.dumps(scalars, ensure_ascii=False), encoding="utf-8")
+
+    use_hnsw = ann == "hnsw" and hnswlib is not None and len(entities) > 0
+    if ann == "hnsw" and hnswlib is None:
+        logger.warning("EMBEDDED_ANN=hnsw but hnswlib is not installed – using exact search")
+
+    two_stage = 0 < reduced_dim < DENSE_VECTOR_DIM and len(entities) > 0
+    for fld in DENSE_FIELDS:
+        mat = _normalised([ent[fld] for ent in entities])
+        np.save(gen / f"{fld}.npy", mat)
+        if two_stage:
+            reducer = DenseReducer.fit(mat, reduced_dim, method=reduction)
+            reducer.save(gen / f"{fld}.reducer.npz")
+            mat = reducer.transform(mat)
+            np.save(gen / f"{fld}.reduced.npy", mat)
+        if use_hnsw:
+            m, ef = (hnsw_params or {}).get(fld, (16, 200))
+            graph = hnswlib.Index(space="ip", dim=mat.shape[1])
+            graph.init_index(max_elements=len(mat), M=m, ef_construction=ef)
+            graph.add_items(mat, np.arange(len(mat)))
+            graph.save_index(str(gen / f"{fld}.hnsw"))
+
+    for key, arr in _sparse_postings([ent["sparse_title"] for ent in entities]).items():
+        np.save(gen / f"sparse_{key}.npy", arr)
+
+    bm25 = write_bm25((f"{ent['text_content']}\n{ent['code_content']}" for ent in entities), gen)
+
+    manifest = {
+        "rows": len(entities),
+        "dim": DENSE_VECTOR_DIM,
+        "ann": "hnsw" if use_hnsw else "exact",
+        "reduced_dim": reduced_dim if two_stage else 0,
+        "bm25": bm25,
+        "built_at": time.time(),
+    }
+    (gen / "manifest.json").write_text(json.dumps(manifest), encoding="utf-8")
+
+    link = dest.with_name(f".{dest.name}.lnk")
+    if link.is_symlink():
+        link.unlink()
+    link.symlink_to(gen.name)
+    if dest.is_dir() and not dest.is_symlink():
+        shutil.rmtree(dest)  # pre‑generation layout
+    os.replace(link, dest)
+    remove_generations(dest, keep=gen)
+    logger.info("Embedded index written → %s (%d rows, %s)", dest, len(entities), manifest["ann"])
+    return dest
+
+
+def remove_generations(dest: Path, *, keep: Path | None = None) -> None:
+    """Delete generation directories of *dest* other than *keep*."""
+    pattern = re.compile(rf"^{re.escape(dest.name)}\.\d+$")
+    if not dest.parent.is_dir():
+        return
+    for child in dest.parent.iterdir():
+        if pattern.match(child.name) and child != keep:
+            shutil.rmtree(child, ignore_errors=True)
+
+
+# -----------------------------------------------------------------------------
+# Reading / searching
+# -----------------------------------------------------------------------------
+
+class VersionIndex:
+    """Memory-mapped, read-only index for one documentation version."""
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path).resolve()  # pin the generation, not the symlink
+        self.manifest: Dict[str, Any] = json.loads((self.path / "manifest.json").read_text(encoding="utf-8"))
+        self.scalars: List[Dict[str, Any]] = json.loads((self.path / "scalars.json").read_text(encoding="utf-8"))
+        self.size = len(self.scalars)
+
+        self._offsets = np.load(self.path / "row_offsets.npy")
+        # kept open so reads survive the generation being replaced and removed
+        self._rows_fd = os.open(self.path / "rows.jsonl", os.O_RDONLY)
+        self._dense = {fld: np.load(self.path / f"{fld}.npy", mmap_mode="r") for fld in DENSE_FIELDS}
+
+        # two-stage: the coarse search scans / walks the reduced vectors; the
+        # full ones are only read for the candidates being rescored
+        self.reduced_dim = int(self.manifest.get("reduced_dim") or 0)
+        self.rescore_factor = DENSE_RESCORE_FACTOR
+        self._reduced: Dict[str, np.ndarray] = {}
+        self._reducers: Dict[str, DenseReducer] = {}
+        if self.reduced_dim:
+            for fld in DENSE_FIELDS:
+                self._reduced[fld] = np.load(self.path / f"{fld}.reduced.npy", mmap_mode="r")
+                self._reducers[fld] = DenseReducer.load(self.path / f"{fld}.reducer.npz")
+        cold = {f"{fld}.npy" for fld in DENSE_FIELDS} if self.reduced_dim else set()
+        self.nbytes = sum(p.stat().st_size for p in self.path.iterdir() if p.is_file() and p.name not in cold)
+        self._sparse = {
+            key: np.load(self.path / f"sparse_{key}.npy", mmap_mode="r")
+            for key in ("tokens", "offsets", "rows", "weights")
+        }
+
+        self._hnsw: Dict[str, Any] = {}
+        if self.manifest.get("ann") == "hnsw" and hnswlib is not None:
+            for fld in DENSE_FIELDS:
+                graph = hnswlib.Index(space="ip", dim=self.reduced_dim or self.manifest["dim"])
+                graph.load_index(str(self.path / f"{fld}.hnsw"), max_elements=self.size)
+                self._hnsw[fld] = graph
+
+        # generations written before the BM25 channel existed have none
+        bm25 = self.manifest.get("bm25")
+        self._bm25 = BM25Index(self.path, bm25["avgdl"]) if bm25 else None
+
+        self._masks: Dict[str, np.ndarray] = {}
+        self._mask_lock = threading.Lock()
+
+    def __del__(self) -> None:
+        fd = getattr(self, "_rows_fd", None)
+        if fd is not None:
+            os.close(fd)
+
+    # filters ---------------------------------------------------------------
+
+    def mask(self, expr: str | None) -> np.ndarray | None:
+        """Boolean row mask for *expr*, cached per expression string."""
+        if not expr:
+            return None
+        with self._mask_lock:
+            cached = self._masks.get(expr)
+        if cached is not None:
+            return cached
+        pred = compile_filter(expr)
+        mask = np.fromiter((pred(row) for row in self.scalars), dtype=bool, count=self.size)
+        with self._mask_lock:
+            if len(self._masks) >= 128:
+                self._masks.clear()
+            self._masks[expr] = mask
+        return mask
+
+    # search ----------------------------------------------------------------
+
+    @staticmethod
+    def _top(scores: np.ndarray, top_k: int, mask: np.ndarray | None) -> List[Tuple[int, float]]:
+        if mask is not None:
+            scores = np.where(mask, scores, -np.inf)
+        k = min(top_k, int(np.isfinite(scores).sum()))
+        if k <= 0:
+            return []
+        idx = np.argpartition(-scores, k - 1)[:k]
+        idx = idx[np.argsort(-scores[idx], kind="stable")]
+        return [(int(i), float(scores[i])) for i in idx]
+
+    def dense_search(
+        self,
+        fld: str,
+        query: Iterable[float],
+        top_k: int,
+        mask: np.ndarray | None = None,
+        *,
+        iterative: bool = False,
+    ) -> List[Tuple[int, float]]:
+        """Cosine top-k over *fld*.
+
+        HNSW when built and unfiltered; with a filter, HNSW checking the mask
+        during the graph walk if *iterative*, else exact search. In two-stage
+        mode that search runs on the reduced vectors for
+        ``top_k × rescore_factor`` candidates, which are then rescored
+        against the full vectors.
+        """
+        if self.size == 0:
+            return []
+        q = np.asarray(query, dtype=np.float32)
+        norm = np.linalg.norm(q)
+        if norm:
+            q = q / norm
+        reducer = self._reducers.get(fld)
+        if reducer is None:
+            return self._ann(fld, self._dense[fld], q, top_k, mask, iterative)
+
+        coarse = self._ann(fld, self._reduced[fld], reducer.transform(q)[0], top_k * self.rescore_factor, mask, iterative)
+        if not coarse:
+            return []
+        rows = np.sort(np.fromiter((r for r, _ in coarse), dtype=np.int64, count=len(coarse)))
+        order, scores = rescore(self._dense[fld][rows], q, top_k)
+        return [(int(rows[i]), float(s)) for i, s in zip(order, scores)]
+
+    def _ann(
+        self,
+        fld: str,
+        mat: np.ndarray,
+        q: np.ndarray,
+        top_k: int,
+        mask: np.ndarray | None,
+        iterative: bool,
+    ) -> List[Tuple[int, float]]:
+        """HNSW or exact top-k of the normalised *q* over *mat* (the graph's vectors)."""
+        graph = self._hnsw.get(fld)
+        if graph is not None and (mask is None or iterative):
+            k = min(top_k, self.size if mask is None else int(mask.sum()))
+            if k <= 0:
+                return []
+            graph.set_ef(max(k, 64))
+            if mask is None:
+                labels, dists = graph.knn_query(q, k=k)
+            else:
+                labels, dists = graph.knn_query(q, k=k, filter=lambda label: bool(mask[label]))
+            return [(int(i), float(1.0 - d)) for i, d in zip(labels[0], dists[0])]
+        return self._top(mat @ q, top_k, mask)
+
+    def sparse_search(
+        self,
+        query: Dict[Any, float],
+        top_k: int,
+        mask: np.ndarray | None = None,
+        *,
+        drop_ratio: float = 0.0,
+    ) -> List[Tuple[int, float]]:
+        """Inner-product top-k over the ``sparse_title`` posting lists.
+
+        *drop_ratio* ignores that fraction of the query's smallest weights
+        (Milvus' ``drop_ratio_search``).
+        """
+        if self.size == 0 or not query:
+            return []
+        if drop_ratio:
+            query = prune_sparse(query, drop_ratio=drop_ratio)
+        tokens, offsets = self._sparse["tokens"], self._sparse["offsets"]
+        scores = np.zeros(self.size, dtype=np.float32)
+        touched = np.zeros(self.size, dtype=bool)
+        for tok, weight in query.items():
+            pos = int(np.searchsorted(tokens, int(tok)))
+            if pos >= len(tokens) or tokens[pos] != int(tok):
+                continue
+            lo, hi = offsets[pos], offsets[pos + 1]
+            rows = self._sparse["rows"][lo:hi]
+            np.add.at(scores, rows, self._sparse["weights"][lo:hi] * float(weight))
+            touched[rows] = True
+        scores = np.where(touched, scores, -np.inf)
+        return self._top(scores, top_k, mask)
+
+    def bm25_search(self, query: str, top_k: int, mask: np.ndarray | None = None) -> List[Tuple[int, float]]:
+        """BM25 top-k over text + code; empty when this generation has no BM25 index."""
+        if self._bm25 is None or self.size == 0 or not query.strip():
+            return []
+        scores, touched = self._bm25.scores(query)
+        return self._top(np.where(touched, scores, -np.inf), top_k, mask)
+
+    def entity(self, row: int) -> Dict[str, Any]:
+        """Full entity for *row*; text/code are read from disk on demand."""
+        start, end = int(self._offsets[row]), int(self._offsets[row + 1])
+        payload = json.loads(os.pread(self._rows_fd, end - start, start))
+        return {**self.scalars[row], **payload}
+
+
+# -----------------------------------------------------------------------------
+# Ingest manager – same surface as MilvusSchemaManager used by the routes
+# -----------------------------------------------------------------------------
+
+class EmbeddedSchemaManager:
+    """Build / delete per-version embedded indices from downloaded CSVs."""
+
+    def __init__(self, collection_name: str, *, index_dir: str | Path = EMBEDDED_INDEX_DIR) -> None:
+        self.collection_name = collection_name
+        self.index_dir = Path(index_dir)
+
+    def version_dir(self, version: str) -> Path:
+        return self.index_dir / self.collection_name / version
+
+    def build_from_csv(self, csv_path: str | Path, **index_params: float) -> int:
+        csv_path = Path(csv_path)
+        df = pd.read_csv(csv_path)
+        entities = [MilvusSchemaManager._row_to_entity(row) for _, row in df.iterrows()]
+        return self.build_from_entities(csv_path.stem, entities, **index_params)
+
+    def build_from_entities(
+        self,
+        version: str,
+        entities: Iterable[Dict[str, Any]],
+        *,
+        m_text: int = 16,
+        ef_text: int = 200,
+        m_code: int = 16,
+        ef_code: int = 200,
+        drop_ratio_build: float = SPARSE_DROP_RATIO_BUILD,
+    ) -> int:
+        validate_drop_ratio(drop_ratio_build, name="drop_ratio_build")
+        entities = list(entities)
+        for ent in entities:
+            # what Milvus leaves out of its inverted index is never stored here
+            ent["sparse_title"] = prune_build(ent["sparse_title"], drop_ratio=drop_ratio_build)
+        write_version_index(
+            entities,
+            self.version_dir(version),
+            hnsw_params={"dense_text_content": (m_text, ef_text), "dense_code_snippet": (m_code, ef_code)},
+        )
+        recorder = ChunkRecorder(version)
+        recorder.add_many(entities)
+        recorder.commit()
+        return len(entities)
+
+    def delete_version(self, version: str) -> None:
+        dest = self.version_dir(version)
+        if dest.is_symlink():
+            dest.unlink()
+        else:
+            shutil.rmtree(dest, ignore_errors=True)
+        remove_generations(dest)
+        logger.info("Deleted embedded index for version %s", version)
+        forget_version(version)
@@ -0,0 +1,60 @@
+"""``encode_queries`` through the persistent cache tier.
+
+Wraps the local model or :class:`~app.embedding.client.RemoteEmbedder`.
+Texts already embedded by any worker, or before a restart, come from
+:mod:`app.cache_tier`. Only the misses are sent to the model, still as one
+batch.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, List
+
+import numpy as np
+
+from app.cache_tier import PersistentCache, cache_key
+from config import EMBEDDING_MODEL_ID
+
+__all__ = ["CachedEmbedder"]
+
+_NAMESPACE = "embedding"
+# always set by the wrapper – every cache entry holds both outputs
+_OUTPUT_FLAGS = ("return_dense", "return_sparse", "return_colbert_vecs")
+
+
+class CachedEmbedder:
+    def __init__(self, inner: Any, cache: PersistentCache, *, model_id: str = EMBEDDING_MODEL_ID) -> None:
+        self.inner = inner
+        self.cache = cache
+        self.model_id = model_id
+
+    def _key(self, text: str, options: Dict[str, Any]) -> str:
+        return cache_key(_NAMESPACE, [self.model_id, text, options])
+
+    def encode_queries(self, queries: List[str], **kw: Any) -> Dict[str, Any]:
+        """Dense and sparse vectors of *queries*, whatever ``return_*`` asks for.
+
+        An entry always holds both outputs, so a dense-only caller neither
+        misses the entries of hybrid searches nor stores half an entry.
+        Options that change the vectors (e.g. ``max_length``) are part of the
+        key; ``batch_size`` is not.
+        """
+        kw = {k: v for k, v in kw.items() if k not in _OUTPUT_FLAGS}
+        options = {k: v for k, v in kw.items() if k != "batch_size"}
+        keys = [self._key(q, options) for q in queries]
+        hits = self.cache.get_many(_NAMESPACE, dict.fromkeys(keys))
+        missing = [i for i, k in enumerate(keys) if k not in hits]
+        if missing:
+            # duplicates within one call are encoded once
+            todo = list(dict.fromkeys(queries[i] for i in missing))
+            out = self.inner.encode_queries(todo, return_dense=True, return_sparse=True, **kw)
+            for text, dense, sparse in zip(todo, out["dense_vecs"], out["lexical_weights"]):
+                value = (np.asarray(dense, dtype=np.float32), {str(k): float(v) for k, v in sparse.items()})
+                key = self._key(text, options)
+                hits[key] = value
+                self.cache.set(_NAMESPACE, key, value)
+        vectors = [hits[k] for k in keys]
+        return {
+            "dense_vecs": np.stack([d for d, _ in vectors]) if vectors else np.zeros((0, 0), np.float32),
+            "lexical_weights": [s for _, s in vectors],
+        }
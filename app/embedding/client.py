@@ -0,0 +1,68 @@
+"""Client side of :mod:`app.embedding.server` – a drop‑in for ``BGEM3FlagModel``."""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from multiprocessing.connection import Client, Connection
+from typing import Any, Dict, List
+
+from app.embedding.server import parse_address
+from config import EMBEDDER_AUTHKEY
+
+__all__ = ["RemoteEmbedder"]
+
+logger = logging.getLogger(__name__)
+
+
+class RemoteEmbedder:
+    """Forward ``encode_queries`` to the shared embedding process.
+
+    One connection is kept per calling thread; a broken connection is
+    re‑opened once before the error is raised.
+    """
+
+    def __init__(self, address: str, *, authkey: bytes = EMBEDDER_AUTHKEY, connect_timeout: float = 120.0) -> None:
+        if not authkey:
+            raise ValueError("No embedder authkey – set EMBEDDER_AUTHKEY to the server's key")
+        self.address = parse_address(address)
+        self.authkey = authkey
+        self.connect_timeout = connect_timeout
+        self._local = threading.local()
+
+    def _connect(self) -> Connection:
+        deadline = time.monotonic() + self.connect_timeout
+        while True:
+            try:
+                return Client(self.address, authkey=self.authkey)
+            except (FileNotFoundError, ConnectionRefusedError):
+                # the server may still be loading the model
+                if time.monotonic() >= deadline:
+                    raise
+                time.sleep(0.5)
+
+    def _call(self, msg: Dict[str, Any]) -> Dict[str, Any]:
+        for attempt in (1, 2):
+            conn = getattr(self._local, "conn", None)
+            if conn is None:
+                conn = self._local.conn = self._connect()
+            try:
+                conn.send(msg)
+                reply = conn.recv()
+                break
+            except (EOFError, OSError):
+                self._local.conn = None
+                if attempt == 2:
+                    raise
+                logger.warning("Embedding server connection lost – reconnecting")
+        if not reply.get("ok"):
+            raise RuntimeError(f"Embedding server error: {reply.get('error')}")
+        return reply
+
+    def ping(self) -> bool:
+        return bool(self._call({"op": "ping"}).get("ok"))
+
+    def encode_queries(self, queries: List[str], **_: Any) -> Dict[str, Any]:
+        """Same return shape as ``BGEM3FlagModel.encode_queries`` (dense + sparse)."""
+        return self._call({"op": "encode", "texts": list(queries)})["result"]
@@ -0,0 +1,40 @@
+"""Load BGE‑M3 with a bounded torch thread pool."""
+
+from __future__ import annotations
+
+import logging
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from config import MODEL_CACHE_DIR, TORCH_NUM_THREADS
+
+if TYPE_CHECKING:
+    from FlagEmbedding import BGEM3FlagModel
+
+__all__ = ["configure_torch_threads", "load_bge_m3"]
+
+logger = logging.getLogger(__name__)
+
+
+def configure_torch_threads(num_threads: int = TORCH_NUM_THREADS) -> None:
+    """Cap torch intra‑op threads so co‑located workers don't oversubscribe CPUs."""
+    import torch
+
+    torch.set_num_threads(num_threads)
+    logger.info("torch intra‑op threads set to %d", num_threads)
+
+
+def load_bge_m3(num_threads: int = TORCH_NUM_THREADS) -> BGEM3FlagModel:
+    """Instantiate BGE‑M3 on CPU from the shared model cache."""
+    from FlagEmbedding import BGEM3FlagModel
+
+    configure_torch_threads(num_threads)
+    return BGEM3FlagModel(
+        model_name_or_path="BAAI/bge-m3",
+        cache_dir=str(Path(MODEL_CACHE_DIR)),
+        normalize_embeddings=True,
+        return_dense=True,
+        return_sparse=True,
+        devices=["cpu"],
+        use_fp16=False,
+    )
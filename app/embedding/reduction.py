@@ -0,0 +1,146 @@
+"""Reduced-dimension copies of the dense vectors for two-stage retrieval.
+
+With ``DENSE_REDUCED_DIM`` set, ingest also stores every dense vector
+projected to that many dimensions. The coarse ANN search runs over these
+smaller vectors for ``top_k × DENSE_RESCORE_FACTOR`` candidates. The
+candidates are then rescored exactly against the full 1024-d vectors
+(:func:`rescore`).
+
+Two projections are available (``DENSE_REDUCTION``):
+
+* ``pca`` – principal components fitted per version and field on up to
+  ``DENSE_PCA_SAMPLE_ROWS`` rows. It keeps the most variance per dimension
+  but needs the fitted reducer at query time.
+* ``truncate`` – the leading dimensions. It is stateless but loses more,
+  because BGE‑M3 is not trained for truncation; the rescoring makes up
+  for part of that.
+
+Both renormalise, so cosine / inner product behave as on the full vectors.
+All-zero vectors (chunks without a code snippet) stay zero.
+"""
+
+from __future__ import annotations
+
+import os
+from pathlib import Path
+from typing import Sequence, Tuple
+
+import numpy as np
+
+from config import DENSE_PCA_SAMPLE_ROWS, DENSE_REDUCED_DIM, DENSE_REDUCTION
+
+__all__ = ["DenseReducer", "rescore"]
+
+REDUCTIONS = ("pca", "truncate")
+
+
+def _normalise(mat: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(mat, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (mat / norms).astype(np.float32, copy=False)
+
+
+class DenseReducer:
+    """Projection of full dense vectors to *dim* dimensions."""
+
+    def __init__(
+        self,
+        dim: int,
+        *,
+        method: str = "truncate",
+        mean: np.ndarray | None = None,
+        components: np.ndarray | None = None,
+    ) -> None:
+        if method not in REDUCTIONS:
+            raise ValueError(f"Unknown dense reduction '{method}' (expected one of {', '.join(REDUCTIONS)})")
+        if method == "pca" and (mean is None or components is None):
+            raise ValueError("A PCA reducer needs its mean and components – use DenseReducer.fit()")
+        self.dim = dim
+        self.method = method
+        self.mean = mean
+        self.components = components  # (full dim, dim)
+
+    @classmethod
+    def fit(
+        cls,
+        mat: np.ndarray,
+        dim: int = DENSE_REDUCED_DIM,
+        *,
+        method: str = DENSE_REDUCTION,
+        sample_rows: int = DENSE_PCA_SAMPLE_ROWS,
+        seed: int = 0,
+    ) -> "DenseReducer":
+        """Reducer for the corpus *mat* (n, full dim); all-zero rows are ignored."""
+        if dim <= 0 or dim >= mat.shape[1]:
+            raise ValueError(f"Reduced dimension must be in 1..{mat.shape[1] - 1}, got {dim}")
+        if method != "pca":
+            return cls(dim, method=method)
+        rows = mat[np.linalg.norm(mat, axis=1) > 0]
+        if len(rows) > sample_rows:
+            rows = rows[np.random.default_rng(seed).choice(len(rows), sample_rows, replace=False)]
+        if len(rows) < 2:  # nothing to learn from – fall back to the leading dimensions
+            return cls(dim, method="truncate")
+        rows = _normalise(np.asarray(rows, dtype=np.float32))
+        mean = rows.mean(axis=0)
+        # thin SVD of the centred sample: right singular vectors = principal axes
+        _, _, vt = np.linalg.svd(rows - mean, full_matrices=False)
+        components = np.zeros((mat.shape[1], dim), dtype=np.float32)
+        k = min(dim, vt.shape[0])  # fewer samples than dimensions → pad with zeros
+        components[:, :k] = vt[:k].T
+        return cls(dim, method="pca", mean=mean.astype(np.float32), components=components)
+
+    def transform(self, vectors: np.ndarray | Sequence[Sequence[float]]) -> np.ndarray:
+        """Reduced, L2-normalised copy of *vectors* (n, full dim) → (n, dim)."""
+        mat = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        zero = np.linalg.norm(mat, axis=1) == 0
+        if self.method == "truncate":
+            out = mat[:, : self.dim]
+        else:
+            out = (_normalise(mat) - self.mean) @ self.components
+        out = _normalise(np.array(out, dtype=np.float32))
+        out[zero] = 0.0
+        return out
+
+    # persistence -------------------------------------------------------------
+
+    def save(self, path: str | Path) -> Path:
+        """Write the reducer as ``.npz`` (atomically replaced)."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        arrays = {"dim": np.asarray(self.dim), "method": np.asarray(self.method)}
+        if self.method == "pca":
+            arrays.update(mean=self.mean, components=self.components)
+        with open(tmp, "wb") as fh:
+            np.savez(fh, **arrays)
+        os.replace(tmp, path)
+        return path
+
+    @classmethod
+    def load(cls, path: str | Path) -> "DenseReducer":
+        with np.load(path) as data:
+            method = str(data["method"])
+            return cls(
+                int(data["dim"]),
+                method=method,
+                mean=data["mean"] if method == "pca" else None,
+                components=data["components"] if method == "pca" else None,
+            )
+
+
+def rescore(full: np.ndarray, query: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Exact cosine of the candidate rows *full* (m, full dim) against *query*.
+
+    Returns ``(positions, scores)`` of the *top_k* best candidates, best first.
+    """
+    if len(full) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    q = np.asarray(query, dtype=np.float32)
+    q = q / (np.linalg.norm(q) or 1.0)
+    norms = np.linalg.norm(full, axis=1)
+    norms[norms == 0] = 1.0
+    scores = (np.asarray(full, dtype=np.float32) @ q) / norms
+    k = min(top_k, len(scores))
+    order = np.argpartition(-scores, k - 1)[:k]
+    order = order[np.argsort(-scores[order], kind="stable")]
+    return order, scores[order]
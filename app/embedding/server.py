@@ -0,0 +1,158 @@
+"""Stand‑alone embedding process shared by all API workers.
+
+Loads BGE‑M3 once and serves ``encode_queries`` over a local
+``multiprocessing.connection`` socket. Concurrent requests from different
+workers are micro‑batched into a single forward pass.
+
+    python -m app.embedding.server            # listens on EMBEDDER_ADDRESS
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from multiprocessing.connection import Connection, Listener
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from app.embedding.model import load_bge_m3
+from config import EMBEDDER_ADDRESS, EMBEDDER_AUTHKEY, EMBEDDER_MAX_BATCH
+
+__all__ = ["EmbeddingServer", "check_authkey", "parse_address"]
+
+logger = logging.getLogger(__name__)
+
+
+def parse_address(address: str) -> str | Tuple[str, int]:
+    """``host:port`` → TCP tuple, anything else is treated as a unix socket path."""
+    if not address.startswith("/") and ":" in address:
+        host, port = address.rsplit(":", 1)
+        return host, int(port)
+    return address
+
+
+def check_authkey(address: str | Tuple[str, int], authkey: bytes) -> None:
+    """Refuse a missing key, and a TCP address without an explicitly configured one.
+
+    The protocol unpickles what clients send, so anyone who can connect with
+    the key can run code in the server.
+    """
+    if not authkey:
+        raise ValueError("No embedder authkey – set EMBEDDER_AUTHKEY or start the server through app.serve")
+    if not isinstance(address, str) and authkey != EMBEDDER_AUTHKEY:
+        raise ValueError("A TCP embedder address needs an explicit EMBEDDER_AUTHKEY")
+
+
+def _plain_sparse(weights: Dict[Any, Any]) -> Dict[str, float]:
+    return {str(k): float(v) for k, v in weights.items()}
+
+
+class EmbeddingServer:
+    """Own the model and answer ``{"op": "encode", "texts": [...]}`` messages."""
+
+    def __init__(
+        self,
+        address: str = EMBEDDER_ADDRESS,
+        *,
+        authkey: bytes = EMBEDDER_AUTHKEY,
+        max_batch: int = EMBEDDER_MAX_BATCH,
+        num_threads: int | None = None,
+    ) -> None:
+        if not address:
+            raise ValueError("EMBEDDER_ADDRESS must be set to run the embedding server")
+        self.address = parse_address(address)
+        check_authkey(self.address, authkey)
+        self.authkey = authkey
+        self.max_batch = max_batch
+        self.num_threads = num_threads
+        self._pending: "queue.Queue[Tuple[List[str], Future]]" = queue.Queue()
+        self.model = None
+
+    # ------------------------------------------------------------------
+    # Batching
+    # ------------------------------------------------------------------
+
+    def _batch_loop(self) -> None:
+        while True:
+            batch = [self._pending.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._pending.get_nowait())
+                except queue.Empty:
+                    break
+
+            texts = [t for req, _ in batch for t in req]
+            try:
+                out = self.model.encode_queries(texts, return_dense=True, return_sparse=True)
+            except Exception as exc:
+                for _, fut in batch:
+                    fut.set_exception(exc)
+                continue
+
+            dense = np.asarray(out["dense_vecs"], dtype=np.float32)
+            sparse = out["lexical_weights"]
+            pos = 0
+            for req, fut in batch:
+                end = pos + len(req)
+                fut.set_result(
+                    {
+                        "dense_vecs": dense[pos:end],
+                        "lexical_weights": [_plain_sparse(w) for w in sparse[pos:end]],
+                    }
+                )
+                pos = end
+
+    # ------------------------------------------------------------------
+    # Connections
+    # ------------------------------------------------------------------
+
+    def _handle(self, conn: Connection) -> None:
+        with conn:
+            while True:
+                try:
+                    msg = conn.recv()
+                except (EOFError, OSError):
+                    return
+                op = msg.get("op")
+                if op == "ping":
+                    conn.send({"ok": True})
+                    continue
+                if op != "encode":
+                    conn.send({"ok": False, "error": f"unknown op {op!r}"})
+                    continue
+                fut: Future = Future()
+                self._pending.put((list(msg["texts"]), fut))
+                try:
+                    conn.send({"ok": True, "result": fut.result()})
+                except Exception as exc:
+                    conn.send({"ok": False, "error": f"{type(exc).__name__}: {exc}"})
+
+    def _load_model(self) -> Any:
+        return load_bge_m3() if self.num_threads is None else load_bge_m3(self.num_threads)
+
+    def serve_forever(self, ready: threading.Event | None = None) -> None:
+        self.model = self._load_model()
+        threading.Thread(target=self._batch_loop, name="embedder-batch", daemon=True).start()
+
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.unlink(self.address)  # stale socket from a previous run
+        with Listener(self.address, authkey=self.authkey) as listener:
+            logger.info("Embedding server listening on %s", self.address)
+            if ready is not None:
+                ready.set()
+            while True:
+                try:
+                    conn = listener.accept()
+                except Exception:  # auth failure / aborted handshake
+                    logger.warning("Rejected embedding client connection", exc_info=True)
+                    continue
+                threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(name)s - %(message)s")
+    EmbeddingServer().serve_forever()
@@ -0,0 +1,74 @@
+"""Pruning of BGE‑M3 lexical (``sparse_title``) vectors.
+
+A title vector holds a weight for nearly every token of the title, and a
+query vector one for every token of the question. The low-weight tail (stop
+words, sub-word pieces) adds postings to the inverted index and work to every
+inner product, but rarely changes the ranking. :func:`prune_sparse` keeps
+only the strongest entries:
+
+* ``threshold`` – drop weights below it;
+* ``drop_ratio`` – drop that fraction of the smallest remaining weights
+  (Milvus' ``drop_ratio_build`` / ``drop_ratio_search``);
+* ``top_n`` – keep at most that many.
+
+Ingest applies the ``*_BUILD`` settings and queries the ``*_QUERY`` ones. A
+non-empty vector never comes out empty: at least its strongest entry stays.
+"""
+
+from __future__ import annotations
+
+import heapq
+from typing import Dict, Mapping, TypeVar
+
+from config import (
+    SPARSE_PRUNE_THRESHOLD_BUILD,
+    SPARSE_PRUNE_THRESHOLD_QUERY,
+    SPARSE_PRUNE_TOP_N_BUILD,
+    SPARSE_PRUNE_TOP_N_QUERY,
+)
+
+__all__ = ["prune_sparse", "prune_build", "prune_query", "validate_drop_ratio"]
+
+K = TypeVar("K")
+
+
+def validate_drop_ratio(value: float, *, name: str = "drop_ratio") -> float:
+    if not 0.0 <= value < 1.0:
+        raise ValueError(f"{name} must be in [0, 1), got {value}")
+    return value
+
+
+def prune_sparse(
+    weights: Mapping[K, float],
+    *,
+    top_n: int = 0,
+    threshold: float = 0.0,
+    drop_ratio: float = 0.0,
+) -> Dict[K, float]:
+    """Strongest entries of *weights* (see the module docstring); 0 disables a rule."""
+    if not weights or (top_n <= 0 and threshold <= 0 and drop_ratio <= 0):
+        return dict(weights)
+    items = [(k, float(w)) for k, w in weights.items()]
+    keep = [kv for kv in items if kv[1] >= threshold] if threshold > 0 else items
+    n = len(keep) - int(len(keep) * drop_ratio)
+    if top_n > 0:
+        n = min(n, top_n)
+    if n <= 0:
+        return dict([max(items, key=lambda kv: kv[1])])
+    if n < len(keep):
+        keep = heapq.nlargest(n, keep, key=lambda kv: kv[1])
+    return dict(keep)
+
+
+def prune_build(weights: Mapping[K, float], *, drop_ratio: float = 0.0) -> Dict[K, float]:
+    """Ingest-time pruning with the ``SPARSE_PRUNE_*_BUILD`` settings."""
+    return prune_sparse(
+        weights, top_n=SPARSE_PRUNE_TOP_N_BUILD, threshold=SPARSE_PRUNE_THRESHOLD_BUILD, drop_ratio=drop_ratio
+    )
+
+
+def prune_query(weights: Mapping[K, float], *, drop_ratio: float = 0.0) -> Dict[K, float]:
+    """Query-time pruning with the ``SPARSE_PRUNE_*_QUERY`` settings."""
+    return prune_sparse(
+        weights, top_n=SPARSE_PRUNE_TOP_N_QUERY, threshold=SPARSE_PRUNE_THRESHOLD_QUERY, drop_ratio=drop_ratio
+    )
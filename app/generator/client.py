@@ -0,0 +1,329 @@
+"""Pooled Ollama client with per‑model concurrency limits and coalescing.
+
+* one ``requests.Session`` with a keep‑alive connection pool;
+* at most ``OLLAMA_MAX_CONCURRENCY`` generations per model in flight, at most
+  ``OLLAMA_MAX_QUEUE`` waiting behind them – beyond that callers get a fast
+  :class:`GeneratorBusyError` (mapped to HTTP 429) instead of piling up;
+* identical payloads already in flight are answered by the same upstream call;
+* requests are spread over ``OLLAMA_BACKENDS`` by :class:`BackendRouter`,
+  failing over to the next backend on connection errors and 5xx replies;
+* deterministic payloads (temperature 0 or a fixed seed) are answered from
+  the persistent cache tier when the same prompt was generated before;
+* with a :class:`~app.cancellation.CancelToken` the upstream call is streamed
+  and the connection is closed once the token is cancelled, which makes
+  Ollama stop generating; the queue wait and the wait for a coalesced
+  leader are abandoned as well.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Any, Dict, Iterable, Set
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from app.cache_tier import cache_key, get_cache
+from app.cancellation import CancelToken, CancelledRequestError
+from app.generator.router import BackendRouter, NoBackendAvailableError
+from app.metrics import metrics
+from config import (
+    OLLAMA_BACKENDS,
+    OLLAMA_KEEP_ALIVE,
+    OLLAMA_MAX_CONCURRENCY,
+    OLLAMA_MAX_QUEUE,
+    OLLAMA_POOL_SIZE,
+    OLLAMA_QUEUE_TIMEOUT,
+    OLLAMA_TIMEOUT,
+)
+
+__all__ = ["GeneratorBusyError", "OllamaClient", "get_client"]
+
+logger = logging.getLogger(__name__)
+
+
+class GeneratorBusyError(RuntimeError):
+    """Raised when a model's queue is full or the queue wait timed out."""
+
+    def __init__(self, model: str, reason: str, retry_after: float = 1.0) -> None:
+        super().__init__(f"Generator busy for model '{model}': {reason}")
+        self.model = model
+        self.retry_after = retry_after
+
+
+def _deterministic(payload: Dict[str, Any]) -> bool:
+    """Whether Ollama returns the same answer for *payload* every time."""
+    options = payload.get("options") or {}
+    return bool(payload.get("prompt")) and (options.get("temperature") == 0 or options.get("seed") is not None)
+
+
+class _ModelLimiter:
+    __slots__ = ("slots", "waiting", "lock")
+
+    def __init__(self, concurrency: int) -> None:
+        self.slots = threading.BoundedSemaphore(concurrency)
+        self.waiting = 0
+        self.lock = threading.Lock()
+
+
+class OllamaClient:
+    """Thread‑safe, process‑wide access point for Ollama ``/api/generate``."""
+
+    def __init__(
+        self,
+        backends: Iterable[str] = OLLAMA_BACKENDS,
+        *,
+        max_concurrency: int = OLLAMA_MAX_CONCURRENCY,
+        max_queue: int = OLLAMA_MAX_QUEUE,
+        queue_timeout: float = OLLAMA_QUEUE_TIMEOUT,
+        timeout: float = OLLAMA_TIMEOUT,
+        pool_size: int = OLLAMA_POOL_SIZE,
+    ) -> None:
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.router = BackendRouter(backends, session=self.session)
+
+        self._limiters: Dict[str, _ModelLimiter] = {}
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def generate(self, payload: Dict[str, Any], *, cancel: CancelToken | None = None) -> Dict[str, Any]:
+        """POST *payload* (non‑streaming) and return Ollama's JSON reply.
+
+        With *cancel* the reply is streamed from Ollama and assembled here,
+        so generation can be aborted mid-answer.
+
+        Raises
+        ------
+        GeneratorBusyError
+            If the model's queue is full or no slot freed up in time.
+        CancelledRequestError
+            If *cancel* fired while queued or generating.
+        requests.HTTPError
+            On a non‑2xx response from Ollama.
+        """
+        cache = get_cache() if _deterministic(payload) else None
+        if cache is not None:
+            cached = cache.get("answer", cache_key("answer", payload))
+            if cached is not None:
+                return dict(cached)
+
+        key = hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+        with self._lock:
+            leader = self._inflight.get(key)
+            if leader is None:
+                fut: Future = Future()
+                self._inflight[key] = fut
+        if leader is not None:
+            metrics.incr("generator.coalesced")
+            try:
+                return dict(self._follow(leader, cancel))
+            except CancelledRequestError:
+                if cancel is not None and cancel.cancelled:
+                    raise
+                # the leader's client went away, ours did not – run it ourselves
+                return dict(self._generate_limited(payload, cancel))
+
+        try:
+            result = self._generate_limited(payload, cancel)
+            fut.set_result(result)
+            if cache is not None and result.get("done", True):
+                cache.set("answer", cache_key("answer", payload), result, tag=str(payload.get("model", "")))
+            return dict(result)
+        except BaseException as exc:
+            fut.set_exception(exc)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def warm(self, model: str, *, keep_alive: str = OLLAMA_KEEP_ALIVE) -> bool:
+        """Load *model* on the backend it will be routed to (empty‑prompt request).
+
+        Returns False without a request when a healthy backend already has
+        the model resident.
+        """
+        backend = self.router.pick(model)
+        if backend.healthy and backend.warm_models & {model, f"{model}:latest"}:
+            return False
+        with self.router.use(backend, model), metrics.timer("generator.warmup_seconds"):
+            resp = self.session.post(
+                backend.generate_url,
+                json={"model": model, "keep_alive": keep_alive},
+                timeout=self.timeout,
+            )
+            resp.raise_for_status()
+        return True
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+
+    def _limiter(self, model: str) -> _ModelLimiter:
+        with self._lock:
+            lim = self._limiters.get(model)
+            if lim is None:
+                # admission control across the whole fleet of backends
+                lim = self._limiters[model] = _ModelLimiter(self.max_concurrency * len(self.router.backends))
+            return lim
+
+    def _generate_limited(self, payload: Dict[str, Any], cancel: CancelToken | None = None) -> Dict[str, Any]:
+        model = str(payload.get("model", ""))
+        lim = self._limiter(model)
+
+        with lim.lock:
+            if lim.waiting >= self.max_queue:
+                metrics.incr("generator.rejected")
+                raise GeneratorBusyError(model, f"{lim.waiting} requests already queued")
+            lim.waiting += 1
+        metrics.incr("generator.queued")
+
+        start = time.perf_counter()
+        try:
+            acquired = self._acquire(lim, cancel)
+        finally:
+            with lim.lock:
+                lim.waiting -= 1
+        waited = time.perf_counter() - start
+        metrics.observe("generator.queue_wait_seconds", waited)
+        if not acquired:
+            if cancel is not None:
+                cancel.raise_if_cancelled("generator_queue")
+            metrics.incr("generator.rejected")
+            raise GeneratorBusyError(model, f"no free slot after {waited:.1f}s")
+
+        try:
+            return self._post_with_failover(model, payload, cancel)
+        finally:
+            lim.slots.release()
+
+    @staticmethod
+    def _follow(leader: Future, cancel: CancelToken | None) -> Dict[str, Any]:
+        """Wait for a coalesced leader's reply; stop waiting once *cancel* fired."""
+        if cancel is None:
+            return leader.result()
+        while True:
+            cancel.raise_if_cancelled("generator_coalesced")
+            try:
+                return leader.result(timeout=0.1)
+            except FutureTimeout:
+                continue
+
+    def _acquire(self, lim: _ModelLimiter, cancel: CancelToken | None) -> bool:
+        """Wait for a slot; False on timeout or once *cancel* fired."""
+        if cancel is None:
+            return lim.slots.acquire(timeout=self.queue_timeout)
+        deadline = time.monotonic() + self.queue_timeout
+        while not cancel.cancelled:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            if lim.slots.acquire(timeout=min(remaining, 0.1)):
+                return True
+        return False
+
+    def _read_stream(self, resp: requests.Response, cancel: CancelToken) -> Dict[str, Any]:
+        """Assemble a streamed ``/api/generate`` reply into the non‑streaming shape.
+
+        Cancelling closes *resp* from the cancelling thread, which unblocks
+        the read here and drops the connection – Ollama then stops.
+        """
+        parts: list[str] = []
+        data: Dict[str, Any] = {}
+        remove = cancel.on_cancel(resp.close)
+        try:
+            for line in resp.iter_lines():
+                if cancel.cancelled:
+                    break
+                if not line:
+                    continue
+                data = json.loads(line)
+                parts.append(data.get("response", ""))
+                if data.get("done"):
+                    break
+        except (requests.RequestException, AttributeError, ValueError):
+            # AttributeError: urllib3 reading from a response closed under it
+            if not cancel.cancelled:
+                raise
+        finally:
+            remove()
+            resp.close()
+        if cancel.cancelled:
+            metrics.incr("generator.cancelled")
+            metrics.observe("generator.cancelled_tokens", len(parts))
+            cancel.raise_if_cancelled("generation")
+        data["response"] = "".join(parts)
+        return data
+
+    def _post_with_failover(
+        self, model: str, payload: Dict[str, Any], cancel: CancelToken | None = None
+    ) -> Dict[str, Any]:
+        tried: Set[str] = set()
+        last_exc: Exception | None = None
+        while True:
+            try:
+                backend = self.router.pick(model, exclude=tried)
+            except NoBackendAvailableError:
+                if last_exc is not None:
+                    raise last_exc
+                raise
+            tried.add(backend.base_url)
+            try:
+                with self.router.use(backend, model), metrics.timer("generator.upstream_seconds"):
+                    if cancel is None:
+                        resp = self.session.post(backend.generate_url, json=payload, timeout=self.timeout)
+                    else:
+                        cancel.raise_if_cancelled("generation")
+                        resp = self.session.post(
+                            backend.generate_url, json={**payload, "stream": True}, timeout=self.timeout, stream=True
+                        )
+                    # closes a streamed response on error replies too
+                    with resp:
+                        if resp.status_code >= 500:
+                            self.router.mark_failed(backend)
+                        resp.raise_for_status()
+                        data = resp.json() if cancel is None else self._read_stream(resp, cancel)
+            except (requests.ConnectionError, requests.Timeout, requests.HTTPError) as exc:
+                status = getattr(exc.response, "status_code", None)
+                if status is not None and status < 500 and status != 404:
+                    raise  # bad request – another backend won't do better
+                # 404 → model not pulled on this host; try the others as well
+                last_exc = exc
+                logger.warning("Ollama backend %s failed for '%s': %s", backend.base_url, model, exc)
+                metrics.incr("generator.failovers")
+                continue
+
+            load_ns = data.get("load_duration")
+            if load_ns:
+                metrics.observe("generator.model_load_seconds", load_ns / 1e9)
+            return data
+
+
+_client: OllamaClient | None = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> OllamaClient:
+    """Process‑wide :class:`OllamaClient` (lazily created)."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = OllamaClient()
+    return _client
@@ -0,0 +1,168 @@
+"""Route generations across several Ollama hosts by model residency and load.
+
+Each backend is polled on ``/api/ps`` to learn which models it has loaded.
+A request for model *m* goes to the healthy backend that has *m* warm and
+the fewest requests in flight; only if none has it warm does it fall back
+to the least‑loaded healthy backend (paying the model load once there).
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Set
+
+import requests
+
+from app.metrics import metrics
+from config import OLLAMA_BACKENDS, OLLAMA_HEALTH_INTERVAL
+
+__all__ = ["Backend", "BackendRouter", "NoBackendAvailableError"]
+
+logger = logging.getLogger(__name__)
+
+
+class NoBackendAvailableError(RuntimeError):
+    """Every configured Ollama backend failed or was excluded."""
+
+
+@dataclass
+class Backend:
+    base_url: str
+    healthy: bool = True
+    inflight: int = 0
+    warm_models: Set[str] = field(default_factory=set)
+    failures: int = 0
+    last_checked: float = 0.0
+
+    @property
+    def generate_url(self) -> str:
+        return f"{self.base_url}/api/generate"
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "base_url": self.base_url,
+            "healthy": self.healthy,
+            "inflight": self.inflight,
+            "warm_models": sorted(self.warm_models),
+            "failures": self.failures,
+            "last_checked": self.last_checked,
+        }
+
+
+def _model_names(model: str) -> Set[str]:
+    """Ollama reports ``name:latest`` for an untagged ``name``."""
+    return {model, f"{model}:latest"} if ":" not in model else {model}
+
+
+class BackendRouter:
+    """Pick a backend per request; track health, load and warm models."""
+
+    def __init__(
+        self,
+        base_urls: Iterable[str] = OLLAMA_BACKENDS,
+        *,
+        health_interval: float = OLLAMA_HEALTH_INTERVAL,
+        session: requests.Session | None = None,
+    ) -> None:
+        self.backends: List[Backend] = [Backend(u.rstrip("/")) for u in base_urls]
+        if not self.backends:
+            raise ValueError("At least one Ollama backend is required")
+        self.health_interval = health_interval
+        self.session = session or requests.Session()
+        self._lock = threading.Lock()
+        self._rr = 0
+        self._poller: threading.Thread | None = None
+
+    # ------------------------------------------------------------------
+    # Selection
+    # ------------------------------------------------------------------
+
+    def pick(self, model: str, *, exclude: Set[str] = frozenset()) -> Backend:
+        self._ensure_poller()
+        names = _model_names(model)
+        with self._lock:
+            pool = [b for b in self.backends if b.base_url not in exclude]
+            if not pool:
+                raise NoBackendAvailableError(f"No Ollama backend left to try for model '{model}'")
+            healthy = [b for b in pool if b.healthy] or pool  # all down → retry anyway
+            warm = [b for b in healthy if b.warm_models & names]
+            candidates = warm or healthy
+            self._rr += 1
+            # least in‑flight; round‑robin among ties
+            best = min(
+                candidates,
+                key=lambda b: (b.inflight, (self.backends.index(b) - self._rr) % len(self.backends)),
+            )
+            if not warm:
+                metrics.incr("generator.cold_routes")
+            return best
+
+    @contextmanager
+    def use(self, backend: Backend, model: str) -> Iterator[Backend]:
+        """Count *backend* as busy for the duration; mark the model warm on success."""
+        with self._lock:
+            backend.inflight += 1
+        try:
+            yield backend
+        except (requests.ConnectionError, requests.Timeout):
+            self.mark_failed(backend)
+            raise
+        else:
+            with self._lock:
+                backend.warm_models |= _model_names(model)
+                backend.failures = 0
+                backend.healthy = True
+        finally:
+            with self._lock:
+                backend.inflight -= 1
+
+    def mark_failed(self, backend: Backend) -> None:
+        with self._lock:
+            backend.failures += 1
+            backend.healthy = False
+        metrics.incr("generator.backend_failures")
+        logger.warning("Ollama backend %s marked unhealthy", backend.base_url)
+
+    def status(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [b.as_dict() for b in self.backends]
+
+    # ------------------------------------------------------------------
+    # Health / residency polling
+    # ------------------------------------------------------------------
+
+    def poll_once(self) -> None:
+        for backend in self.backends:
+            try:
+                resp = self.session.get(f"{backend.base_url}/api/ps", timeout=5)
+                resp.raise_for_status()
+                warm = {m.get("name") or m.get("model") for m in resp.json().get("models", [])}
+                with self._lock:
+                    backend.warm_models = {w for w in warm if w}
+                    backend.healthy = True
+                    backend.failures = 0
+            except Exception as exc:
+                with self._lock:
+                    backend.healthy = False
+                    backend.failures += 1
+                logger.debug("Health check failed for %s: %s", backend.base_url, exc)
+            backend.last_checked = time.time()
+        metrics.set("generator.healthy_backends", sum(b.healthy for b in self.backends))
+
+    def _ensure_poller(self) -> None:
+        if self._poller is not None or self.health_interval <= 0:
+            return
+        with self._lock:
+            if self._poller is not None:
+                return
+            self._poller = threading.Thread(target=self._poll_loop, name="ollama-health", daemon=True)
+        self._poller.start()
+
+    def _poll_loop(self) -> None:
+        while True:
+            self.poll_once()
+            time.sleep(self.health_interval)
@@ -0,0 +1,234 @@
+"""Walk a project directory and cut it into dataset-shaped chunks.
+
+The output matches the Kaggle export, so retrieval and
+:func:`utils.place_snippets_in_text` treat the chunks like the official docs.
+
+* Markdown / MDX is split at headings into sections of at most
+  ``max_chars``. Each fenced block becomes a ```code_snippet_N``` marker in
+  ``text_content``, with the code itself in ``code_content``.
+* Source files are cut at top-level declarations
+  (:func:`app.query.code_chunks.split_code`). Each piece is a chunk whose text
+  names the file and holds one snippet marker.
+
+Build artefacts, VCS folders and ``node_modules`` are skipped, as are files
+larger than ``INGEST_MAX_FILE_BYTES``.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterator, List, Sequence
+
+from app.query.code_chunks import split_code
+from config import INGEST_CHUNK_CHARS, INGEST_MAX_FILE_BYTES
+
+__all__ = ["Chunk", "walk_project", "chunk_markdown", "chunk_source", "chunk_file"]
+
+MARKDOWN_EXTS = {".md", ".mdx", ".markdown"}
+CODE_EXTS = {
+    ".js", ".jsx", ".ts", ".tsx", ".mjs", ".cjs", ".json", ".css", ".scss",
+    ".py", ".go", ".rs", ".java", ".rb", ".php", ".sh", ".yml", ".yaml", ".graphql", ".sql",
+}
+SKIP_DIRS = {
+    ".git", ".hg", ".svn", "node_modules", ".next", ".turbo", ".vercel", "dist", "build", "out",
+    "coverage", "__pycache__", ".venv", "venv", ".cache",
+}
+SKIP_FILES = {"package-lock.json", "yarn.lock", "pnpm-lock.yaml"}
+
+_HEADING = re.compile(r"^(#{1,3})\s+(.+?)\s*#*\s*$")
+_FENCE = re.compile(r"^(```|~~~)\s*([\w+-]*)([^\n]*)$")
+_FILENAME = re.compile(r'filename\s*=\s*["\']([^"\']+)["\']')
+_FRONT_MATTER = re.compile(r"\A---\n.*?\n---\n", re.S)
+_FM_TITLE = re.compile(r"^title:\s*['\"]?(.+?)['\"]?\s*$", re.M)
+
+
+@dataclass
+class Chunk:
+    """One row of the dataset layout, before embedding."""
+
+    path: str  # relative to the project root, POSIX separators
+    index: int  # position within the file
+    title: str
+    text_content: str
+    code_content: List[Dict[str, object]] = field(default_factory=list)
+    metadata: Dict[str, object] = field(default_factory=dict)
+
+    @property
+    def code(self) -> str:
+        """All snippets joined – the input of the dense code vector."""
+        return "\n\n".join(str(s["code"]) for s in self.code_content)
+
+    def digest(self) -> str:
+        h = hashlib.sha256()
+        for part in (self.title, self.text_content, repr(self.code_content)):
+            h.update(part.encode("utf-8"))
+            h.update(b"\0")
+        return h.hexdigest()
+
+
+def walk_project(root: str | Path, *, include: Sequence[str] | None = None) -> Iterator[Path]:
+    """Markdown and source files under *root*, in a stable order.
+
+    *include* restricts the walk to these extensions (e.g. ``[".mdx", ".tsx"]``).
+    """
+    root = Path(root)
+    wanted = {e if e.startswith(".") else f".{e}" for e in include} if include else MARKDOWN_EXTS | CODE_EXTS
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d not in SKIP_DIRS and not d.startswith("."))
+        for name in sorted(filenames):
+            path = Path(dirpath, name)
+            if name in SKIP_FILES or path.suffix.lower() not in wanted:
+                continue
+            try:
+                if path.stat().st_size > INGEST_MAX_FILE_BYTES:
+                    continue
+            except OSError:
+                continue
+            yield path
+
+
+# -----------------------------------------------------------------------------
+# Markdown
+# -----------------------------------------------------------------------------
+
+
+def _sections(body: str) -> Iterator[tuple[List[str], List[str]]]:
+    """``(heading path, lines)`` per heading section; fences never split."""
+    headings: List[str] = []
+    lines: List[str] = []
+    in_fence = False
+    for line in body.splitlines():
+        if _FENCE.match(line.strip()):
+            in_fence = not in_fence
+        match = None if in_fence else _HEADING.match(line)
+        if match:
+            if any(ln.strip() for ln in lines):
+                yield list(headings), lines
+            level = len(match.group(1))
+            headings = headings[: level - 1] + [match.group(2)]
+            lines = [line]
+        else:
+            lines.append(line)
+    if any(ln.strip() for ln in lines):
+        yield list(headings), lines
+
+
+def _blocks(lines: List[str]) -> Iterator[tuple[str, Dict[str, object] | None]]:
+    """Paragraph text and fenced code blocks of one section, in order."""
+    para: List[str] = []
+    fence: List[str] | None = None
+    info = ("", "")
+    for line in lines:
+        m = _FENCE.match(line.strip())
+        if fence is None and m:
+            if para:
+                yield "\n".join(para), None
+                para = []
+            fence, info = [], (m.group(2), m.group(3))
+        elif fence is not None and m and not m.group(2) and not m.group(3).strip():
+            lang, rest = info
+            fname = _FILENAME.search(rest)
+            yield "", {
+                "language": lang,
+                "filename": fname.group(1) if fname else "",
+                "switcher": "switcher" in rest,
+                "code": "\n".join(fence),
+            }
+            fence = None
+        elif fence is not None:
+            fence.append(line)
+        elif line.strip():
+            para.append(line)
+        elif para:
+            yield "\n".join(para), None
+            para = []
+    if fence is not None:  # unterminated fence – keep it as text
+        para += ["```" + info[0]] + fence
+    if para:
+        yield "\n".join(para), None
+
+
+def chunk_markdown(source: str, rel_path: str, *, max_chars: int = INGEST_CHUNK_CHARS) -> List[Chunk]:
+    """Heading sections of a markdown document, packed up to *max_chars*."""
+    doc_title = Path(rel_path).stem
+    fm = _FRONT_MATTER.match(source)
+    if fm:
+        t = _FM_TITLE.search(fm.group(0))
+        doc_title = t.group(1) if t else doc_title
+        source = source[fm.end():]
+
+    chunks: List[Chunk] = []
+
+    def emit(headings: List[str], texts: List[str], snippets: List[Dict[str, object]]) -> None:
+        title = " – ".join([doc_title, *[h for h in headings if h != doc_title]])
+        chunks.append(
+            Chunk(
+                path=rel_path,
+                index=len(chunks),
+                title=title,
+                text_content="\n\n".join(texts),
+                code_content=snippets,
+                metadata={"source": "local", "page": rel_path, "section": headings[-1] if headings else doc_title},
+            )
+        )
+
+    for headings, lines in _sections(source):
+        texts: List[str] = []
+        snippets: List[Dict[str, object]] = []
+        size = 0
+        for text, snippet in _blocks(lines):
+            piece = len(text) + (len(str(snippet["code"])) if snippet else 0)
+            if size and size + piece > max_chars:
+                emit(headings, texts, snippets)
+                texts, snippets, size = [], [], 0
+            if snippet is not None:
+                snippets.append(snippet)
+                texts.append(f"```code_snippet_{len(snippets)}```")
+            else:
+                texts.append(text)
+            size += piece
+        if texts:
+            emit(headings, texts, snippets)
+    return chunks
+
+
+# -----------------------------------------------------------------------------
+# Source files
+# -----------------------------------------------------------------------------
+
+
+def chunk_source(source: str, rel_path: str, *, max_chars: int = INGEST_CHUNK_CHARS) -> List[Chunk]:
+    """Declaration-aligned pieces of a source file, one snippet each."""
+    lang = Path(rel_path).suffix.lstrip(".").lower()
+    pieces = split_code(source, max_chars=max_chars)
+    chunks = []
+    for i, piece in enumerate(pieces):
+        part = f" (part {i + 1}/{len(pieces)})" if len(pieces) > 1 else ""
+        chunks.append(
+            Chunk(
+                path=rel_path,
+                index=i,
+                title=f"{rel_path}{part}",
+                text_content=f"Source of `{rel_path}`{part}.\n\n```code_snippet_1```",
+                code_content=[{"language": lang, "filename": rel_path, "switcher": False, "code": piece}],
+                metadata={"source": "local", "page": rel_path, "language": lang},
+            )
+        )
+    return chunks
+
+
+def chunk_file(path: Path, root: Path, *, max_chars: int = INGEST_CHUNK_CHARS) -> List[Chunk]:
+    rel = path.relative_to(root).as_posix()
+    try:
+        source = path.read_text(encoding="utf-8")
+    except (UnicodeDecodeError, OSError):
+        return []
+    if not source.strip():
+        return []
+    if path.suffix.lower() in MARKDOWN_EXTS:
+        return chunk_markdown(source, rel, max_chars=max_chars)
+    return chunk_source(source, rel, max_chars=max_chars)
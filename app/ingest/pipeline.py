@@ -0,0 +1,314 @@
+"""Embed a local project into a version CSV in the dataset layout.
+
+    python -m app.ingest.pipeline ~/src/my-app --version local-my-app --workers 4 --build --register
+
+The project is chunked by :mod:`app.ingest.chunker`. Titles get a sparse and
+a dense vector, section text a dense text vector and snippets a dense code
+vector. Unique strings are embedded in batches of ``INGEST_BATCH_SIZE``,
+spread over ``INGEST_WORKERS`` processes. Each process loads BGE‑M3, or
+talks to the shared embedding server when ``EMBEDDER_ADDRESS`` is set.
+
+Vectors are cached in SQLite under ``INGEST_CACHE_DIR``, keyed by the
+SHA‑256 of model tag + string, so a re-run embeds only what changed. The
+result is ``DOWNLOADS_DIR/<version>.csv`` with the Kaggle columns, and
+``build_from_csv`` ingests it like any other version. ``--build`` does that
+for the configured backend; ``--register`` adds the version to
+``supported_versions.txt``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.ingest.chunker import Chunk, chunk_file, walk_project
+from config import (
+    DENSE_VECTOR_DIM,
+    DOWNLOADS_DIR,
+    EMBEDDER_ADDRESS,
+    INGEST_BATCH_SIZE,
+    INGEST_CACHE_DIR,
+    INGEST_CHUNK_CHARS,
+    INGEST_WORKERS,
+    SUPPORTED_VERSIONS_FILE,
+)
+
+__all__ = ["EmbeddingCache", "embed_texts", "ingest_project"]
+
+logger = logging.getLogger(__name__)
+
+Vector = Tuple[np.ndarray, Dict[str, float]]
+
+
+# -----------------------------------------------------------------------------
+# Content-hash cache
+# -----------------------------------------------------------------------------
+
+
+class EmbeddingCache:
+    """``sha256(model tag, text)`` → dense + sparse vector, in one SQLite file."""
+
+    def __init__(self, path: str | Path, *, model_tag: str = "bge-m3") -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.model_tag = model_tag
+        self._db = sqlite3.connect(self.path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS vectors (key TEXT PRIMARY KEY, dense BLOB, sparse TEXT)")
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_tag}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, texts: Iterable[str]) -> Dict[str, Vector]:
+        by_key = {self.key(t): t for t in texts}
+        found: Dict[str, Vector] = {}
+        keys = list(by_key)
+        for i in range(0, len(keys), 500):  # stay under SQLite's variable limit
+            part = keys[i : i + 500]
+            rows = self._db.execute(
+                f"SELECT key, dense, sparse FROM vectors WHERE key IN ({','.join('?' * len(part))})", part
+            )
+            for key, dense, sparse in rows:
+                found[by_key[key]] = (np.frombuffer(dense, dtype=np.float32), json.loads(sparse))
+        return found
+
+    def put_many(self, items: Dict[str, Vector]) -> None:
+        with self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO vectors VALUES (?, ?, ?)",
+                [
+                    (self.key(t), np.asarray(d, dtype=np.float32).tobytes(), json.dumps(s))
+                    for t, (d, s) in items.items()
+                ],
+            )
+
+    def close(self) -> None:
+        self._db.close()
+
+
+# -----------------------------------------------------------------------------
+# Batched embedding across processes
+# -----------------------------------------------------------------------------
+
+_model = None
+
+
+def _load_model():
+    if EMBEDDER_ADDRESS:
+        from app.embedding.client import RemoteEmbedder
+
+        return RemoteEmbedder(EMBEDDER_ADDRESS)
+    from app.embedding.model import load_bge_m3
+
+    return load_bge_m3()
+
+
+def _init_worker() -> None:
+    global _model
+    _model = _load_model()
+
+
+def _encode_batch(texts: List[str]) -> Tuple[np.ndarray, List[Dict[str, float]]]:
+    global _model
+    if _model is None:
+        _model = _load_model()
+    # BGEM3FlagModel.encode takes passages up to 8192 tokens; the remote
+    # embedder only exposes encode_queries
+    encode = getattr(_model, "encode", None) or _model.encode_queries
+    out = encode(texts, return_dense=True, return_sparse=True)
+    dense = np.asarray(out["dense_vecs"], dtype=np.float32).reshape(len(texts), -1)
+    sparse = [{str(k): float(v) for k, v in w.items()} for w in out["lexical_weights"]]
+    return dense, sparse
+
+
+def embed_texts(
+    texts: Sequence[str],
+    *,
+    workers: int = INGEST_WORKERS,
+    batch_size: int = INGEST_BATCH_SIZE,
+) -> Dict[str, Vector]:
+    """Dense + sparse vectors of *texts*, embedded in batches over *workers* processes."""
+    batches = [list(texts[i : i + batch_size]) for i in range(0, len(texts), batch_size)]
+    if not batches:
+        return {}
+    if workers <= 1 or len(batches) == 1:
+        results = map(_encode_batch, batches)
+        return _collect(batches, results)
+    # spawn: torch and fork do not mix
+    with ProcessPoolExecutor(
+        max_workers=min(workers, len(batches)), mp_context=get_context("spawn"), initializer=_init_worker
+    ) as pool:
+        return _collect(batches, pool.map(_encode_batch, batches))
+
+
+def _collect(batches, results) -> Dict[str, Vector]:
+    out: Dict[str, Vector] = {}
+    done = 0
+    for batch, (dense, sparse) in zip(batches, results):
+        for text, d, s in zip(batch, dense, sparse):
+            out[text] = (d, s)
+        done += len(batch)
+        logger.info("Embedded %d texts", done)
+    return out
+
+
+# -----------------------------------------------------------------------------
+# Project → version CSV
+# -----------------------------------------------------------------------------
+
+
+def _inputs(chunk: Chunk) -> Tuple[str, str, str]:
+    """(title, dense text input, dense code input) of one chunk."""
+    return chunk.title, f"{chunk.title}\n{chunk.text_content}", chunk.code
+
+
+def _entry_id(version: str, chunk: Chunk) -> str:
+    return f"{version}-{hashlib.sha1(f'{chunk.path}#{chunk.index}'.encode()).hexdigest()[:16]}"
+
+
+def _dense_json(vec: np.ndarray | None) -> str:
+    if vec is None:
+        return ""  # read back as a zero vector
+    return json.dumps([round(float(x), 6) for x in vec])
+
+
+def ingest_project(
+    root: str | Path,
+    *,
+    version: str,
+    tag: str = "project",
+    out: str | Path | None = None,
+    include: Sequence[str] | None = None,
+    workers: int = INGEST_WORKERS,
+    batch_size: int = INGEST_BATCH_SIZE,
+    max_chars: int = INGEST_CHUNK_CHARS,
+    cache_dir: str | Path = INGEST_CACHE_DIR,
+    model_tag: str = "bge-m3",
+) -> Dict[str, Any]:
+    """Chunk, embed (cache misses only) and write *root* as the CSV of *version*."""
+    started = time.perf_counter()
+    root = Path(root).resolve()
+    if not root.is_dir():
+        raise ValueError(f"{root} is not a directory")
+
+    files = list(walk_project(root, include=include))
+    chunks = [c for path in files for c in chunk_file(path, root, max_chars=max_chars)]
+    if not chunks:
+        raise ValueError(f"No markdown or source files found under {root}")
+
+    wanted = sorted({s for c in chunks for s in _inputs(c) if s.strip()})
+    cache = EmbeddingCache(Path(cache_dir) / "vectors.sqlite", model_tag=model_tag)
+    try:
+        vectors = cache.get_many(wanted)
+        missing = [t for t in wanted if t not in vectors]
+        logger.info("%d chunks from %d files – %d of %d texts to embed", len(chunks), len(files), len(missing), len(wanted))
+        fresh = embed_texts(missing, workers=workers, batch_size=batch_size)
+        cache.put_many(fresh)
+        vectors.update(fresh)
+    finally:
+        cache.close()
+
+    records = []
+    for c in chunks:
+        title, text_in, code_in = _inputs(c)
+        title_vec = vectors.get(title)
+        sparse = title_vec[1] if title_vec else {}
+        code_vec = vectors[code_in][0] if code_in.strip() else None
+        records.append(
+            {
+                "entry_id": _entry_id(version, c),
+                "title": title,
+                "metadata": json.dumps({**c.metadata, "sha256": c.digest()}),
+                "version": version,
+                "text_content": c.text_content,
+                "code_content": repr(c.code_content),
+                "sparse_title": repr([(int(k), round(v, 6)) for k, v in sparse.items() if k.isdigit()]),
+                "dense_text_content": _dense_json(vectors[text_in][0]),
+                "dense_code_snippet": _dense_json(code_vec),
+                "tag": tag,
+            }
+        )
+
+    dim = len(vectors[_inputs(chunks[0])[1]][0])
+    if dim != DENSE_VECTOR_DIM:
+        raise ValueError(f"Embedder returned {dim}-d vectors, the schema expects {DENSE_VECTOR_DIM}")
+
+    out = Path(out) if out else DOWNLOADS_DIR / f"{version}.csv"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out.with_suffix(f".{os.getpid()}.tmp")
+    pd.DataFrame.from_records(records).to_csv(tmp, index=False)
+    os.replace(tmp, out)
+
+    return {
+        "version": version,
+        "csv": str(out),
+        "files": len(files),
+        "chunks": len(chunks),
+        "texts": len(wanted),
+        "embedded": len(missing),
+        "cached": len(wanted) - len(missing),
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+def register_version(version: str, versions_file: str | Path = SUPPORTED_VERSIONS_FILE) -> bool:
+    """Append *version* to the supported versions file; False if already listed."""
+    path = Path(versions_file)
+    listed = path.read_text(encoding="utf-8").split() if path.exists() else []
+    if version in listed:
+        return False
+    with path.open("a", encoding="utf-8") as fh:
+        if path.stat().st_size and not path.read_text(encoding="utf-8").endswith("\n"):
+            fh.write("\n")
+        fh.write(version + "\n")
+    return True
+
+
+def main(argv: List[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Embed a local project's docs and code as a RAGGIN version.")
+    parser.add_argument("root", help="project directory to walk")
+    parser.add_argument("--version", required=True, help="version name, e.g. local-my-app")
+    parser.add_argument("--tag", default="project")
+    parser.add_argument("--out", help="CSV path (default: DOWNLOADS_DIR/<version>.csv)")
+    parser.add_argument("--include", action="append", help="only these extensions (repeatable)")
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS)
+    parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE)
+    parser.add_argument("--model-tag", default="bge-m3", help="part of the cache key – change it with the model")
+    parser.add_argument("--build", action="store_true", help="ingest the CSV into the configured backend")
+    parser.add_argument("--register", action="store_true", help="add the version to supported_versions.txt")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    report = ingest_project(
+        args.root,
+        version=args.version,
+        tag=args.tag,
+        out=args.out,
+        include=args.include,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        model_tag=args.model_tag,
+    )
+    if args.build:
+        from app.routes.version import _manager
+
+        report["rows"] = _manager().build_from_csv(report["csv"])
+    if args.register:
+        report["registered"] = register_version(args.version)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,23 @@
 # app/main.py
+import time
+
+_T_IMPORT = time.perf_counter()
+
 import os
 import logging
+import threading
 from pathlib import Path
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from pymilvus import connections
-from huggingface_hub import snapshot_download
 
-from config import MILVUS_URI, MODEL_CACHE_DIR
-from app.routes import data, version, search, prompt
+from app.cache_tier import get_cache
+from app.metrics import metrics
+from app.responses import CompressionMiddleware, FastJSONResponse
+from app.startup import startup
+from config import EAGER_MODEL_LOAD, EMBEDDER_ADDRESS, MILVUS_URI, MODEL_CACHE_DIR, RERANKER_PRELOAD, SEARCH_BACKEND
 
 # ------------------------------------------------------------------#
 #  Logging
@@ -18,12 +26,18 @@ logging.basicConfig(
     level=logging.DEBUG,
     format="%(asctime)s - %(levelname)s - %(name)s - %(message)s",
 )
-# silence Hugging Face + urllib3 DEBUG noise
+# silence Hugging Face + urllib3 DEBUG noise
 for noisy in ("filelock", "urllib3", "huggingface_hub"):
     logging.getLogger(noisy).setLevel(logging.INFO)
 
 log = logging.getLogger("raggin.main")
 
+# routers pull in pandas / pymilvus – time them separately from the framework
+startup.record("import:framework", time.perf_counter() - _T_IMPORT)
+
+with startup.phase("import:routes"):
+    from app.routes import data, version, search, prompt
+
 HF_REPO = "BAAI/bge-m3"
 REV_FILE = ".snapshot_complete"
 
@@ -35,12 +49,17 @@ def snapshot_complete(cache_dir: Path) -> bool:
 
 def ensure_bge_m3(cache_dir: Path = Path(MODEL_CACHE_DIR)) -> None:
     """Download BGE‑M3 once; touch REV_FILE to mark completion."""
+    if EMBEDDER_ADDRESS:
+        log.info("Shared embedding server in use -> model download left to it")
+        return
     cache_dir.mkdir(parents=True, exist_ok=True)
 
     if snapshot_complete(cache_dir):
         log.info("✓ BGE‑M3 snapshot already present -> skip download")
         return
 
+    from huggingface_hub import snapshot_download
+
     log.info("Downloading BGE‑M3 model to %s …", cache_dir)
 
     # simply drop allow_patterns
@@ -55,22 +74,61 @@ def ensure_bge_m3(cache_dir: Path = Path(MODEL_CACHE_DIR)) -> None:
     log.info("✓ Model download finished")
 
 
+def warm_start() -> None:
+    """Download, load and warm up the embedding model (and reranker); flips readiness."""
+    try:
+        with startup.phase("model_download"):
+            ensure_bge_m3()
+        with startup.phase("model_load"):
+            mgr = search._get_manager()
+        with startup.phase("warmup_inference"):
+            mgr.warm_up()
+        if RERANKER_PRELOAD:
+            from app.rerank.cross_encoder import get_reranker
+
+            with startup.phase("reranker_load"):
+                get_reranker()
+        startup.mark_ready()
+    except Exception as exc:  # keep serving liveness; /ready reports the error
+        startup.mark_failed(exc)
+
+
 # ------------------------------------------------------------------#
 #  Lifespan: run once on startup / shutdown
 # ------------------------------------------------------------------#
 @asynccontextmanager
 async def lifespan(_: FastAPI):
-    # heavy I/O here ⤵
-    ensure_bge_m3()
-    connections.connect(uri=MILVUS_URI)
-    log.debug("Connected to Milvus at %s", MILVUS_URI)
+    if SEARCH_BACKEND == "embedded":
+        log.info("Embedded retrieval backend – skipping Milvus connection")
+    else:
+        with startup.phase("milvus_connect"):
+            connections.connect(uri=MILVUS_URI)
+        log.debug("Connected to Milvus at %s", MILVUS_URI)
+
+    cache = get_cache()
+    if cache is not None:
+        with startup.phase("cache_warm"):
+            warmed = cache.warm()
+        log.info("Persistent cache: %d hot entries loaded from %s", warmed, cache.path)
+
+    if EAGER_MODEL_LOAD:
+        threading.Thread(target=warm_start, name="raggin-warm-start", daemon=True).start()
+    else:
+        # lazy mode: the model loads on the first /search request
+        with startup.phase("model_download"):
+            ensure_bge_m3()
+        startup.mark_ready()
+
     yield
-    # close Milvus if you like:
-    connections.disconnect()
-    log.debug("Milvus connection closed")
 
+    if SEARCH_BACKEND != "embedded":
+        # close Milvus if you like:
+        connections.disconnect()
+        log.debug("Milvus connection closed")
 
-app = FastAPI(title="RAGGIN", version="0.2", lifespan=lifespan)
+
+app = FastAPI(title="RAGGIN", version="0.2", lifespan=lifespan, default_response_class=FastJSONResponse)
+app.add_middleware(CompressionMiddleware)
 
 # Routers
 app.include_router(data.router)
@@ -86,9 +144,25 @@ def root():
     return {"message": "Connected to RAGGIN API!"}
 
 
+@app.get("/ready")
+def ready():
+    """Readiness probe: 200 once the model is loaded and warmed up, else 503."""
+    status = startup.status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+
+@app.get("/metrics")
+def get_metrics():
+    snapshot = metrics.snapshot()
+    cache = get_cache()
+    if cache is not None:
+        snapshot["cache"] = cache.stats()
+    return snapshot
+
+
 # ------------------------------------------------------------------#
 #  Dev entry‑point
 # ------------------------------------------------------------------#
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
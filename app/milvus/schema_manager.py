@@ -2,16 +2,46 @@ from __future__ import annotations
 
 import json
 import logging
+import re
+import threading
+import time
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Callable, Dict, Iterable, List
 
 import numpy as np
 import pandas as pd
-from pymilvus import Collection, CollectionSchema, FieldSchema, connections, utility, DataType
+from pymilvus import (
+    BulkInsertState,
+    Collection,
+    CollectionSchema,
+    DataType,
+    FieldSchema,
+    Function,
+    FunctionType,
+    connections,
+    utility,
+)
+from pymilvus.client.types import LoadState
 
-from config import DENSE_VECTOR_DIM, DOWNLOADS_DIR
+from app.changes import ChunkRecorder, forget_version
+from app.embedding.reduction import DenseReducer
+from app.embedding.sparse import prune_build, validate_drop_ratio
+from config import (
+    BM25_ANALYZER,
+    BM25_B,
+    BM25_K1,
+    DENSE_REDUCED_DIM,
+    DENSE_REDUCER_DIR,
+    DENSE_VECTOR_DIM,
+    DOWNLOADS_DIR,
+    METADATA_INDEX_KEYS,
+    SPARSE_DROP_RATIO_BUILD,
+)
 
-__all__ = ["MilvusSchemaManager"]
+INSERT_BATCH_SIZE = 1000
+DENSE_FIELDS = ("dense_text_content", "dense_code_snippet")
+
+__all__ = ["MilvusSchemaManager", "version_collection_name", "lexical_text", "reduced_field", "reducer_path"]
 
 logger = logging.getLogger(__name__)
 
@@ -39,17 +69,48 @@ def _sparse_from_str(val: Any) -> Dict[int, float]:
     return val if isinstance(val, dict) else {}
 
 
+def lexical_text(text: str, code: str) -> str:
+    """Input of the BM25 channel: body text followed by the code snippets."""
+    return f"{text}\n{code}"[:65535]
+
+
+def reduced_field(field: str) -> str:
+    """Name of the reduced-dimension copy of dense *field* (two-stage mode)."""
+    return f"{field}_reduced"
+
+
+def reducer_path(collection: str, field: str) -> Path:
+    """Reducer fitted for *field* of the physical *collection* (one generation)."""
+    return DENSE_REDUCER_DIR / f"{collection}.{field}.npz"
+
+
+def version_collection_name(base: str, version: str) -> str:
+    """Per‑version collection name, e.g. ``nextjs_docs`` + ``v15.0.0`` → ``nextjs_docs_v15_0_0``."""
+    return f"{base}_{re.sub(r'[^0-9A-Za-z_]', '_', version)}"
+
+
 # -----------------------------------------------------------------------------
 # Manager
 # -----------------------------------------------------------------------------
 
 class MilvusSchemaManager:
-    """Create / load a Milvus collection and push CSV rows into it."""
+    """Create / load a Milvus collection and push CSV rows into it.
+
+    Each version is served through an alias (see ``version_collection_name``)
+    pointing at a physical collection ``<alias>__<generation>``. Rebuilds go
+    into a fresh generation that is swapped in with ``alter_alias`` once it
+    is complete, so searches keep hitting the old data until then, and a
+    version is deleted by dropping its collection. A collection named exactly
+    *collection_name* is the legacy shared layout and is only read from /
+    deleted by expression.
+    """
 
     def __init__(self, collection_name: str, uri: str):
         self.collection_name = collection_name
         self.uri = uri
         self.collection: Collection | None = None
+        self._version_locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
         self._ensure_connection()
 
     # ------------------------------------------------------------------
@@ -66,34 +127,75 @@ class MilvusSchemaManager:
     # ------------------------------------------------------------------
 
     def _field_schemas(self) -> List[FieldSchema]:
+        # two-stage mode: the full vectors are only read back for rescoring,
+        # so they stay on disk; the ANN index is built on the reduced copies
+        full = {"mmap_enabled": True} if DENSE_REDUCED_DIM else {}
+        reduced = (
+            [FieldSchema(reduced_field(fld), DataType.FLOAT_VECTOR, dim=DENSE_REDUCED_DIM) for fld in DENSE_FIELDS]
+            if DENSE_REDUCED_DIM
+            else []
+        )
         return [
             FieldSchema("entry_id", DataType.VARCHAR, max_length=255, is_primary=True),
             FieldSchema("title", DataType.VARCHAR, max_length=255),
             FieldSchema("metadata", DataType.JSON),
-            FieldSchema("version", DataType.VARCHAR, max_length=20, is_partition_key=True),
+            FieldSchema("version", DataType.VARCHAR, max_length=20),
             FieldSchema("text_content", DataType.VARCHAR, max_length=65535),
             FieldSchema("code_content", DataType.VARCHAR, max_length=65535),
             FieldSchema("sparse_title", DataType.SPARSE_FLOAT_VECTOR),
-            FieldSchema("dense_text_content", DataType.FLOAT_VECTOR, dim=DENSE_VECTOR_DIM),
-            FieldSchema("dense_code_snippet", DataType.FLOAT_VECTOR, dim=DENSE_VECTOR_DIM),
+            FieldSchema("dense_text_content", DataType.FLOAT_VECTOR, dim=DENSE_VECTOR_DIM, **full),
+            FieldSchema("dense_code_snippet", DataType.FLOAT_VECTOR, dim=DENSE_VECTOR_DIM, **full),
             FieldSchema("tag", DataType.VARCHAR, max_length=255),
+            # BM25 channel: Milvus tokenizes lexical_text and fills bm25_sparse itself
+            FieldSchema(
+                "lexical_text",
+                DataType.VARCHAR,
+                max_length=65535,
+                enable_analyzer=True,
+                analyzer_params={"type": BM25_ANALYZER},
+            ),
+            FieldSchema("bm25_sparse", DataType.SPARSE_FLOAT_VECTOR),
+            *reduced,
+        ]
+
+    @staticmethod
+    def _functions() -> List[Function]:
+        return [
+            Function(
+                name="lexical_bm25",
+                function_type=FunctionType.BM25,
+                input_field_names=["lexical_text"],
+                output_field_names=["bm25_sparse"],
+            )
         ]
 
-    def create_collection(self) -> Collection:
+    def create_collection(self, name: str | None = None) -> Collection:
+        """(Re)create collection *name* (defaults to the base collection name)."""
         self._ensure_connection()
-        if utility.has_collection(self.collection_name):
-            Collection(self.collection_name).drop()
-            logger.info("Dropped existing collection '%s'", self.collection_name)
+        name = name or self.collection_name
+        if utility.has_collection(name):
+            Collection(name).drop()
+            logger.info("Dropped existing collection '%s'", name)
 
-        schema = CollectionSchema(self._field_schemas(), auto_id=False)
-        self.collection = Collection(
-            name=self.collection_name,
+        schema = CollectionSchema(self._field_schemas(), auto_id=False, functions=self._functions())
+        coll = Collection(
+            name=name,
             schema=schema,
             consistency_level="Strong",
-            properties={"partitionkey.isolation": True},
         )
-        logger.info("Created collection '%s'", self.collection_name)
-        return self.collection
+        self.collection = coll
+        logger.info("Created collection '%s'", name)
+        return coll
+
+    def _target(self, coll: Collection | None) -> Collection:
+        """*coll*, else the last created collection (single-collection use).
+
+        Version builds always pass their shadow explicitly – concurrent builds
+        of other versions replace ``self.collection`` meanwhile.
+        """
+        coll = coll if coll is not None else self.collection
+        assert coll is not None, "create_collection() first"
+        return coll
 
     # ------------------------------------------------------------------
     # Indices
@@ -106,85 +208,319 @@ class MilvusSchemaManager:
         ef_text: int = 200,
         m_code: int = 16,
         ef_code: int = 200,
+        drop_ratio_build: float = SPARSE_DROP_RATIO_BUILD,
+        coll: Collection | None = None,
     ) -> None:
-        """Add SPARSE & HNSW indices and load collection."""
-        assert self.collection, "create_collection() first"
+        """Add SPARSE & HNSW indices and load the collection (*coll*, see ``_target``).
 
-        self.collection.create_index("sparse_title", {"index_type": "SPARSE_INVERTED_INDEX", "metric_type": "IP"})
-        self.collection.create_index(
-            "dense_text_content",
+        *drop_ratio_build* leaves that fraction of each title's smallest
+        sparse weights out of the inverted index.
+        """
+        coll = self._target(coll)
+
+        coll.create_index(
+            "sparse_title",
             {
-                "index_type": "HNSW",
-                "metric_type": "COSINE",
-                "params": {"M": m_text, "efConstruction": ef_text},
+                "index_type": "SPARSE_INVERTED_INDEX",
+                "metric_type": "IP",
+                "params": {"drop_ratio_build": validate_drop_ratio(drop_ratio_build, name="drop_ratio_build")},
             },
         )
-        self.collection.create_index(
-            "dense_code_snippet",
+        coll.create_index(
+            "bm25_sparse",
             {
-                "index_type": "HNSW",
-                "metric_type": "COSINE",
-                "params": {"M": m_code, "efConstruction": ef_code},
+                "index_type": "SPARSE_INVERTED_INDEX",
+                "metric_type": "BM25",
+                "params": {"bm25_k1": BM25_K1, "bm25_b": BM25_B},
             },
         )
-        self.collection.load()
-        logger.info("Collection loaded with indices (text M=%d/ef=%d, code M=%d/ef=%d)", m_text, ef_text, m_code, ef_code)
+        hnsw = {"dense_text_content": (m_text, ef_text), "dense_code_snippet": (m_code, ef_code)}
+        for fld, (m, ef) in hnsw.items():
+            if DENSE_REDUCED_DIM:
+                self._create_two_stage_indices(coll, fld, m, ef)
+                continue
+            coll.create_index(
+                fld,
+                {
+                    "index_type": "HNSW",
+                    "metric_type": "COSINE",
+                    "params": {"M": m, "efConstruction": ef},
+                },
+            )
+        self._create_scalar_indices(coll)
+        coll.load()
+        logger.info(
+            "Collection loaded with indices (text M=%d/ef=%d, code M=%d/ef=%d, sparse drop_ratio_build=%g)",
+            m_text, ef_text, m_code, ef_code, drop_ratio_build,
+        )
+
+    @staticmethod
+    def _create_two_stage_indices(coll: Collection, fld: str, m: int, ef: int) -> None:
+        """HNSW on the reduced copy of *fld*; FLAT, memory-mapped, on the full vectors.
+
+        Milvus only loads collections whose vector fields all have an index;
+        the FLAT one is never searched, only read back for rescoring.
+        """
+        coll.create_index(
+            reduced_field(fld),
+            {"index_type": "HNSW", "metric_type": "COSINE", "params": {"M": m, "efConstruction": ef}},
+        )
+        coll.create_index(fld, {"index_type": "FLAT", "metric_type": "COSINE"}, index_name=f"{fld}_flat")
+        try:
+            coll.alter_index(f"{fld}_flat", {"mmap.enabled": True})
+        except Exception as exc:  # pragma: no cover – server without index mmap
+            logger.warning("Could not memory-map the full vectors of %s: %s", fld, exc)
+
+    @staticmethod
+    def _create_scalar_indices(coll: Collection) -> None:
+        """Index the filter fields so ``filter_expr`` is not a brute‑force scan.
+
+        INVERTED for exact / ``in`` matches on version and tag, Trie for
+        ``title`` (prefix ``like``), and JSON‑path INVERTED indexes for the
+        ``METADATA_INDEX_KEYS``. JSON‑path indexes need Milvus ≥ 2.5.11; on
+        older servers that step is skipped with a warning.
+        """
+        coll.create_index("version", {"index_type": "INVERTED"}, index_name="version_idx")
+        coll.create_index("tag", {"index_type": "INVERTED"}, index_name="tag_idx")
+        coll.create_index("title", {"index_type": "Trie"}, index_name="title_idx")
+        for key, cast in METADATA_INDEX_KEYS:
+            try:
+                coll.create_index(
+                    "metadata",
+                    {
+                        "index_type": "INVERTED",
+                        "params": {"json_path": f'metadata["{key}"]', "json_cast_type": cast},
+                    },
+                    index_name=f"metadata_{key}_idx",
+                )
+            except Exception as exc:  # pragma: no cover – server without JSON‑path indexes
+                logger.warning("JSON‑path index on metadata[%r] not created: %s", key, exc)
 
     # ------------------------------------------------------------------
     # CSV ingest
     # ------------------------------------------------------------------
 
-    def _row_to_entity(self, row: pd.Series) -> Dict[str, Any]:
+    @staticmethod
+    def _row_to_entity(row: pd.Series) -> Dict[str, Any]:
+        text = str(row.get("text_content", ""))[:65535]
+        code = str(row.get("code_content", ""))[:65535]
         return {
             "entry_id": str(row["entry_id"]),
             "title": str(row["title"]),
             "metadata": _json_or_empty(row.get("metadata")),
             "version": str(row.get("version", "")),
-            "text_content": str(row.get("text_content", ""))[:65535],
-            "code_content": str(row.get("code_content", ""))[:65535],
-            "sparse_title": _sparse_from_str(row.get("sparse_title")),
+            "text_content": text,
+            "code_content": code,
+            "sparse_title": prune_build(_sparse_from_str(row.get("sparse_title"))),
             "dense_text_content": json.loads(row["dense_text_content"]) if isinstance(row.get("dense_text_content"), str) else [0.0] * DENSE_VECTOR_DIM,
             "dense_code_snippet": json.loads(row["dense_code_snippet"]) if isinstance(row.get("dense_code_snippet"), str) else [0.0] * DENSE_VECTOR_DIM,
             "tag": str(row.get("tag", "")),
+            "lexical_text": lexical_text(text, code),
         }
 
-    def insert_csv(self, csv_path: str | Path) -> int:
-        """Insert every row from *csv_path*; returns count inserted."""
-        assert self.collection, "create_collection() first"
+    @staticmethod
+    def _add_reduced(coll: Collection, entities: List[Dict[str, Any]]) -> None:
+        """Fit the reducers of generation *coll* and add the reduced vectors to *entities*."""
+        for fld in DENSE_FIELDS:
+            mat = np.asarray([ent[fld] for ent in entities], dtype=np.float32).reshape(len(entities), DENSE_VECTOR_DIM)
+            reducer = DenseReducer.fit(mat, DENSE_REDUCED_DIM)
+            reducer.save(reducer_path(coll.name, fld))
+            for ent, vec in zip(entities, reducer.transform(mat)):
+                ent[reduced_field(fld)] = vec.tolist()
+        logger.info("Reduced dense vectors to %d dims for '%s'", DENSE_REDUCED_DIM, coll.name)
+
+    def insert_csv(
+        self,
+        csv_path: str | Path,
+        *,
+        recorder: ChunkRecorder | None = None,
+        coll: Collection | None = None,
+    ) -> int:
+        """Insert every row from *csv_path* into *coll* (see ``_target``); returns count inserted."""
+        coll = self._target(coll)
         df = pd.read_csv(csv_path)
         entities = [self._row_to_entity(row) for _, row in df.iterrows()]
-        self.collection.insert(entities)
+        if recorder is not None:
+            recorder.add_many(entities)
+        if DENSE_REDUCED_DIM and entities:
+            self._add_reduced(coll, entities)
+        coll.insert(entities)
         logger.info("Inserted %d rows from %s", len(entities), csv_path)
         return len(entities)
 
     # ------------------------------------------------------------------
-    # Full pipeline helper
+    # Version lifecycle helpers
     # ------------------------------------------------------------------
 
-    def build_from_csv(
+    def _version_lock(self, version: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._version_locks.setdefault(version, threading.Lock())
+
+    @staticmethod
+    def _generations(alias: str) -> List[str]:
+        """Physical collections that belong to *alias* (incl. a pre‑alias one named *alias*)."""
+        return [c for c in utility.list_collections() if c == alias or c.startswith(f"{alias}__")]
+
+    @staticmethod
+    def _is_loaded(name: str) -> bool:
+        try:
+            return utility.load_state(name) == LoadState.Loaded
+        except Exception:  # pragma: no cover – collection vanished meanwhile
+            return False
+
+    @staticmethod
+    def _point_alias(alias: str, target: str, physical: List[str]) -> None:
+        if alias in physical:
+            # pre‑alias layout: a real collection occupies the alias name
+            utility.drop_collection(alias)
+            utility.create_alias(target, alias)
+        elif utility.has_collection(alias):
+            utility.alter_alias(target, alias)
+        else:
+            utility.create_alias(target, alias)
+        logger.info("Alias '%s' → '%s'", alias, target)
+
+    @staticmethod
+    def _drop_reducers(collection: str) -> None:
+        for fld in DENSE_FIELDS:
+            reducer_path(collection, fld).unlink(missing_ok=True)
+
+    # ------------------------------------------------------------------
+    # Full pipeline helpers
+    # ------------------------------------------------------------------
+
+    def _build_version(
         self,
-        csv_path: str | Path,
+        version: str,
+        fill: Callable[[Collection], int],
         *,
         m_text: int = 16,
         ef_text: int = 200,
         m_code: int = 16,
         ef_code: int = 200,
-    ) -> None:
-        self.create_collection()
-        self.create_indices(m_text=m_text, ef_text=ef_text, m_code=m_code, ef_code=ef_code)
-        self.insert_csv(csv_path)
-        self.collection.release()
-        logger.info("Collection '%s' ready", self.collection_name)
+        drop_ratio_build: float = SPARSE_DROP_RATIO_BUILD,
+    ) -> int:
+        """Build *version* into a shadow generation filled by *fill* and swap it in.
+
+        If the current generation is loaded (i.e. serving), the shadow stays
+        loaded so searches switch over without a cold load.
+        """
+        alias = version_collection_name(self.collection_name, version)
+        with self._version_lock(version):
+            previous = self._generations(alias)
+            serving = any(self._is_loaded(c) for c in previous)
+
+            shadow = f"{alias}__{time.time_ns() // 1_000_000}"
+            # only this local handle – self.collection is shared with concurrent builds
+            coll = self.create_collection(shadow)
+            self.create_indices(
+                m_text=m_text,
+                ef_text=ef_text,
+                m_code=m_code,
+                ef_code=ef_code,
+                drop_ratio_build=drop_ratio_build,
+                coll=coll,
+            )
+            rows = fill(coll)
+            coll.flush()
+            if not serving:
+                coll.release()
+
+            self._point_alias(alias, shadow, previous)
+            for old in previous:
+                if old != alias:  # already dropped by _point_alias
+                    utility.drop_collection(old)
+                    logger.info("Dropped previous generation '%s'", old)
+                self._drop_reducers(old)
+        logger.info("Collection '%s' ready (alias '%s')", shadow, alias)
+        return rows
+
+    def build_from_csv(self, csv_path: str | Path, **index_params: float) -> int:
+        """Build the version named by the CSV file stem (see ``_build_version``)."""
+        version = Path(csv_path).stem
+        recorder = ChunkRecorder(version)
+        rows = self._build_version(version, lambda coll: self.insert_csv(csv_path, recorder=recorder, coll=coll), **index_params)
+        recorder.commit()
+        return rows
+
+    def build_from_entities(self, version: str, entities: Iterable[Dict[str, Any]], **index_params: float) -> int:
+        """Build *version* from ready ``_row_to_entity``‑shaped dicts (no CSV parsing)."""
+        recorder = ChunkRecorder(version)
+
+        def _fill(coll: Collection) -> int:
+            rows = 0
+            batch: List[Dict[str, Any]] = []
+            items: Iterable[Dict[str, Any]] = entities
+            if DENSE_REDUCED_DIM:
+                # the reducers are fitted on the whole version
+                items = [dict(ent) for ent in entities]
+                if items:
+                    self._add_reduced(coll, items)
+            for ent in items:
+                ent.setdefault("lexical_text", lexical_text(ent["text_content"], ent["code_content"]))
+                ent["sparse_title"] = prune_build(ent["sparse_title"])
+                recorder.add(ent)
+                batch.append(ent)
+                if len(batch) >= INSERT_BATCH_SIZE:
+                    coll.insert(batch)
+                    rows += len(batch)
+                    batch = []
+            if batch:
+                coll.insert(batch)
+                rows += len(batch)
+            logger.info("Inserted %d prepared rows for version %s", rows, version)
+            return rows
+
+        rows = self._build_version(version, _fill, **index_params)
+        recorder.commit()
+        return rows
+
+    def build_from_bulk_files(self, version: str, files: List[str], **index_params: float) -> int:
+        """Build *version* with server‑side bulk insert of JSON files already in Milvus' bucket."""
+        if DENSE_REDUCED_DIM:
+            raise ValueError("Bulk-insert files carry no reduced vectors – build from entities with DENSE_REDUCED_DIM set")
+
+        def _fill(coll: Collection) -> int:
+            # row‑based JSON: one import task per file, run in parallel by Milvus
+            tasks = [utility.do_bulk_insert(collection_name=coll.name, files=[f]) for f in files]
+            pending = set(tasks)
+            while pending:
+                for task in list(pending):
+                    state = utility.get_bulk_insert_state(task)
+                    if state.state in (BulkInsertState.ImportFailed, BulkInsertState.ImportFailedAndCleaned):
+                        raise RuntimeError(f"Bulk insert {task} failed: {state.failed_reason}")
+                    if state.state == BulkInsertState.ImportCompleted:
+                        pending.discard(task)
+                if pending:
+                    time.sleep(0.5)
+            coll.flush()
+            logger.info("Bulk‑inserted %d file(s) for version %s", len(files), version)
+            return coll.num_entities
+
+        return self._build_version(version, _fill, **index_params)
 
     # ------------------------------------------------------------------
     # Delete helpers
     # ------------------------------------------------------------------
 
     def delete_version(self, version: str):
-        """Remove every row whose *version* field matches."""
+        """Drop the version's collections; also purge it from a legacy shared collection."""
         self._ensure_connection()
-        self.collection = Collection(self.collection_name)
-        self.collection.load()
-        expr = f"version == '{version}'"
-        result = self.collection.delete(expr)
-        logger.info("Deleted rows for version %s → %s", version, result)
\ No newline at end of file
+        alias = version_collection_name(self.collection_name, version)
+        with self._version_lock(version):
+            physical = self._generations(alias)
+            if utility.has_collection(alias) and alias not in physical:
+                utility.drop_alias(alias)
+            for name in physical:
+                utility.drop_collection(name)
+                self._drop_reducers(name)
+                logger.info("Dropped collection '%s' for version %s", name, version)
+
+        if utility.has_collection(self.collection_name):
+            legacy = Collection(self.collection_name)
+            legacy.load()
+            result = legacy.delete(f"version == '{version}'")
+            # deletes only write tombstones – ask Milvus to merge them away
+            legacy.compact()
+            logger.info("Deleted legacy rows for version %s → %s (compaction triggered)", version, result)
+        forget_version(version)
@@ -1,22 +1,68 @@
-from __future__ import annotations
-
 """Hybrid vector / lexical retrieval against Milvus with score blending."""
 
-from pathlib import Path
-from typing import Any, Dict, List
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field as dc_field
+from functools import partial
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Tuple
 import heapq
 import logging
+import threading
 
-from FlagEmbedding import BGEM3FlagModel
-from pymilvus import Collection, connections
+import numpy as np
+from pymilvus import Collection, MilvusException, connections, utility
 
+from app.cache_tier import get_cache
+from app.cancellation import CancelToken
+from app.embedding.reduction import DenseReducer, rescore
+from app.embedding.sparse import prune_query, validate_drop_ratio
+from app.metrics import metrics
+from app.milvus.schema_manager import reduced_field, reducer_path, version_collection_name
+from app.query.planner import MODALITIES, QueryPlan, plan_query
+from app.residency import ResidencyManager, SharedLedger
 from utils import normalize_distance
-from config import MILVUS_URI, MODEL_CACHE_DIR
+from config import (
+    BM25_SCORE_SCALE,
+    DENSE_REDUCED_DIM,
+    DENSE_RESCORE_FACTOR,
+    DENSE_VECTOR_DIM,
+    EMBEDDER_ADDRESS,
+    MILVUS_URI,
+    RERANK_BUDGET_MS,
+    RERANK_CANDIDATES,
+    RESIDENCY_LEDGER_PATH,
+    RESIDENCY_MAX_VERSIONS,
+    RESIDENCY_MEMORY_BUDGET_MB,
+    SEARCH_FANOUT_WORKERS,
+    SPARSE_DROP_RATIO_SEARCH,
+)
+
+if TYPE_CHECKING:  # torch/FlagEmbedding are imported lazily – they dominate import time
+    from FlagEmbedding import BGEM3FlagModel
+
+    from app.embedding.client import RemoteEmbedder
 
 __all__ = ["SearchManager"]
 
 logger = logging.getLogger(__name__)
 
+OUTPUT_FIELDS = ["title", "metadata", "text_content", "code_content", "version", "tag"]
+
+
+@dataclass
+class RescoredHit:
+    """Same attributes as a pymilvus ``Hit``, with the full-dimension score."""
+
+    id: str
+    distance: float
+    entity: Dict[str, Any] = dc_field(default_factory=dict)
+
+
+def _not_loaded(exc: MilvusException) -> bool:
+    """Whether *exc* says the collection was released (by another worker's eviction)."""
+    return getattr(exc, "code", None) == 101 or "not loaded" in str(exc).lower()
+
 
 class SearchManager:
     """Run sparse, dense‑text & dense‑code searches and merge results."""
@@ -27,23 +73,104 @@ class SearchManager:
 
     def __init__(self, collection_name: str, *, uri: str = MILVUS_URI) -> None:
         self.uri = uri
+        self.collection_name = collection_name
+        self._open_backend()
+        # the per‑modality ANN calls of one request run concurrently
+        self._fanout = ThreadPoolExecutor(max_workers=SEARCH_FANOUT_WORKERS, thread_name_prefix="ann")
+        # two-stage mode: reducers per (generation collection, field)
+        self._reducers: Dict[Tuple[str, str], DenseReducer] = {}
+        self._reducers_lock = threading.Lock()
+        self.embedder = self._with_cache(self._load_embedder())
+        logger.debug("SearchManager ready – collection '%s' loaded", collection_name)
+
+    def _open_backend(self) -> None:
+        """Connect to Milvus; per‑version collections are loaded on demand."""
         if not connections.has_connection("default"):
             connections.connect(uri=self.uri)
             logger.debug("Connected to Milvus @ %s", self.uri)
 
-        self.collection: Collection = Collection(collection_name)
-        self.collection.load()
-
-        self.embedder = BGEM3FlagModel(
-            model_name_or_path="BAAI/bge-m3",
-            cache_dir=str(Path(MODEL_CACHE_DIR)),
-            normalize_embeddings=True,
-            return_dense=True,
-            return_sparse=True,
-            devices=["cpu"],
-            use_fp16=False,
+        # handles are per worker; the server-side loads they share are
+        # released only through the ledger, under one budget for all workers
+        self.residency: ResidencyManager[Collection] = ResidencyManager(
+            load=self._load_collection,
+            release=lambda _name, _coll: None,
+            size_of=self._collection_bytes,
+            budget_bytes=RESIDENCY_MEMORY_BUDGET_MB * 2**20,
+            max_resident=RESIDENCY_MAX_VERSIONS,
+            ledger=SharedLedger(
+                RESIDENCY_LEDGER_PATH,
+                release=lambda name: Collection(name).release(),
+                budget_bytes=RESIDENCY_MEMORY_BUDGET_MB * 2**20,
+                max_resident=RESIDENCY_MAX_VERSIONS,
+            ),
         )
-        logger.debug("SearchManager ready – collection '%s' loaded", collection_name)
+
+    @staticmethod
+    def _load_collection(name: str) -> Collection:
+        coll = Collection(name)
+        coll.load()
+        return coll
+
+    @staticmethod
+    def _collection_bytes(name: str, coll: Collection) -> int:
+        """Loaded size as reported by the query nodes, else a per‑row estimate."""
+        try:
+            segments = utility.get_query_segment_info(name)
+            reported = sum(getattr(seg, "mem_size", 0) for seg in segments)
+            if reported:
+                return reported
+        except Exception:  # pragma: no cover – older servers
+            pass
+        # two dense vectors + HNSW graph + ~8 KB of scalars per row; in
+        # two-stage mode only the reduced vectors are resident
+        return coll.num_entities * (2 * (DENSE_REDUCED_DIM or DENSE_VECTOR_DIM) * 4 * 2 + 8192)
+
+    def _resolve(self, version: str) -> str:
+        """Collection serving *version*: its own, else the legacy shared one."""
+        name = version_collection_name(self.collection_name, version)
+        if name in self.residency or utility.has_collection(name):
+            return name
+        if self.collection_name in self.residency or utility.has_collection(self.collection_name):
+            return self.collection_name
+        raise ValueError(f"Version '{version}' has not been ingested")
+
+    def invalidate(self, version: str) -> None:
+        """Forget the resident handle for *version* after it was rebuilt or deleted.
+
+        Not released: after a rebuild the alias already points at the new,
+        loaded generation; after a delete there is nothing left to release.
+        """
+        name = version_collection_name(self.collection_name, version)
+        self.residency.discard(name, release=False)
+        if self.residency.ledger is not None:
+            self.residency.ledger.forget(name)
+
+    @staticmethod
+    def _load_embedder() -> BGEM3FlagModel | RemoteEmbedder:
+        """Use the shared embedding process when configured, else load locally."""
+        if EMBEDDER_ADDRESS:
+            from app.embedding.client import RemoteEmbedder
+
+            logger.debug("Using shared embedding server @ %s", EMBEDDER_ADDRESS)
+            return RemoteEmbedder(EMBEDDER_ADDRESS)
+
+        from app.embedding.model import load_bge_m3
+
+        return load_bge_m3()
+
+    @staticmethod
+    def _with_cache(embedder: Any) -> Any:
+        """Route query encodes through the persistent cache tier when enabled."""
+        cache = get_cache()
+        if cache is None or not cache.enabled("embedding"):
+            return embedder
+        from app.embedding.cached import CachedEmbedder
+
+        return CachedEmbedder(embedder, cache)
+
+    def warm_up(self, query: str = "How do I configure routing in Next.js?") -> None:
+        """Run one throw‑away encode so the first user request skips lazy init."""
+        self.embedder.encode_queries([query, ""], return_dense=True, return_sparse=True)
 
     # ------------------------------------------------------------------
     # Internal helpers
@@ -59,44 +186,177 @@ class SearchManager:
         base = f'version == "{version}"'
         return f"{base} && {extra.strip()}" if extra else base
 
-    def _search(
+    def _search(self, field: str, query: Any, **kw):
+        return self._search_many(field, [query], **kw)[0]
+
+    def _search_many(
         self,
         field: str,
-        query: Any,
+        queries: List[Any],
         *,
         top_k: int,
         expr: str,
         metric: str,
-        radius: float = 0.5,
-        range_filter: float = 1,
+        version: str,
+        radius: float | None = 0.5,
+        range_filter: float | None = 1,
         extra_params: Dict[str, Any] | None = None,
+        iterative_filter: bool = False,
     ):
+        """One ANN call for several query vectors; a hit list per query.
+
+        *iterative_filter* asks Milvus to apply the filter while walking the
+        index instead of pre‑filtering, which keeps selective filters from
+        collapsing recall and latency.
+        """
         self._ensure_conn()
-        params = {"metric_type": metric, "radius": radius, "range": range_filter}
+        params: Dict[str, Any] = {"metric_type": metric}
+        if radius is not None:
+            params.update(radius=radius, range=range_filter)
         if extra_params:
             params.update(extra_params)
-        return self.collection.search(
-            data=[query],
+        if iterative_filter:
+            params["hints"] = "iterative_filter"
+        name = self._resolve(version)
+        try:
+            with self.residency.lease(name) as collection:
+                return self._search_leased(collection, field, queries, params=params, top_k=top_k, expr=expr)
+        except MilvusException as exc:
+            if not _not_loaded(exc):
+                raise
+            # released by another worker's eviction – drop the stale handle and load again
+            logger.info("Collection '%s' was released elsewhere – reloading", name)
+            metrics.incr("residency.reloads")
+            self.residency.discard(name, release=False)
+            with self.residency.lease(name) as collection:
+                return self._search_leased(collection, field, queries, params=params, top_k=top_k, expr=expr)
+
+    def _search_leased(
+        self,
+        collection: Collection,
+        field: str,
+        queries: List[Any],
+        *,
+        params: Dict[str, Any],
+        top_k: int,
+        expr: str,
+    ):
+        if not any(f.name == field for f in collection.schema.fields):
+            # built before this field existed – the channel contributes nothing
+            logger.debug("Collection '%s' has no field '%s' – skipped", collection.name, field)
+            return [[] for _ in queries]
+        if params["metric_type"] == "COSINE" and any(f.name == reduced_field(field) for f in collection.schema.fields):
+            return self._search_two_stage(collection, field, queries, params=params, top_k=top_k, expr=expr)
+        return collection.search(
+            data=queries,
             anns_field=field,
             param=params,
             limit=top_k,
-            output_fields=[
-                "title",
-                "metadata",
-                "text_content",
-                "code_content",
-                "version",
-                "tag",
-            ],
+            output_fields=OUTPUT_FIELDS,
+            expr=expr,
+        )
+
+    def _search_two_stage(
+        self,
+        collection: Collection,
+        field: str,
+        queries: List[Any],
+        *,
+        params: Dict[str, Any],
+        top_k: int,
+        expr: str,
+    ) -> List[List[RescoredHit]]:
+        """Coarse ANN over the reduced copy of *field*, exact rescoring at full dimension.
+
+        *radius* / *range* apply to the rescored cosine, not the coarse one.
+        """
+        coarse_params = {k: v for k, v in params.items() if k not in ("radius", "range")}
+        reducer = self._reducer(collection, field)
+        coarse = collection.search(
+            data=reducer.transform(np.asarray(queries, dtype=np.float32)).tolist(),
+            anns_field=reduced_field(field),
+            param=coarse_params,
+            limit=top_k * DENSE_RESCORE_FACTOR,
+            output_fields=[*OUTPUT_FIELDS, field],
             expr=expr,
-        )[0]
+        )
+        radius, upper = params.get("radius"), params.get("range")
+        results: List[List[RescoredHit]] = []
+        for query, hits in zip(queries, coarse):
+            hits = list(hits)
+            if not hits:
+                results.append([])
+                continue
+            full = np.asarray([h.entity.get(field) for h in hits], dtype=np.float32)
+            order, scores = rescore(full, np.asarray(query, dtype=np.float32), len(hits))
+            ranked = [
+                RescoredHit(hits[i].id, float(score), {f: hits[i].entity.get(f) for f in OUTPUT_FIELDS})
+                for i, score in zip(order, scores)
+                if radius is None or radius < score <= upper
+            ]
+            results.append(ranked[:top_k])
+        return results
+
+    @staticmethod
+    def _physical_name(name: str) -> str:
+        """Generation collection behind alias *name* (reducers are stored per generation)."""
+        for candidate in utility.list_collections():
+            if candidate.startswith(f"{name}__") and name in utility.list_aliases(candidate):
+                return candidate
+        return name
+
+    def _reducer(self, collection: Collection, field: str) -> DenseReducer:
+        """Reducer for *field* of the generation the alias of *collection* points at now.
 
-    def _sparse(self, *a, **kw):
-        return self._search(*a, metric="IP", **kw)
+        Resolved on every call: a rebuild in another worker swaps the alias
+        without touching this worker's handle.
+        """
+        key = (self._physical_name(collection.name), field)
+        with self._reducers_lock:
+            reducer = self._reducers.get(key)
+        if reducer is not None:
+            return reducer
+        path = reducer_path(key[0], field)
+        if not path.is_file():
+            raise ValueError(f"No dense reducer at {path} – rebuild the version with DENSE_REDUCED_DIM set")
+        reducer = DenseReducer.load(path)
+        with self._reducers_lock:
+            # generations of this alias that are gone keep nothing alive here
+            for stale in [k for k in self._reducers if k[1] == field and k[0].startswith(f"{collection.name}__")]:
+                del self._reducers[stale]
+            self._reducers[key] = reducer
+        return reducer
+
+    def _sparse(self, *a, drop_ratio_search: float = SPARSE_DROP_RATIO_SEARCH, **kw):
+        extra = {"params": {"drop_ratio_search": drop_ratio_search}} if drop_ratio_search else None
+        return self._search(*a, metric="IP", extra_params=extra, **kw)
 
     def _dense(self, *a, **kw):
         return self._search(*a, metric="COSINE", extra_params={"params": {"nprobe": 10}}, **kw)
 
+    def _bm25(self, field: str, query: str, **kw):
+        if not query.strip():
+            return []
+        kw.update(radius=None, range_filter=None)  # BM25 scores are unbounded
+        return self._search(field, query, metric="BM25", **kw)
+
+    def _dense_multi(self, field: str, queries: List[Any], *, top_k: int, **kw):
+        """Multi‑vector dense search aggregated per ``entry_id``.
+
+        Each entry keeps its best (highest cosine) hit over all query
+        vectors; the *top_k* best entries are returned.
+        """
+        hit_lists = self._search_many(
+            field, queries, top_k=top_k, metric="COSINE", extra_params={"params": {"nprobe": 10}}, **kw
+        )
+        best: Dict[str, Any] = {}
+        for hits in hit_lists:
+            for h in hits:
+                cur = best.get(h.id)
+                if cur is None or h.distance > cur.distance:
+                    best[h.id] = h
+        return heapq.nlargest(top_k, best.values(), key=lambda h: h.distance)
+
     # score helpers -----------------------------------------------------------
 
     @staticmethod
@@ -106,6 +366,7 @@ class SearchManager:
             entry = store.setdefault(
                 eid,
                 {
+                    "entry_id": eid,
                     "title": h.entity.get("title"),
                     "metadata": h.entity.get("metadata"),
                     "version": h.entity.get("version"),
@@ -115,6 +376,7 @@ class SearchManager:
                     "sparse_distance": None,
                     "dense_text_distance": None,
                     "dense_code_distance": None,
+                    "bm25_distance": None,
                 },
             )
             entry[dist_field] = h.distance
@@ -132,8 +394,10 @@ class SearchManager:
         sparse_weight: float = 1.0,
         dense_text_weight: float = 1.0,
         dense_code_weight: float = 1.0,
+        bm25_weight: float = 0.0,
         top_k: int = 10,
         filter_expr: str | None = None,
+        iterative_filter: bool = False,
         # distance params
         radius_sparse: float = 0.5,
         range_sparse: float = 1,
@@ -141,41 +405,107 @@ class SearchManager:
         range_dense_text: float = 1,
         radius_dense_code: float = 0.5,
         range_dense_code: float = 1,
+        # optional cross‑encoder stage
+        rerank: bool = False,
+        rerank_candidates: int | None = None,
+        rerank_budget_ms: float | None = None,
+        on_merge: Callable[[Dict[str, Dict[str, Any]]], None] | None = None,
+        code_chunks: List[str] | None = None,
+        modality_limits: Dict[str, int] | None = None,
+        on_plan: Callable[[QueryPlan], None] | None = None,
+        cancel: CancelToken | None = None,
+        drop_ratio_search: float | None = None,
     ) -> List[Dict[str, Any]]:
-        if not any([sparse_weight, dense_text_weight, dense_code_weight]):
-            raise ValueError("All modality weights are zero – nothing to search.")
+        """Blend the modality searches into the top‑k entries.
+
+        *on_merge* is called with the merged store each time one modality's
+        hits arrive, so callers can start processing entries early.
+
+        *code_chunks* (e.g. from :func:`app.query.code_chunks.chunk_files`)
+        are embedded in the same batch as the queries and searched as extra
+        ``dense_code_snippet`` vectors alongside *code_query*.
+
+        Modalities without a weight or without input (e.g. the code channel
+        of a plain-text question) are dropped by :func:`plan_query` before
+        anything is embedded; *modality_limits* sets per-modality candidate
+        counts and *on_plan* receives the resulting plan. Its ``reranked`` is
+        filled in at the end: False when a requested rerank fell back.
+
+        The sparse query is pruned with the ``SPARSE_PRUNE_*_QUERY`` settings;
+        *drop_ratio_search* overrides ``SPARSE_DROP_RATIO_SEARCH``.
 
-        embeds = self.embedder.encode_queries(
-            [text_query, code_query], return_dense=True, return_sparse=True
+        *cancel* is checked between stages; once it fires, modality searches
+        that have not started are dropped and :class:`CancelledRequestError`
+        is raised.
+        """
+        final_k = top_k
+        if rerank:
+            # over‑fetch so the reranker has something to choose from
+            top_k = max(top_k, rerank_candidates or RERANK_CANDIDATES)
+
+        plan = plan_query(
+            text_query=text_query,
+            code_query=code_query,
+            top_k=top_k,
+            sparse_weight=sparse_weight,
+            dense_text_weight=dense_text_weight,
+            dense_code_weight=dense_code_weight,
+            bm25_weight=bm25_weight,
+            code_chunks=code_chunks,
+            limits=modality_limits,
         )
-        text_dense, code_dense = embeds["dense_vecs"]
-        text_sparse = embeds["lexical_weights"][0]
+        if on_plan is not None:
+            on_plan(plan)
+        drop_ratio = SPARSE_DROP_RATIO_SEARCH if drop_ratio_search is None else drop_ratio_search
+        validate_drop_ratio(drop_ratio, name="drop_ratio_search")
+
+        # embed only what the planned modalities consume, in one batch
+        batch = ([text_query] if plan.encode_text else []) + ([code_query] if plan.encode_code else []) + plan.code_chunks
+        if cancel is not None:
+            cancel.raise_if_cancelled("embedding")
+        if batch:
+            embeds = self.embedder.encode_queries(batch, return_dense=True, return_sparse=True)
+            dense_vecs = list(embeds["dense_vecs"])
+            text_sparse = prune_query(embeds["lexical_weights"][0]) if plan.encode_text else None
+        else:  # BM25 only – no model call at all
+            dense_vecs, text_sparse = [], None
+        text_dense = dense_vecs.pop(0) if plan.encode_text else None
+        code_vecs = dense_vecs  # the code query (if any) followed by the chunks
 
         expr = self._filter_expr(version, filter_expr)
 
-        sparse_hits = (
-            self._sparse("sparse_title", text_sparse, top_k=top_k, expr=expr, radius=radius_sparse, range_filter=range_sparse)
-            if sparse_weight
-            else []
-        )
-        dense_text_hits = (
-            self._dense("dense_text_content", text_dense, top_k=top_k, expr=expr, radius=radius_dense_text, range_filter=range_dense_text)
-            if dense_text_weight
-            else []
-        )
-        dense_code_hits = (
-            self._dense("dense_code_snippet", code_dense, top_k=top_k, expr=expr, radius=radius_dense_code, range_filter=range_dense_code)
-            if dense_code_weight
-            else []
-        )
+        jobs = []
+        if plan.runs("sparse"):
+            sparse = partial(self._sparse, drop_ratio_search=drop_ratio)
+            jobs.append((sparse, "sparse", text_sparse, radius_sparse, range_sparse))
+        if plan.runs("dense_text"):
+            jobs.append((self._dense, "dense_text", text_dense, radius_dense_text, range_dense_text))
+        if plan.runs("dense_code") and len(code_vecs) > 1:
+            jobs.append((self._dense_multi, "dense_code", code_vecs, radius_dense_code, range_dense_code))
+        elif plan.runs("dense_code"):
+            jobs.append((self._dense, "dense_code", code_vecs[0], radius_dense_code, range_dense_code))
+        if plan.runs("bm25"):
+            lexical_query = f"{text_query}\n{code_query}".strip()
+            jobs.append((self._bm25, "bm25", lexical_query, None, None))
 
+        # only worth it with a user filter – the version term matches every row
+        iterative = bool(iterative_filter and filter_expr)
+        futures = {
+            self._fanout.submit(
+                fn, MODALITIES[name][0], query, top_k=plan.limits[name], expr=expr, version=version,
+                radius=radius, range_filter=rng, iterative_filter=iterative,
+            ): MODALITIES[name][1]
+            for fn, name, query, radius, rng in jobs
+        }
         merged: Dict[str, Dict[str, Any]] = {}
-        if sparse_weight:
-            self._merge_hits(merged, sparse_hits, "sparse_distance")
-        if dense_text_weight:
-            self._merge_hits(merged, dense_text_hits, "dense_text_distance")
-        if dense_code_weight:
-            self._merge_hits(merged, dense_code_hits, "dense_code_distance")
+        for fut in as_completed(futures):
+            if cancel is not None and cancel.cancelled:
+                dropped = sum(f.cancel() for f in futures)
+                metrics.incr("cancel.searches_dropped", dropped)
+                cancel.raise_if_cancelled("search")
+            self._merge_hits(merged, fut.result(), futures[fut])
+            if on_merge is not None:
+                on_merge(merged)
 
         def _score(e: Dict[str, Any]) -> float:
             score = 0.0
@@ -189,10 +519,32 @@ class SearchManager:
             if dense_code_weight and e["dense_code_distance"] is not None:
                 score += dense_code_weight * normalize_distance(e["dense_code_distance"])
                 wsum += dense_code_weight
+            if bm25_weight and e["bm25_distance"] is not None:
+                score += bm25_weight * normalize_distance(e["bm25_distance"] / BM25_SCORE_SCALE)
+                wsum += bm25_weight
             return score / wsum if wsum else 0.0
 
         # top‑k
         best = heapq.nlargest(top_k, merged.values(), key=_score)
         for itm in best:
             itm["combined_score"] = _score(itm)
+
+        if rerank:
+            from app.rerank.cross_encoder import get_reranker
+
+            if cancel is not None:
+                cancel.raise_if_cancelled("rerank")
+
+            reranker = get_reranker(block=False)
+            if reranker is None:
+                # still loading – a load never counts against the request
+                metrics.incr("rerank.fallbacks")
+                plan.reranked = False
+                return best[:final_k]
+            best, plan.reranked = reranker.rerank(
+                text_query or code_query,
+                best,
+                top_n=final_k,
+                budget_ms=rerank_budget_ms if rerank_budget_ms is not None else RERANK_BUDGET_MS,
+            )
         return best
\ No newline at end of file
@@ -0,0 +1,116 @@
+"""Split uploaded source files into embedding-sized, syntax-aware chunks.
+
+Embedding a whole file as one query truncates it at the model's max length
+and averages every function into one diluted vector. Instead each file is cut
+at top-level declaration boundaries (``def``/``class``/``function``/``export``
+…) and the pieces are packed into chunks of at most ``max_chars``:
+
+    chunks = chunk_files(req.file_list, budget=16)
+    # -> ["```py\\ndef a(): ...```", "```py\\nclass B: ...```", ...]
+
+Chunks keep the fenced ```ext layout the single-vector code query used.
+"""
+
+from __future__ import annotations
+
+import re
+from itertools import zip_longest
+from typing import Iterable, List, Sequence
+
+from app.classes.schemas import FileModel
+from config import CODE_QUERY_CHUNK_BUDGET, CODE_QUERY_CHUNK_CHARS
+
+__all__ = ["split_code", "chunk_files"]
+
+# an unindented line that starts a new top-level unit in the usual languages
+_BOUNDARY = re.compile(
+    r"^(?:@|#\[|(?:export\s+)?(?:default\s+)?(?:async\s+)?"
+    r"(?:def|class|function|interface|type|enum|const|let|var|fn|pub|impl|struct|trait|func|"
+    r"public|private|protected|static|module|namespace)\b)"
+)
+
+
+def _segments(source: str) -> List[str]:
+    """Top-level units of *source*; decorators stay attached to what they decorate."""
+    segments: List[str] = []
+    current: List[str] = []
+    prev_decorator = False
+    for line in source.splitlines():
+        starts_unit = bool(_BOUNDARY.match(line))
+        if starts_unit and current and not prev_decorator:
+            segments.append("\n".join(current))
+            current = []
+        current.append(line)
+        if line.strip():
+            prev_decorator = line.startswith(("@", "#["))
+    if current:
+        segments.append("\n".join(current))
+    return [s for s in segments if s.strip()]
+
+
+def _split_long(segment: str, max_chars: int) -> Iterable[str]:
+    """Cut an oversized unit on line boundaries (hard-cut overlong lines)."""
+    buf: List[str] = []
+    size = 0
+    for line in segment.splitlines():
+        while len(line) > max_chars:
+            if buf:
+                yield "\n".join(buf)
+                buf, size = [], 0
+            yield line[:max_chars]
+            line = line[max_chars:]
+        if buf and size + len(line) + 1 > max_chars:
+            yield "\n".join(buf)
+            buf, size = [], 0
+        buf.append(line)
+        size += len(line) + 1
+    if buf:
+        yield "\n".join(buf)
+
+
+def split_code(source: str, *, max_chars: int = CODE_QUERY_CHUNK_CHARS) -> List[str]:
+    """Pack the top-level units of *source* into chunks of ≤ *max_chars*."""
+    chunks: List[str] = []
+    buf = ""
+    for seg in _segments(source):
+        if len(seg) > max_chars:
+            if buf:
+                chunks.append(buf)
+                buf = ""
+            chunks.extend(_split_long(seg, max_chars))
+        elif buf and len(buf) + len(seg) + 1 > max_chars:
+            chunks.append(buf)
+            buf = seg
+        else:
+            buf = f"{buf}\n{seg}" if buf else seg
+    if buf:
+        chunks.append(buf)
+    return chunks
+
+
+def chunk_files(
+    files: Sequence[FileModel] | None,
+    *,
+    budget: int = CODE_QUERY_CHUNK_BUDGET,
+    max_chars: int = CODE_QUERY_CHUNK_CHARS,
+) -> List[str]:
+    """Fenced chunks of every file, at most *budget* in total.
+
+    Files are interleaved round-robin so one large upload cannot use up the
+    whole budget; each file contributes its leading chunks first.
+    """
+    if not files or budget <= 0:
+        return []
+    per_file = [
+        [f"```{f.file_extension}\n{chunk}```" for chunk in split_code(f.file_content, max_chars=max_chars)]
+        for f in files
+    ]
+    out: List[str] = []
+    for row in zip_longest(*per_file):
+        for chunk in row:
+            if chunk is None:
+                continue
+            out.append(chunk)
+            if len(out) == budget:
+                return out
+    return out
@@ -0,0 +1,123 @@
+"""Decide which encodings and ANN calls a search actually needs.
+
+A plain-text question leaves ``code_query`` empty, yet every modality used to
+run: ``""`` took an embedding slot and ``dense_code_snippet`` got a full ANN
+call whose hits were noise. The planner looks at the request once and drops
+modalities with a zero weight or nothing to search with. It also sets each
+remaining modality's candidate limit:
+
+    plan = plan_query(text_query="How do I redirect?", code_query="", top_k=10)
+    plan.to_dict()
+    # {"modalities": {"sparse": 10, "dense_text": 10, "bm25": 10},
+    #  "encode": ["text"], "skipped": {"dense_code": "empty code query"}}
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Mapping
+
+from config import PLANNER_MIN_QUERY_CHARS
+
+__all__ = ["MODALITIES", "QueryPlan", "plan_query"]
+
+# modality → (anns field, distance key in the merged entries)
+MODALITIES: Dict[str, tuple[str, str]] = {
+    "sparse": ("sparse_title", "sparse_distance"),
+    "dense_text": ("dense_text_content", "dense_text_distance"),
+    "dense_code": ("dense_code_snippet", "dense_code_distance"),
+    "bm25": ("bm25_sparse", "bm25_distance"),
+}
+
+
+@dataclass
+class QueryPlan:
+    """Modalities to run with their candidate limits, and what to embed."""
+
+    limits: Dict[str, int] = field(default_factory=dict)
+    encode_text: bool = False
+    encode_code: bool = False
+    code_chunks: List[str] = field(default_factory=list)
+    skipped: Dict[str, str] = field(default_factory=dict)
+    # set by the search once it ran: whether a requested rerank happened (None → not requested)
+    reranked: bool | None = None
+
+    def runs(self, modality: str) -> bool:
+        return modality in self.limits
+
+    @property
+    def encode(self) -> List[str]:
+        """Query strings to embed, in batch order: text, code, then chunks."""
+        return (["text"] if self.encode_text else []) + (["code"] if self.encode_code else []) + (
+            [f"chunk_{i}" for i in range(len(self.code_chunks))]
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        out = {"modalities": dict(self.limits), "encode": self.encode, "skipped": dict(self.skipped)}
+        if self.reranked is not None:
+            out["reranked"] = self.reranked
+        return out
+
+
+def _usable(query: str) -> bool:
+    return len(query.strip()) >= PLANNER_MIN_QUERY_CHARS
+
+
+def plan_query(
+    *,
+    text_query: str,
+    code_query: str,
+    top_k: int,
+    sparse_weight: float = 1.0,
+    dense_text_weight: float = 1.0,
+    dense_code_weight: float = 1.0,
+    bm25_weight: float = 0.0,
+    code_chunks: List[str] | None = None,
+    limits: Mapping[str, int] | None = None,
+) -> QueryPlan:
+    """Plan a search; raises ``ValueError`` when nothing is left to run.
+
+    *limits* overrides the per-modality candidate count (default *top_k*).
+    Examples are ``{"sparse": 5}`` for a noisy title channel, or a larger
+    ``dense_code`` pool when files are attached.
+    """
+    unknown = set(limits or ()) - set(MODALITIES)
+    if unknown:
+        raise ValueError(f"Unknown modalities in limits: {sorted(unknown)}")
+
+    has_text = _usable(text_query)
+    has_code = _usable(code_query)
+    chunks = [c for c in code_chunks or [] if c.strip()]
+    weights = {
+        "sparse": sparse_weight,
+        "dense_text": dense_text_weight,
+        "dense_code": dense_code_weight,
+        "bm25": bm25_weight,
+    }
+    inputs = {
+        "sparse": (has_text, "empty text query"),
+        "dense_text": (has_text, "empty text query"),
+        "dense_code": (has_code or bool(chunks), "empty code query"),
+        "bm25": (has_text or has_code, "empty query"),
+    }
+
+    plan = QueryPlan()
+    for name, weight in weights.items():
+        present, reason = inputs[name]
+        if not weight:
+            plan.skipped[name] = "zero weight"
+        elif not present:
+            plan.skipped[name] = reason
+        else:
+            plan.limits[name] = max(1, int((limits or {}).get(name, top_k)))
+
+    if not plan.limits:
+        if not any(weights.values()):
+            raise ValueError("All modality weights are zero – nothing to search.")
+        raise ValueError("Query is empty – nothing to search.")
+
+    plan.encode_text = plan.runs("sparse") or plan.runs("dense_text")
+    if plan.runs("dense_code"):
+        plan.encode_code = has_code
+        plan.code_chunks = chunks
+    return plan
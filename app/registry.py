@@ -0,0 +1,210 @@
+"""In-memory registry of supported / downloaded / ingested versions.
+
+Replaces re-reading ``supported_versions.txt`` and ``stat()``-ing one CSV per
+version on every request. A background watcher polls the mtimes of the
+versions file and the downloads directory and reloads only when they change,
+so lookups on the request path are pure in-memory operations:
+
+    from app.registry import registry
+    if not registry.is_supported(version): ...
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from config import DOWNLOADS_DIR, REGISTRY_REFRESH_SECONDS, SUPPORTED_VERSIONS_FILE
+
+__all__ = ["VersionState", "VersionRegistry", "registry"]
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class VersionState:
+    downloaded: bool = False
+    ingested: bool = False
+    file_size: int | None = None
+    last_modified: float | None = None
+    rows: int | None = None
+    # provisioned from a snapshot – there may be no CSV on disk
+    imported: bool = False
+
+
+def _mtime(path: Path) -> float | None:
+    try:
+        return path.stat().st_mtime
+    except OSError:
+        return None
+
+
+class VersionRegistry:
+    """Thread-safe snapshot of version state, refreshed on file changes."""
+
+    def __init__(
+        self,
+        versions_file: str | os.PathLike[str] = SUPPORTED_VERSIONS_FILE,
+        downloads_dir: str | os.PathLike[str] = DOWNLOADS_DIR,
+        *,
+        refresh_interval: float = REGISTRY_REFRESH_SECONDS,
+    ) -> None:
+        self.versions_file = Path(versions_file)
+        self.downloads_dir = Path(downloads_dir)
+        self.refresh_interval = refresh_interval
+
+        self._lock = threading.Lock()
+        self._ordered: Tuple[str, ...] = ()
+        self._supported: frozenset[str] = frozenset()
+        self._states: Dict[str, VersionState] = {}
+        self._error: str | None = None
+        self._seen: Tuple[float | None, float | None] = (None, None)
+        self._loaded = False
+        self._watcher: threading.Thread | None = None
+
+    # ------------------------------------------------------------------
+    # Lookups (hot path – no I/O once loaded)
+    # ------------------------------------------------------------------
+
+    def is_supported(self, version: str) -> bool:
+        self._ensure_loaded()
+        return version in self._supported
+
+    def supported(self) -> Tuple[str, ...]:
+        """Supported versions in file order; raises if the file never loaded."""
+        self._ensure_loaded()
+        if self._error and not self._ordered:
+            raise RuntimeError(self._error)
+        return self._ordered
+
+    def state(self, version: str) -> VersionState:
+        self._ensure_loaded()
+        return self._states.get(version, VersionState())
+
+    def downloaded(self) -> List[str]:
+        return [v for v in self.supported() if self.state(v).downloaded]
+
+    # ------------------------------------------------------------------
+    # Updates from the ingest / delete paths
+    # ------------------------------------------------------------------
+
+    def mark_ingested(self, version: str, csv_path: str | os.PathLike[str], *, rows: int | None = None) -> None:
+        st = Path(csv_path).stat()
+        with self._lock:
+            self._states[version] = VersionState(
+                downloaded=True,
+                ingested=True,
+                file_size=st.st_size,
+                last_modified=st.st_mtime,
+                rows=rows,
+            )
+
+    def mark_imported(
+        self,
+        version: str,
+        *,
+        rows: int,
+        file_size: int | None = None,
+        last_modified: float | None = None,
+    ) -> None:
+        """Record a snapshot import; size / mtime describe the snapshot when there is no CSV."""
+        with self._lock:
+            prev = self._states.get(version, VersionState())
+            self._states[version] = replace(
+                prev,
+                downloaded=True,
+                ingested=True,
+                rows=rows,
+                imported=True,
+                file_size=prev.file_size if prev.file_size is not None else file_size,
+                last_modified=prev.last_modified if prev.last_modified is not None else last_modified,
+            )
+
+    def mark_deleted(self, version: str) -> None:
+        with self._lock:
+            self._states.pop(version, None)
+
+    def set_rows(self, version: str, rows: int) -> None:
+        with self._lock:
+            self._states[version] = replace(self._states.get(version, VersionState()), rows=rows)
+
+    # ------------------------------------------------------------------
+    # Loading / change detection
+    # ------------------------------------------------------------------
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        with self._lock:
+            if not self._loaded:
+                self._refresh_locked(force=True)
+                self._loaded = True
+                if self.refresh_interval > 0:
+                    self._watcher = threading.Thread(target=self._watch, name="version-registry", daemon=True)
+                    self._watcher.start()
+
+    def refresh(self, *, force: bool = False) -> None:
+        with self._lock:
+            self._refresh_locked(force=force)
+
+    def _watch(self) -> None:
+        while True:
+            time.sleep(self.refresh_interval)
+            try:
+                self.refresh()
+            except Exception:  # pragma: no cover – keep the watcher alive
+                logger.exception("Version registry refresh failed")
+
+    def _refresh_locked(self, *, force: bool) -> None:
+        seen = (_mtime(self.versions_file), _mtime(self.downloads_dir))
+        if not force and seen == self._seen:
+            return
+        self._seen = seen
+
+        try:
+            with open(self.versions_file, "r", encoding="utf-8") as fh:
+                ordered = tuple(ln.strip() for ln in fh if ln.strip())
+            self._error = None
+        except OSError as exc:
+            self._error = f"Error reading versions file: {exc}"
+            logger.error(self._error)
+            ordered = self._ordered
+
+        on_disk: Dict[str, os.stat_result] = {}
+        if self.downloads_dir.is_dir():
+            with os.scandir(self.downloads_dir) as it:
+                for entry in it:
+                    if entry.is_file() and entry.name.endswith(".csv"):
+                        on_disk[entry.name[:-4]] = entry.stat()
+
+        states: Dict[str, VersionState] = {}
+        for ver in ordered:
+            st = on_disk.get(ver)
+            prev = self._states.get(ver)
+            if st is None:
+                if prev and prev.imported:
+                    states[ver] = prev
+                continue
+            unchanged = prev and prev.file_size == st.st_size and prev.last_modified == st.st_mtime
+            states[ver] = VersionState(
+                downloaded=True,
+                # the API ingests right after downloading, so a CSV on disk means ingested
+                ingested=prev.ingested if prev else True,
+                file_size=st.st_size,
+                last_modified=st.st_mtime,
+                rows=prev.rows if unchanged else None,
+                imported=prev.imported if prev else False,
+            )
+
+        self._ordered = ordered
+        self._supported = frozenset(ordered)
+        self._states = states
+        logger.debug("Version registry loaded: %d supported, %d downloaded", len(ordered), len(states))
+
+
+registry = VersionRegistry()
@@ -0,0 +1,179 @@
+"""Local CPU cross‑encoder reranking with a hard per‑request time budget.
+
+Candidates from the hybrid search are scored against the query in small
+batches. If the budget runs out before every candidate is scored, the
+blended order is kept unchanged – reranking never makes a request slower
+than ``budget_ms`` plus one batch. A request that finds the model not yet
+loaded starts loading it in the background and keeps the blended order too;
+``RERANKER_PRELOAD`` loads it during warm-up instead.
+"""
+
+from __future__ import annotations
+
+import logging
+import math
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from app.metrics import metrics
+from config import (
+    MODEL_CACHE_DIR,
+    RERANKER_BATCH_SIZE,
+    RERANKER_MAX_LENGTH,
+    RERANKER_MODEL,
+    RERANKER_ONNX_PATH,
+)
+
+__all__ = ["CrossEncoderReranker", "get_reranker"]
+
+logger = logging.getLogger(__name__)
+
+_PASSAGE_CHARS = 2000  # the model only sees RERANKER_MAX_LENGTH tokens anyway
+
+
+def _sigmoid(x: float) -> float:
+    # branch on the sign so exp() never sees a large positive argument
+    if x >= 0:
+        return 1.0 / (1.0 + math.exp(-x))
+    z = math.exp(x)
+    return z / (1.0 + z)
+
+
+class _OnnxCrossEncoder:
+    """Minimal ONNX Runtime scorer for an exported bge‑reranker directory.
+
+    Expects ``model.onnx`` and ``tokenizer.json`` inside *path*.
+    """
+
+    def __init__(self, path: str | Path, max_length: int) -> None:
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        path = Path(path)
+        self.session = ort.InferenceSession(str(path / "model.onnx"), providers=["CPUExecutionProvider"])
+        self.tokenizer = Tokenizer.from_file(str(path / "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length)
+        self.tokenizer.enable_padding()
+        self.inputs = {i.name for i in self.session.get_inputs()}
+
+    def compute_score(self, pairs: Sequence[Tuple[str, str]], normalize: bool = True) -> List[float]:
+        enc = self.tokenizer.encode_batch(list(pairs))
+        feed = {
+            "input_ids": np.asarray([e.ids for e in enc], dtype=np.int64),
+            "attention_mask": np.asarray([e.attention_mask for e in enc], dtype=np.int64),
+        }
+        if "token_type_ids" in self.inputs:
+            feed["token_type_ids"] = np.asarray([e.type_ids for e in enc], dtype=np.int64)
+        logits = self.session.run(None, {k: v for k, v in feed.items() if k in self.inputs})[0].reshape(-1)
+        return [_sigmoid(float(x)) for x in logits] if normalize else logits.tolist()
+
+
+class CrossEncoderReranker:
+    """Score (query, passage) pairs and reorder search entries."""
+
+    def __init__(
+        self,
+        *,
+        model_name: str = RERANKER_MODEL,
+        onnx_path: str = RERANKER_ONNX_PATH,
+        batch_size: int = RERANKER_BATCH_SIZE,
+        max_length: int = RERANKER_MAX_LENGTH,
+    ) -> None:
+        self.batch_size = batch_size
+        if onnx_path:
+            self.model = _OnnxCrossEncoder(onnx_path, max_length)
+            logger.info("Reranker loaded from ONNX export %s", onnx_path)
+        else:
+            from FlagEmbedding import FlagReranker
+
+            self.model = FlagReranker(
+                model_name,
+                cache_dir=str(Path(MODEL_CACHE_DIR)),
+                use_fp16=False,
+                devices=["cpu"],
+                max_length=max_length,
+            )
+            logger.info("Reranker loaded: %s", model_name)
+
+    @staticmethod
+    def _passage(entry: Dict[str, Any]) -> str:
+        title = entry.get("title") or ""
+        text = entry.get("text_content") or ""
+        return f"{title}\n{text}"[:_PASSAGE_CHARS]
+
+    def rerank(
+        self,
+        query: str,
+        candidates: List[Dict[str, Any]],
+        *,
+        top_n: int,
+        budget_ms: float,
+    ) -> Tuple[List[Dict[str, Any]], bool]:
+        """Return ``(entries, reranked)``; ``reranked`` is False on budget fallback."""
+        if not candidates or not query.strip():
+            return candidates[:top_n], False
+
+        deadline = time.perf_counter() + budget_ms / 1000.0
+        scores: List[float] = []
+        start = time.perf_counter()
+        for i in range(0, len(candidates), self.batch_size):
+            if time.perf_counter() >= deadline:
+                metrics.incr("rerank.fallbacks")
+                logger.debug("Rerank budget of %.0f ms exhausted after %d/%d candidates", budget_ms, i, len(candidates))
+                return candidates[:top_n], False
+            batch = candidates[i : i + self.batch_size]
+            batch_scores = self.model.compute_score([(query, self._passage(c)) for c in batch], normalize=True)
+            scores.extend(np.atleast_1d(batch_scores).tolist())
+        metrics.observe("rerank.seconds", time.perf_counter() - start)
+
+        order = sorted(range(len(candidates)), key=lambda j: scores[j], reverse=True)[:top_n]
+        best = []
+        for j in order:
+            candidates[j]["rerank_score"] = float(scores[j])
+            best.append(candidates[j])
+        return best, True
+
+
+_reranker: CrossEncoderReranker | None = None
+_reranker_lock = threading.Lock()
+_loader: threading.Thread | None = None
+
+
+def _load() -> CrossEncoderReranker:
+    global _reranker
+    with _reranker_lock:
+        if _reranker is None:
+            with metrics.timer("rerank.load_seconds"):
+                _reranker = CrossEncoderReranker()
+    return _reranker
+
+
+def _load_in_background() -> None:
+    global _loader
+    try:
+        _load()
+    except Exception:
+        logger.exception("Reranker failed to load")
+        _loader = None  # let a later request retry
+
+
+def get_reranker(*, block: bool = True) -> CrossEncoderReranker | None:
+    """The process‑wide reranker, constructed on first use.
+
+    With ``block=False`` a missing model starts loading in a background
+    thread and None is returned, so a request never pays for the load.
+    """
+    global _loader
+    if _reranker is not None:
+        return _reranker
+    if block:
+        return _load()
+    with _reranker_lock:
+        if _reranker is None and _loader is None:
+            _loader = threading.Thread(target=_load_in_background, name="raggin-reranker-load", daemon=True)
+            _loader.start()
+    return _reranker
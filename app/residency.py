@@ -0,0 +1,294 @@
+"""LRU residency for per-version search data under a memory budget.
+
+Backends hand in three callables – *load*, *release* and *size_of* – and
+wrap every search in ``with residency.lease(key) as handle:``. A miss loads
+the key transparently; least‑recently‑used keys that are not currently
+leased are released until the resident set fits the budget again.
+
+When the loaded data lives on a server shared by several workers (Milvus),
+the per-worker manager only caches handles. A :class:`SharedLedger` then
+records what is loaded server-side and is the one place that releases it:
+every worker updates the same ledger file under a file lock, so the budget
+holds across the workers of a host.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Generic, Iterator, TypeVar
+
+from filelock import FileLock
+
+from app.metrics import metrics
+
+__all__ = ["ResidencyManager", "SharedLedger"]
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# a hit refreshes its ledger timestamp at most this often per key
+_TOUCH_SECONDS = 1.0
+
+
+class _Entry(Generic[T]):
+    __slots__ = ("handle", "nbytes", "leases")
+
+    def __init__(self, handle: T, nbytes: int) -> None:
+        self.handle = handle
+        self.nbytes = nbytes
+        self.leases = 0
+
+
+class SharedLedger:
+    """Cross-process LRU of server-side loads under one budget.
+
+    The ledger file maps each loaded key to ``{"nbytes", "used"}``. Whoever
+    records a load also releases the least recently used other keys while
+    the total is over budget. Another worker may still hold a handle to a
+    released key; its next search fails as not loaded and reloads it.
+    """
+
+    def __init__(
+        self,
+        path: str | os.PathLike[str],
+        *,
+        release: Callable[[str], None],
+        budget_bytes: int,
+        max_resident: int = 0,
+        name: str = "residency",
+    ) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._filelock = FileLock(str(self.path) + ".lock")
+        self._release = release
+        self.budget_bytes = budget_bytes
+        self.max_resident = max_resident
+        self.name = name
+        self._touched: Dict[str, float] = {}
+
+    def loaded(self, key: str, nbytes: int) -> None:
+        """Record *key* as loaded and release other keys until the budget holds."""
+        with self._filelock:
+            ledger = self._read()
+            ledger[key] = {"nbytes": int(nbytes), "used": time.time()}
+            victims = []
+            # least recently used first; never the key just loaded
+            for other in sorted(ledger, key=lambda k: ledger[k]["used"]):
+                if not self._over_budget(ledger):
+                    break
+                if other != key:
+                    victims.append((other, ledger.pop(other)))
+            for other, entry in victims:
+                try:
+                    self._release(other)
+                except Exception:  # pragma: no cover – backend failure, e.g. already dropped
+                    logger.warning("%s: releasing %s failed", self.name, other, exc_info=True)
+                metrics.incr(f"{self.name}.shared_evictions")
+                logger.info("%s: released %s (%.1f MB)", self.name, other, entry["nbytes"] / 2**20)
+            self._write(ledger)
+        self._touched[key] = time.monotonic()
+
+    def touch(self, key: str) -> None:
+        """Mark *key* as recently used (throttled per key)."""
+        now = time.monotonic()
+        if now - self._touched.get(key, 0.0) < _TOUCH_SECONDS:
+            return
+        self._touched[key] = now
+        with self._filelock:
+            ledger = self._read()
+            if key in ledger:
+                ledger[key]["used"] = time.time()
+                self._write(ledger)
+
+    def forget(self, key: str) -> None:
+        """Drop *key* without releasing it (it was rebuilt or deleted)."""
+        self._touched.pop(key, None)
+        with self._filelock:
+            ledger = self._read()
+            if ledger.pop(key, None) is not None:
+                self._write(ledger)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._filelock:
+            ledger = self._read()
+        resident = {k: ledger[k]["nbytes"] for k in sorted(ledger, key=lambda k: ledger[k]["used"])}
+        return {"resident_bytes": sum(resident.values()), "resident": resident}
+
+    def _over_budget(self, ledger: Dict[str, Dict[str, Any]]) -> bool:
+        too_many = self.max_resident and len(ledger) > self.max_resident
+        return bool(too_many) or sum(e["nbytes"] for e in ledger.values()) > self.budget_bytes
+
+    def _read(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            return json.loads(self.path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _write(self, ledger: Dict[str, Dict[str, Any]]) -> None:
+        tmp = self.path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(ledger), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+
+class ResidencyManager(Generic[T]):
+    """Keep the most recently used keys loaded within *budget_bytes*.
+
+    With a *ledger*, loads and hits are also recorded there; *release* then
+    should only drop the local handle.
+    """
+
+    def __init__(
+        self,
+        *,
+        load: Callable[[str], T],
+        release: Callable[[str, T], None],
+        size_of: Callable[[str, T], int],
+        budget_bytes: int,
+        max_resident: int = 0,
+        name: str = "residency",
+        ledger: SharedLedger | None = None,
+    ) -> None:
+        self._load = load
+        self._release = release
+        self._size_of = size_of
+        self.budget_bytes = budget_bytes
+        self.max_resident = max_resident
+        self.name = name
+        self.ledger = ledger
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, _Entry[T]]" = OrderedDict()
+        self._loading: Dict[str, threading.Lock] = {}
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    @contextmanager
+    def lease(self, key: str) -> Iterator[T]:
+        """Yield the loaded handle for *key*; it cannot be evicted meanwhile."""
+        entry = self._acquire(key)
+        try:
+            yield entry.handle
+        finally:
+            with self._lock:
+                entry.leases -= 1
+            self._evict_over_budget()
+
+    def discard(self, key: str, *, release: bool = True) -> None:
+        """Forget *key* locally (e.g. after it was rebuilt or dropped), optionally releasing it."""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        if entry is not None:
+            if release:
+                self._safe_release(key, entry)
+            self._publish()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            resident = {k: e.nbytes for k, e in self._entries.items()}
+        stats: Dict[str, Any] = {
+            "budget_bytes": self.budget_bytes,
+            "max_resident": self.max_resident,
+            "resident_bytes": sum(resident.values()),
+            "resident": resident,  # LRU → MRU order
+            "counters": {
+                k.split(".", 1)[1]: v
+                for k, v in metrics.snapshot()["counters"].items()
+                if k.startswith(f"{self.name}.")
+            },
+        }
+        if self.ledger is not None:
+            stats["shared"] = self.ledger.stats()
+        return stats
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+
+    def _acquire(self, key: str) -> _Entry[T]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                entry.leases += 1
+                metrics.incr(f"{self.name}.hits")
+            else:
+                load_lock = self._loading.setdefault(key, threading.Lock())
+        if entry is not None:
+            if self.ledger is not None:
+                self.ledger.touch(key)
+            return entry
+
+        # one loader per key; other callers for the same key wait on it
+        with load_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    entry.leases += 1
+                    metrics.incr(f"{self.name}.hits")
+                    return entry
+
+            metrics.incr(f"{self.name}.misses")
+            with metrics.timer(f"{self.name}.load_seconds"):
+                handle = self._load(key)
+            nbytes = int(self._size_of(key, handle))
+            if self.ledger is not None:
+                self.ledger.loaded(key, nbytes)
+            entry = _Entry(handle, nbytes)
+            entry.leases = 1
+            with self._lock:
+                self._entries[key] = entry
+                self._loading.pop(key, None)
+            metrics.incr(f"{self.name}.loads")
+            logger.info("%s: loaded %s (%.1f MB)", self.name, key, nbytes / 2**20)
+
+        self._evict_over_budget()
+        return entry
+
+    def _over_budget(self) -> bool:
+        total = sum(e.nbytes for e in self._entries.values())
+        too_many = self.max_resident and len(self._entries) > self.max_resident
+        return bool(too_many) or total > self.budget_bytes
+
+    def _evict_over_budget(self) -> None:
+        victims = []
+        with self._lock:
+            # never evict the most recently used key, even if it alone exceeds the budget
+            for key in list(self._entries)[:-1]:
+                if not self._over_budget():
+                    break
+                entry = self._entries[key]
+                if entry.leases:
+                    continue  # in use – try the next least‑recent one
+                del self._entries[key]
+                victims.append((key, entry))
+        for key, entry in victims:
+            self._safe_release(key, entry)
+            metrics.incr(f"{self.name}.evictions")
+            logger.info("%s: evicted %s (%.1f MB)", self.name, key, entry.nbytes / 2**20)
+        self._publish()
+
+    def _safe_release(self, key: str, entry: _Entry[T]) -> None:
+        try:
+            self._release(key, entry.handle)
+        except Exception:  # pragma: no cover – backend failure
+            logger.warning("%s: releasing %s failed", self.name, key, exc_info=True)
+
+    def _publish(self) -> None:
+        with self._lock:
+            metrics.set(f"{self.name}.resident_bytes", sum(e.nbytes for e in self._entries.values()))
+            metrics.set(f"{self.name}.resident_count", len(self._entries))
@@ -0,0 +1,186 @@
+"""Fast JSON responses, field projection and negotiated compression.
+
+Retrieval payloads carry up to ``top_k`` entries of 64 KB text/code each.
+Pushing them through FastAPI's ``jsonable_encoder`` + ``json.dumps`` and
+sending them raw dominated the tail latency of ``/search`` and
+``/prompt/enhance``. Those routes now return :class:`FastJSONResponse`
+directly (orjson when installed). :class:`CompressionMiddleware` compresses
+complete bodies with zstd or gzip, whichever the client's
+``Accept-Encoding`` prefers. ``?fields=entry_id,title,combined_score`` trims
+each entry down to what the client actually reads.
+"""
+
+from __future__ import annotations
+
+import gzip
+import json
+from typing import Any, Dict, Iterable, List, Sequence
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from config import (
+    RESPONSE_COMPRESSION,
+    RESPONSE_COMPRESSION_MIN_BYTES,
+    RESPONSE_GZIP_LEVEL,
+    RESPONSE_ZSTD_LEVEL,
+)
+
+try:  # optional – falls back to the stdlib encoder
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:  # optional – only gzip is offered without it
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+__all__ = ["FastJSONResponse", "CompressionMiddleware", "parse_fields", "project"]
+
+# streamed or already-compact bodies that must not be buffered / recompressed
+_NO_COMPRESS_TYPES = ("application/x-ndjson", "text/event-stream", "image/", "application/zip", "application/gzip")
+
+
+def _default(obj: Any) -> Any:
+    """Serialise what orjson / json do not know natively (NumPy scalars, sets)."""
+    if hasattr(obj, "item"):
+        return obj.item()
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+class FastJSONResponse(JSONResponse):
+    """``JSONResponse`` rendered by orjson (NumPy‑aware) when available."""
+
+    def render(self, content: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content, default=_default, option=orjson.OPT_SERIALIZE_NUMPY)
+        return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+# -----------------------------------------------------------------------------
+# fields= projection
+# -----------------------------------------------------------------------------
+
+
+def parse_fields(fields: str | None) -> List[str] | None:
+    """``"entry_id, title"`` → ``["entry_id", "title"]``; empty → no projection."""
+    if not fields:
+        return None
+    names = [f.strip() for f in fields.split(",") if f.strip()]
+    return names or None
+
+
+def project(items: Iterable[Dict[str, Any]], fields: Sequence[str] | None) -> List[Dict[str, Any]]:
+    """Keep only *fields* (those present) of every entry in *items*."""
+    if not fields:
+        return list(items)
+    return [{f: item[f] for f in fields if f in item} for item in items]
+
+
+# -----------------------------------------------------------------------------
+# Accept-Encoding negotiation
+# -----------------------------------------------------------------------------
+
+
+def _available() -> List[str]:
+    supported = {"gzip"} | ({"zstd"} if zstandard is not None else set())
+    return [enc for enc in RESPONSE_COMPRESSION if enc in supported]
+
+
+def negotiate(accept_encoding: str, available: Sequence[str]) -> str | None:
+    """Best of *available* for an ``Accept-Encoding`` header, honouring q‑values.
+
+    Ties go to the order of *available* (server preference).
+    """
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name] = q
+    best, best_q = None, 0.0
+    for enc in available:
+        q = weights.get(enc, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = enc, q
+    return best
+
+
+class CompressionMiddleware:
+    """Compress complete response bodies with zstd or gzip.
+
+    Responses sent in several chunks (``more_body``, e.g. a Starlette
+    ``StreamingResponse``) pass through untouched, since buffering them would
+    undo streaming. The same goes for bodies under
+    ``RESPONSE_COMPRESSION_MIN_BYTES``.
+    """
+
+    def __init__(self, app: ASGIApp, *, minimum_size: int = RESPONSE_COMPRESSION_MIN_BYTES) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.available = _available()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self.available:
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""), self.available)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Message | None = None
+        passthrough = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal start, passthrough
+            if message["type"] == "http.response.start":
+                start = message  # held until the first body chunk decides
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            assert start is not None
+            headers = MutableHeaders(raw=start["headers"])
+            body = message.get("body", b"")
+            content_type = headers.get("content-type", "")
+            if (
+                message.get("more_body", False)
+                or len(body) < self.minimum_size
+                or "content-encoding" in headers
+                or content_type.startswith(_NO_COMPRESS_TYPES)
+            ):
+                passthrough = True
+                await send(start)
+                await send(message)
+                return
+
+            compressed = self._compress(encoding, body)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            headers.add_vary_header("Accept-Encoding")
+            await send(start)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
+
+    @staticmethod
+    def _compress(encoding: str, body: bytes) -> bytes:
+        if encoding == "zstd":
+            return zstandard.ZstdCompressor(level=RESPONSE_ZSTD_LEVEL).compress(body)
+        return gzip.compress(body, compresslevel=RESPONSE_GZIP_LEVEL)
@@ -1,13 +1,12 @@
 from __future__ import annotations
 
-import os
-from pathlib import Path
 from typing import List, Dict
 
+import pandas as pd
 from fastapi import APIRouter, HTTPException
 
 from app.classes.schemas import VersionsResponseItem
-from config import DOWNLOADS_DIR, SUPPORTED_VERSIONS_FILE
+from app.registry import registry
 
 router = APIRouter(prefix="/data", tags=["data"])
 
@@ -16,17 +15,20 @@ router = APIRouter(prefix="/data", tags=["data"])
 # -----------------------------------------------------------------------------
 
 def load_supported_versions() -> List[str]:
-    """Read the list of supported Next.js versions from the configured file."""
+    """Return the supported Next.js versions (cached by the version registry)."""
     try:
-        with open(SUPPORTED_VERSIONS_FILE, "r", encoding="utf-8") as fh:
-            return [ln.strip() for ln in fh if ln.strip()]
+        return list(registry.supported())
     except Exception as exc:  # pragma: no cover – bubbled as HTTP error
-        raise HTTPException(status_code=500, detail=f"Error reading versions file: {exc}") from exc
+        raise HTTPException(status_code=500, detail=str(exc)) from exc
 
 
-def _csv_path(version: str) -> Path:
-    """Return the absolute path to <downloads_dir>/<version>.csv"""
-    return Path(DOWNLOADS_DIR).resolve() / f"{version}.csv"
+def _row_count(version: str) -> int:
+    """Count CSV rows once per file revision; cached in the registry."""
+    rows = registry.state(version).rows
+    if rows is None:
+        rows = len(pd.read_csv(registry.downloads_dir / f"{version}.csv", usecols=["entry_id"]))
+        registry.set_rows(version, rows)
+    return rows
 
 
 # -----------------------------------------------------------------------------
@@ -36,46 +38,49 @@ def _csv_path(version: str) -> Path:
 @router.get("/versions", response_model=List[VersionsResponseItem])
 def list_versions() -> List[VersionsResponseItem]:
     """Return all supported versions and a *downloaded* flag for each."""
-    supported = load_supported_versions()
     return [
         VersionsResponseItem(
             version_name=ver,
-            downloaded=_csv_path(ver).exists(),
+            downloaded=registry.state(ver).downloaded,
         )
-        for ver in supported
+        for ver in load_supported_versions()
     ]
 
 
 @router.get("/versions/{version}", response_model=Dict[str, str | bool | int | float])
 def get_version_detail(version: str):
-    """Return metadata (size, mtime) for one version, 404 if unsupported."""
-    if version not in load_supported_versions():
+    """Return metadata (size, mtime, rows) for one version, 404 if unsupported."""
+    load_supported_versions()
+    if not registry.is_supported(version):
         raise HTTPException(status_code=404, detail=f"Version '{version}' is not supported")
 
-    path = _csv_path(version)
+    state = registry.state(version)
     detail: Dict[str, str | bool | int | float] = {
         "version_name": version,
-        "downloaded": path.exists(),
+        "downloaded": state.downloaded,
+        "ingested": state.ingested,
     }
-    if path.exists():
-        stat = path.stat()
-        detail.update(file_size=stat.st_size, last_modified=stat.st_mtime)
+    if state.downloaded:
+        extra = {"file_size": state.file_size, "last_modified": state.last_modified, "rows": _row_count(version)}
+        # the response model has no null values
+        detail.update({k: v for k, v in extra.items() if v is not None})
     return detail
 
 
 @router.get("/downloaded", response_model=List[str])
 def list_downloaded_versions() -> List[str]:
     """Return only versions whose CSV file exists in the downloads directory."""
-    return [ver for ver in load_supported_versions() if _csv_path(ver).exists()]
+    load_supported_versions()
+    return registry.downloaded()
 
 
 @router.get("/stats", response_model=Dict[str, int | List[str]])
 def version_stats():
     """Return simple counts & list of downloaded versions."""
     supported = load_supported_versions()
-    downloaded = [ver for ver in supported if _csv_path(ver).exists()]
+    downloaded = registry.downloaded()
     return {
         "total_supported": len(supported),
         "total_downloaded": len(downloaded),
         "downloaded_versions": downloaded,
-    }
\ No newline at end of file
+    }
@@ -1,5 +1,3 @@
-from __future__ import annotations
-
 """Prompt building & answer generation routes.
 
 Separation of concerns:
@@ -7,17 +5,35 @@ Separation of concerns:
   and retrieval context.  No FastAPI types → easy unit‑test.
 * **/prompt/enhance** – thin API wrapper that just returns that data.
 * **/prompt/generate** – uses the same helper then calls Ollama.
+* **_generate_pipelined()** – opt‑in variant of *generate* that overlaps
+  model warm‑up, history formatting and chunk rendering with retrieval.
+* **/prompt/session** – server-side chat history (:mod:`app.sessions`); with
+  ``session_id`` set, *generate* reads history from and appends to it.
+* **/prompt/cancel/{request_id}** – *enhance* and *generate* run under a
+  :class:`~app.cancellation.CancelToken` named by the ``X-Request-ID`` header;
+  a client disconnect or this route stops retrieval and the Ollama stream.
 
 Calling the helper directly from *generate* avoids an HTTP round‑trip, so
 performance is already optimal; splitting the logic merely improves
 readability & testability.
 """
 
+from __future__ import annotations
+
+import asyncio
 import logging
-from typing import List
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Request
+from starlette.concurrency import run_in_threadpool
 
+from app.cancellation import CancelToken, CancelledRequestError, cancellations
+from app.generator.client import GeneratorBusyError, get_client
+from app.responses import FastJSONResponse, parse_fields, project
+from app.sessions import ChatSession, InvalidSessionIdError, get_store as get_sessions
 from app.classes.schemas import (
     PromptRequest,
     GeneratorRequest,
@@ -27,9 +43,12 @@ from app.classes.schemas import (
     APIOptions,
     FileModel,
 )
-from app.routes.data import load_supported_versions
-from app.routes.search import search
-from utils import split_text_and_code, generate
+from app.metrics import metrics
+from app.query.code_chunks import chunk_files
+from app.registry import registry
+from app.routes.search import run_search
+from config import CANCEL_POLL_SECONDS, PIPELINED_GENERATION
+from utils import split_text_and_code, generate, history_string, render_chunk
 
 router = APIRouter(prefix="/prompt", tags=["prompt"])
 logger = logging.getLogger(__name__)
@@ -48,18 +67,24 @@ def _inline_files(text: str, files: List[FileModel] | None) -> str:
     return text
 
 
-def _build_prompt_and_context(req: PromptRequest) -> dict[str, object]:
+def _build_prompt_and_context(
+    req: PromptRequest,
+    *,
+    on_merge: Callable[[Dict[str, Dict[str, Any]]], None] | None = None,
+    cancel: CancelToken | None = None,
+) -> dict[str, object]:
     """Core business logic used by both endpoints (no HTTP types)."""
-    if req.version_name not in load_supported_versions():
+    if cancel is not None:
+        cancel.raise_if_cancelled("retrieval")
+    if not registry.is_supported(req.version_name):
         raise HTTPException(status_code=404, detail=f"Unsupported version '{req.version_name}'")
 
     text_parts = split_text_and_code(req.query)
     text_query = " ".join(text_parts["text"])
     code_query = " ".join(text_parts["code"])
-    
-    if req.file_list:
-        for f in req.file_list:
-            code_query += f"\n```{f.file_extension}\n{f.file_content}```"
+    # uploaded files become separate, syntax-aware code vectors instead of
+    # being appended to (and truncated with) the single code query
+    code_chunks = chunk_files(req.file_list)
 
     ropts = req.retriever_options or RetrieverOptions()
     search_req = SearchRequest(
@@ -68,6 +93,7 @@ def _build_prompt_and_context(req: PromptRequest) -> dict[str, object]:
         code_query=code_query,
         dense_code_weight=ropts.dense_code_weight,
         dense_text_weight=ropts.dense_text_weight,
+        bm25_weight=ropts.bm25_weight,
         top_k=ropts.top_k or 3,
         filter_expr=ropts.filter_expr,
         iterative_filter=ropts.iterative_filter,
@@ -77,24 +103,143 @@ def _build_prompt_and_context(req: PromptRequest) -> dict[str, object]:
         range_dense_text=ropts.range_dense_text,
         radius_dense_code=ropts.radius_dense_code,
         range_dense_code=ropts.range_dense_code,
+        rerank=ropts.rerank,
+        rerank_candidates=ropts.rerank_candidates,
+        rerank_budget_ms=ropts.rerank_budget_ms,
+        code_chunks=code_chunks,
+        modality_limits=ropts.modality_limits,
+        drop_ratio_search=ropts.drop_ratio_search,
     )
-    retrieved = search(search_req)
+    try:
+        retrieved = run_search(search_req, on_merge=on_merge, cancel=cancel)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve)) from ve
     prompt = _inline_files(req.query, req.file_list)
     return {"prompt": prompt, "context": retrieved["results"]}
 
 
+# background work overlapped with retrieval in the pipelined mode
+_pipeline_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="pipeline")
+
+
+def _generate_pipelined(
+    req: GeneratorRequest,
+    prompt_req: PromptRequest,
+    options: Dict[str, Any],
+    *,
+    history_str: str | None = None,
+    cancel: CancelToken | None = None,
+):
+    """Generate with warm‑up, history and rendering running alongside retrieval.
+
+    End‑to‑end latency approaches ``max(retrieval, model warm‑up)`` instead
+    of their sum.
+    """
+    warm_fut = _pipeline_pool.submit(get_client().warm, req.model)
+    history_fut = (
+        _pipeline_pool.submit(history_string, req.history or []) if history_str is None else None
+    )
+
+    rendered: Dict[int, Future] = {}
+    rendered_lock = threading.Lock()
+
+    def _render_new(store: Dict[str, Dict[str, Any]]) -> None:
+        # called as each modality's hits land – start rendering those chunks now
+        with rendered_lock:
+            for entry in store.values():
+                if id(entry) not in rendered:
+                    rendered[id(entry)] = _pipeline_pool.submit(render_chunk, entry)
+
+    start = time.perf_counter()
+    prompt_ctx = _build_prompt_and_context(prompt_req, on_merge=_render_new, cancel=cancel)
+    metrics.observe("pipeline.retrieval_seconds", time.perf_counter() - start)
+
+    context = prompt_ctx["context"]
+    rendered_context = "\n\n".join(
+        rendered[id(c)].result() if id(c) in rendered else render_chunk(c) for c in context
+    )
+
+    start = time.perf_counter()
+    if cancel is not None:
+        # a cold model can take a while to load – don't sit it out for a gone client
+        while not warm_fut.done() and not cancel.wait(0.1):
+            pass
+        cancel.raise_if_cancelled("warmup")
+    try:
+        warm_fut.result()
+    except Exception:  # generation will load the model itself
+        logger.warning("Model warm‑up for '%s' failed", req.model, exc_info=True)
+    metrics.observe("pipeline.warmup_wait_seconds", time.perf_counter() - start)
+
+    return generate(
+        model=req.model,
+        prompt=prompt_ctx["prompt"],
+        context=context,
+        history=req.history or [],
+        options=options,
+        history_str=history_fut.result() if history_fut is not None else history_str,
+        rendered_context=rendered_context,
+        cancel=cancel,
+    )
+
+
+async def _run_cancellable(request: Request, fn: Callable[..., Any], *args: Any) -> Any:
+    """Run ``fn(*args, cancel=token)`` in the threadpool under a fresh token.
+
+    The token is registered under the ``X-Request-ID`` header (else a new
+    id) and cancelled as soon as the client disconnects.
+    """
+    try:
+        token = cancellations.register(request.headers.get("x-request-id"))
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+    async def _watch() -> None:
+        while not token.cancelled:
+            if await request.is_disconnected():
+                metrics.incr("cancel.disconnects")
+                token.cancel("client disconnected")
+                return
+            await asyncio.sleep(CANCEL_POLL_SECONDS)
+
+    watcher = asyncio.create_task(_watch())
+    try:
+        return await run_in_threadpool(fn, *args, cancel=token)
+    finally:
+        watcher.cancel()
+        cancellations.unregister(token)
+
+
+def _cancelled(exc: CancelledRequestError) -> HTTPException:
+    # 499 "client closed request" – nobody may be listening any more
+    return HTTPException(status_code=499, detail=str(exc))
+
+
 # -----------------------------------------------------------------------------
 # /prompt/enhance – return prompt + context only
 # -----------------------------------------------------------------------------
 
 
-@router.post("/enhance")
-def enhance_prompt(req: PromptRequest):
+@router.post("/enhance", response_class=FastJSONResponse)
+async def enhance_prompt(
+    req: PromptRequest,
+    request: Request,
+    fields: str | None = Query(None, description="comma-separated context entry fields to return"),
+):
     """API wrapper around `_build_prompt_and_context`."""
+    return await _run_cancellable(request, _enhance, req, fields)
+
+
+def _enhance(req: PromptRequest, fields: str | None, *, cancel: CancelToken):
     try:
-        return _build_prompt_and_context(req)
+        payload = _build_prompt_and_context(req, cancel=cancel)
+        payload["context"] = project(payload["context"], parse_fields(fields))
+        payload["request_id"] = cancel.request_id
+        return FastJSONResponse(payload)
     except HTTPException:
         raise
+    except CancelledRequestError as exc:
+        raise _cancelled(exc) from exc
     except Exception as exc:  # pragma: no cover
         logger.exception("enhance_prompt failed")
         raise HTTPException(status_code=500, detail=str(exc)) from exc
@@ -106,37 +251,135 @@ def enhance_prompt(req: PromptRequest):
 
 
 @router.post("/generate")
-def generate_response(req: GeneratorRequest):
+async def generate_response(req: GeneratorRequest, request: Request):
     """Compose prompt/context then invoke Ollama for the final answer."""
+    return await _run_cancellable(request, _generate, req)
+
+
+def _generate(req: GeneratorRequest, *, cancel: CancelToken):
     try:
         api_opts: APIOptions = req.additional_options or APIOptions()
         retriever_opts = api_opts.retriever_options or RetrieverOptions()
         generator_opts = api_opts.generator_options or GeneratorOptions()
 
-        prompt_ctx = _build_prompt_and_context(
-            PromptRequest(
-                version_name=req.version_name,
-                query=req.query,
-                file_list=req.file_list,
-                retriever_options=retriever_opts,
-                generator_options=generator_opts,
-            )
+        prompt_req = PromptRequest(
+            version_name=req.version_name,
+            query=req.query,
+            file_list=req.file_list,
+            retriever_options=retriever_opts,
+            generator_options=generator_opts,
         )
+        session = _open_session(req) if req.session_id is not None else None
+        history_str = session.history_string() if session is not None else None
 
-        return generate(
-            model=req.model,
-            prompt=prompt_ctx["prompt"],
-            context=prompt_ctx["context"],
-            history=req.history or [],
-            options=generator_opts.to_dict(),
-        )
+        pipelined = api_opts.pipelined if api_opts.pipelined is not None else PIPELINED_GENERATION
+        if pipelined:
+            data = _generate_pipelined(
+                req, prompt_req, generator_opts.to_dict(), history_str=history_str, cancel=cancel
+            )
+        else:
+            prompt_ctx = _build_prompt_and_context(prompt_req, cancel=cancel)
+            data = generate(
+                model=req.model,
+                prompt=prompt_ctx["prompt"],
+                context=prompt_ctx["context"],
+                history=req.history or [],
+                options=generator_opts.to_dict(),
+                history_str=history_str,
+                cancel=cancel,
+            )
+
+        if session is not None:
+            get_sessions().append(session.session_id, req.query, data.get("response", ""))
+            data["session_id"] = session.session_id
+        data["request_id"] = cancel.request_id
+        return data
 
     except HTTPException:
         raise
+    except CancelledRequestError as exc:
+        raise _cancelled(exc) from exc
+    except GeneratorBusyError as exc:
+        raise HTTPException(
+            status_code=429,
+            detail=str(exc),
+            headers={"Retry-After": str(int(exc.retry_after))},
+        ) from exc
     except Exception as exc:  # pragma: no cover
         logger.exception("generate_response failed")
         raise HTTPException(status_code=500, detail=str(exc)) from exc
 
+
+def _open_session(req: GeneratorRequest) -> ChatSession:
+    """Session for *req*; an empty id mints one, an unknown id is seeded from ``history``."""
+    seed = [h.model_dump() for h in req.history or []]
+    try:
+        return get_sessions().open(req.session_id or None, seed=seed)
+    except InvalidSessionIdError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+
+# -----------------------------------------------------------------------------
+# /prompt/session – server-side chat history
+# -----------------------------------------------------------------------------
+
+
+@router.post("/session")
+def create_session():
+    """Start an empty session; pass its id as ``session_id`` to /prompt/generate."""
+    return {"session_id": get_sessions().open().session_id}
+
+
+@router.get("/session/{session_id}")
+def get_session(session_id: str):
+    try:
+        session = get_sessions().get(session_id)
+    except InvalidSessionIdError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    if session is None:
+        raise HTTPException(status_code=404, detail=f"Unknown or expired session '{session_id}'")
+    return session.to_dict()
+
+
+@router.delete("/session/{session_id}")
+def delete_session(session_id: str):
+    try:
+        deleted = get_sessions().delete(session_id)
+    except InvalidSessionIdError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    if not deleted:
+        raise HTTPException(status_code=404, detail=f"Unknown or expired session '{session_id}'")
+    return {"deleted": session_id}
+
+
+# -----------------------------------------------------------------------------
+# /prompt/cancel – explicit cancellation
+# -----------------------------------------------------------------------------
+
+
+@router.post("/cancel/{request_id}")
+def cancel_request(request_id: str):
+    """Cancel an in-flight *enhance* / *generate* started with this ``X-Request-ID``.
+
+    ``forwarded`` means another worker may own it; that worker stops it at
+    its next check.
+    """
+    try:
+        found = cancellations.cancel(request_id, "cancelled by request id")
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    if not found and cancellations.marker_dir is None:
+        raise HTTPException(status_code=404, detail=f"No request '{request_id}' in flight")
+    metrics.incr("cancel.explicit")
+    return {"request_id": request_id, "status": "cancelled" if found else "forwarded"}
+
+
+@router.get("/backends")
+def generator_backends():
+    """Health, load and warm models of every configured Ollama backend."""
+    return get_client().router.status()
+
+
 @router.post("/test")
 def test_generate(req: GeneratorRequest):
     print((req.model_dump_json()))
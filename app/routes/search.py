@@ -1,12 +1,19 @@
 import logging
-from functools import lru_cache
-from typing import Dict, Any
+import threading
+from typing import Any, Callable, Dict
 
-from fastapi import APIRouter, HTTPException
+import numpy as np
 
-from app.classes.schemas import SearchRequest
+from fastapi import APIRouter, HTTPException, Query
+
+from app.cache_tier import cache_key, get_cache
+from app.cancellation import CancelToken
+from app.changes import UnknownVersionError, get_change_index
+from app.classes.schemas import DiffRequest, SearchRequest
 from app.milvus.search_manager import SearchManager
-from config import MILVUS_URI
+from app.registry import registry
+from app.responses import FastJSONResponse, parse_fields, project
+from config import CHANGE_MIN_DISTANCE, MILVUS_URI, SEARCH_BACKEND
 
 
 # -----------------------------------------------------------------------------
@@ -14,11 +21,41 @@ from config import MILVUS_URI
 # -----------------------------------------------------------------------------
 
 
-@lru_cache(maxsize=1)
+_manager: SearchManager | None = None
+_manager_lock = threading.Lock()
+
+
 def _get_manager() -> SearchManager:
-    """Create (or reuse) a single SearchManager instance."""
-    logging.debug("Initialising SearchManager …")
-    return SearchManager("nextjs_docs", uri=MILVUS_URI)
+    """Create (or reuse) a single SearchManager instance.
+
+    Guarded by a lock because the startup warm‑up thread and the first
+    requests may race to build it.
+    """
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                logging.debug("Initialising SearchManager (%s backend) …", SEARCH_BACKEND)
+                if SEARCH_BACKEND == "embedded":
+                    from app.embedded.search_manager import EmbeddedSearchManager
+
+                    _manager = EmbeddedSearchManager("nextjs_docs")
+                else:
+                    _manager = SearchManager("nextjs_docs", uri=MILVUS_URI)
+    return _manager
+
+
+def invalidate_version(version: str) -> None:
+    """Forget resident data and cached results for *version* (after re‑ingest / delete)."""
+    if _manager is not None:
+        _manager.invalidate(version)
+    cache = get_cache()
+    if cache is not None:
+        cache.invalidate("search", tag=version)
+
+
+def residency_stats() -> Dict[str, Any]:
+    return _manager.residency.stats() if _manager is not None else {"resident": {}}
 
 
 router = APIRouter()
@@ -29,34 +66,129 @@ router = APIRouter()
 # -----------------------------------------------------------------------------
 
 
-@router.post("/search", response_model=Dict[str, Any])
-def search(req: SearchRequest):
+def run_search(
+    req: SearchRequest,
+    *,
+    on_merge: Callable[[Dict[str, Dict[str, Any]]], None] | None = None,
+    cancel: CancelToken | None = None,
+) -> Dict[str, Any]:
+    """Run *req* against the shared manager (no HTTP error mapping).
+
+    *cancel* aborts the search between stages (see :mod:`app.cancellation`).
+
+    Results are served from the persistent cache tier when the same request
+    ran before against the same ingest of the version (not in debug mode,
+    which reports the plan of an actual run).
+    """
+    cache = get_cache()
+    key = None
+    if cache is not None and cache.enabled("search") and not req.debug:
+        state = registry.state(req.version_name)
+        key = cache_key("search", [req.model_dump(), state.last_modified, state.rows])
+        hit = cache.get("search", key)
+        if hit is not None:
+            if on_merge is not None:
+                on_merge({r.get("entry_id", str(i)): r for i, r in enumerate(hit)})
+            return {"results": hit}
+
+    mgr = _get_manager()
+    plans: list = []
+    results = mgr.search(
+        text_query=req.text_query,
+        code_query=req.code_query,
+        version=req.version_name,
+        sparse_weight=req.sparse_weight,
+        dense_text_weight=req.dense_text_weight,
+        dense_code_weight=req.dense_code_weight,
+        bm25_weight=req.bm25_weight,
+        top_k=req.top_k,
+        filter_expr=req.filter_expr,
+        iterative_filter=req.iterative_filter,
+        # radius / range tuning
+        radius_sparse=req.radius_sparse,
+        range_sparse=req.range_sparse,
+        radius_dense_text=req.radius_dense_text,
+        range_dense_text=req.range_dense_text,
+        radius_dense_code=req.radius_dense_code,
+        range_dense_code=req.range_dense_code,
+        rerank=req.rerank,
+        rerank_candidates=req.rerank_candidates,
+        rerank_budget_ms=req.rerank_budget_ms,
+        on_merge=on_merge,
+        code_chunks=req.code_chunks,
+        modality_limits=req.modality_limits,
+        drop_ratio_search=req.drop_ratio_search,
+        on_plan=plans.append,
+        cancel=cancel,
+    )
+    if req.debug:
+        return {"results": results, "plan": plans[0].to_dict()}
+    # a rerank that fell back (model loading, budget spent) is not the answer to keep
+    if key is not None and plans[0].reranked is not False:
+        cache.set("search", key, results, tag=req.version_name)
+    return {"results": results}
+
+
+@router.post("/search", response_model=Dict[str, Any], response_class=FastJSONResponse)
+def search(
+    req: SearchRequest,
+    fields: str | None = Query(None, description="comma-separated entry fields to return, e.g. entry_id,title,combined_score"),
+):
     """Run a hybrid (sparse + dense) search and return the merged top‑k results."""
     try:
-        mgr = _get_manager()
-        print(req.top_k)
-        results = mgr.search(
-            text_query=req.text_query,
-            code_query=req.code_query,
-            version=req.version_name,
-            sparse_weight=req.sparse_weight,
-            dense_text_weight=req.dense_text_weight,
-            dense_code_weight=req.dense_code_weight,
-            top_k=req.top_k,
-            filter_expr=req.filter_expr,
-            # radius / range tuning
-            radius_sparse=req.radius_sparse,
-            range_sparse=req.range_sparse,
-            radius_dense_text=req.radius_dense_text,
-            range_dense_text=req.range_dense_text,
-            radius_dense_code=req.radius_dense_code,
-            range_dense_code=req.range_dense_code,
-        )
-        return {"results": results}
+        payload = run_search(req)
+        payload["results"] = project(payload["results"], parse_fields(fields))
+        return FastJSONResponse(payload)
 
     except ValueError as ve:
         # input validation errors propagated from manager
         raise HTTPException(status_code=400, detail=str(ve)) from ve
     except Exception as exc:
         logging.exception("Search failed")
-        raise HTTPException(status_code=500, detail="Internal server error") from exc
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Internal server error") from exc
+
+
+@router.post("/search/diff", response_model=Dict[str, Any], response_class=FastJSONResponse)
+def search_diff(
+    req: DiffRequest,
+    fields: str | None = Query(None, description="comma-separated change fields to return, e.g. status,title,to"),
+):
+    """Chunks added, removed or changed between two versions, from the change index."""
+    index = get_change_index()
+    if index is None:
+        raise HTTPException(status_code=404, detail="Change index disabled (CHANGE_INDEX_PATH is empty)")
+    for version in (req.from_version, req.to_version):
+        if not registry.is_supported(version):
+            raise HTTPException(status_code=404, detail=f"Unsupported version '{version}'")
+    if req.from_version == req.to_version:
+        raise HTTPException(status_code=400, detail="from_version and to_version must differ")
+    min_distance = CHANGE_MIN_DISTANCE if req.min_distance is None else req.min_distance
+    if req.top_k is not None and req.top_k < 1:
+        raise HTTPException(status_code=400, detail="top_k must be at least 1")
+
+    try:
+        query_vector = None
+        if req.text_query and req.text_query.strip():
+            # same call shape as the hybrid search, so the cached entry is shared
+            embeds = _get_manager().embedder.encode_queries([req.text_query], return_dense=True, return_sparse=True)
+            query_vector = np.asarray(embeds["dense_vecs"][0], dtype=np.float32)
+            query_vector /= np.linalg.norm(query_vector) or 1.0
+        payload = index.diff(
+            req.from_version,
+            req.to_version,
+            statuses=req.statuses,
+            min_distance=min_distance,
+            query_vector=query_vector,
+            top_k=req.top_k,
+            include_content=req.include_content,
+        )
+        payload["changes"] = project(payload["changes"], parse_fields(fields))
+        return FastJSONResponse(payload)
+
+    except UnknownVersionError as exc:
+        raise HTTPException(status_code=404, detail=str(exc)) from exc
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve)) from ve
+    except Exception as exc:
+        logging.exception("Diff failed")
+        raise HTTPException(status_code=500, detail="Internal server error") from exc
@@ -7,10 +7,14 @@ from pathlib import Path
 
 from fastapi import APIRouter, HTTPException
 
+from app.changes import get_change_index
 from app.downloader.kaggle_downloader import KaggleDocumentationDownloader
 from app.milvus.schema_manager import MilvusSchemaManager
-from app.classes.schemas import RetrieveRequest
-from config import DOWNLOADS_DIR, MILVUS_URI
+from app.classes.schemas import RetrieveRequest, SnapshotImportRequest
+from app.registry import registry
+from app.routes.search import invalidate_version, residency_stats
+from app.snapshot import Snapshot, SnapshotError, import_snapshot
+from config import DOWNLOADS_DIR, MILVUS_URI, SEARCH_BACKEND, SNAPSHOT_DIR, SPARSE_DROP_RATIO_BUILD
 
 router = APIRouter(prefix="/version", tags=["version"])
 
@@ -34,12 +38,27 @@ def _validate_index_params(m_val: int, ef_val: int, *, name: str) -> None:  # no
         raise HTTPException(status_code=400, detail=f"Invalid ef_{name}: must be at least 1")
 
 
+def _drop_ratio_build(req: RetrieveRequest) -> float:
+    """Requested drop_ratio_build, else SPARSE_DROP_RATIO_BUILD; 400 outside [0, 1)."""
+    value = SPARSE_DROP_RATIO_BUILD if req.drop_ratio_build is None else req.drop_ratio_build
+    if not 0 <= value < 1:
+        raise HTTPException(status_code=400, detail="Invalid drop_ratio_build: must be in [0, 1)")
+    return value
+
+
 @lru_cache(maxsize=1)
 def _manager() -> MilvusSchemaManager:
+    if SEARCH_BACKEND == "embedded":
+        from app.embedded.store import EmbeddedSchemaManager
+
+        return EmbeddedSchemaManager("nextjs_docs")
     return MilvusSchemaManager("nextjs_docs", uri=MILVUS_URI)
 
 
-_downloader = KaggleDocumentationDownloader()
+@lru_cache(maxsize=1)
+def _downloader() -> KaggleDocumentationDownloader:
+    return KaggleDocumentationDownloader()
+
 
 # -----------------------------------------------------------------------------
 # Routes
@@ -59,16 +78,20 @@ def retrieve_data(req: RetrieveRequest):
     ef_code = req.ef_code or 200
     _validate_index_params(m_text, ef_text, name="m_text")
     _validate_index_params(m_code, ef_code, name="m_code")
+    drop_ratio_build = _drop_ratio_build(req)
 
     try:
-        csv_downloaded = _downloader.load_and_save_version(version, destination=CSV_DIR)
-        _manager().build_from_csv(
+        csv_downloaded = _downloader().load_and_save_version(version, destination=CSV_DIR)
+        rows = _manager().build_from_csv(
             csv_downloaded,
             m_text=m_text,
             ef_text=ef_text,
             m_code=m_code,
             ef_code=ef_code,
+            drop_ratio_build=drop_ratio_build,
         )
+        invalidate_version(version)
+        registry.mark_ingested(version, csv_downloaded, rows=rows)
         return {"message": "File retrieved & ingested", "file_path": str(csv_downloaded)}
     except Exception as exc:  # pragma: no cover – generic failure
         logging.exception("retrieve_data failed")
@@ -79,12 +102,14 @@ def retrieve_data(req: RetrieveRequest):
 def delete_version(req: RetrieveRequest):
     version = req.version_name
     path = _csv_path(version)
-    if not path.exists():
+    if not path.exists() and not registry.state(version).imported:
         return {"message": f"Version {version} not downloaded"}
 
     try:
         _manager().delete_version(version)
-        path.unlink()
+        invalidate_version(version)
+        path.unlink(missing_ok=True)
+        registry.mark_deleted(version)
         logging.info("Deleted CSV %s", path)
         return {"message": f"Version {version} deleted"}
     except Exception as exc:
@@ -95,7 +120,6 @@ def delete_version(req: RetrieveRequest):
 @router.post("/repair")
 def repair_version(req: RetrieveRequest):
     version = req.version_name
-    path = _csv_path(version)
 
     m_text = req.m_text or 16
     ef_text = req.ef_text or 200
@@ -103,21 +127,82 @@ def repair_version(req: RetrieveRequest):
     ef_code = req.ef_code or 200
     _validate_index_params(m_text, ef_text, name="m_text")
     _validate_index_params(m_code, ef_code, name="m_code")
+    drop_ratio_build = _drop_ratio_build(req)
 
-    # delete existing
-    if path.exists():
-        try:
-            _manager().delete_version(version)
-            path.unlink()
-            logging.info("Removed stale CSV %s", path)
-        except Exception as exc:
-            raise HTTPException(status_code=500, detail=f"Error cleaning old data: {exc}") from exc
-
-    # fresh download + ingest
+    # fresh download + shadow build; the old data keeps serving searches
+    # until build_from_csv swaps the rebuilt version in
     try:
-        new_path = _downloader.load_and_save_version(version, destination=CSV_DIR)
-        _manager().build_from_csv(new_path, m_text=m_text, ef_text=ef_text, m_code=m_code, ef_code=ef_code)
+        # re-hashes the cached copy; an intact, unchanged file is not re-downloaded
+        new_path = _downloader().load_and_save_version(version, destination=CSV_DIR, verify=True)
+        rows = _manager().build_from_csv(
+            new_path,
+            m_text=m_text,
+            ef_text=ef_text,
+            m_code=m_code,
+            ef_code=ef_code,
+            drop_ratio_build=drop_ratio_build,
+        )
+        invalidate_version(version)
+        registry.mark_ingested(version, new_path, rows=rows)
         return {"message": f"Version {version} repaired", "file_path": str(new_path)}
     except Exception as exc:
         logging.exception("Repair failed")
-        raise HTTPException(status_code=500, detail=str(exc)) from exc
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(exc)) from exc
+
+
+@router.get("/residency")
+def version_residency():
+    """Which versions are loaded, their size, the budget and load/evict counters."""
+    return residency_stats()
+
+
+@router.get("/changes")
+def version_changes():
+    """Versions in the change index and the stored pair diffs (see /search/diff)."""
+    index = get_change_index()
+    return index.stats() if index is not None else {"versions": {}, "pairs": []}
+
+
+@router.post("/import")
+def import_version(req: SnapshotImportRequest):
+    """Provision a version from a prebuilt snapshot instead of the CSV pipeline."""
+    version = req.version_name
+    if not registry.is_supported(version):
+        raise HTTPException(status_code=404, detail=f"Unsupported version '{version}'")
+
+    root = SNAPSHOT_DIR.resolve()
+    path = (root / (req.snapshot_path or version)).resolve()
+    if not path.is_relative_to(root):
+        raise HTTPException(status_code=400, detail="snapshot_path must be inside SNAPSHOT_DIR")
+
+    m_text = req.m_text or 16
+    ef_text = req.ef_text or 200
+    m_code = req.m_code or 16
+    ef_code = req.ef_code or 200
+    _validate_index_params(m_text, ef_text, name="m_text")
+    _validate_index_params(m_code, ef_code, name="m_code")
+    drop_ratio_build = _drop_ratio_build(req)
+
+    try:
+        snap = Snapshot(path)
+        if snap.version != version:
+            raise SnapshotError(f"Snapshot at {path} does not hold version '{version}'")
+        result = import_snapshot(
+            path,
+            _manager(),
+            verify=req.verify,
+            m_text=m_text,
+            ef_text=ef_text,
+            m_code=m_code,
+            ef_code=ef_code,
+            drop_ratio_build=drop_ratio_build,
+        )
+    except SnapshotError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    except Exception as exc:
+        logging.exception("Snapshot import failed")
+        raise HTTPException(status_code=500, detail=str(exc)) from exc
+
+    invalidate_version(version)
+    registry.mark_imported(version, rows=result["rows"], file_size=snap.nbytes, last_modified=snap.created_at)
+    return {"message": f"Version {version} imported", **result}
@@ -0,0 +1,109 @@
+"""Production entry‑point: uvicorn workers + one shared embedding process.
+
+    python -m app.serve --workers 4
+
+With more than one worker, BGE‑M3 is loaded once in a dedicated process
+(:mod:`app.embedding.server`) that gets all CPU cores for torch; the API
+workers talk to it over a local socket and never import torch themselves.
+A single worker keeps the model in‑process.
+
+Several workers also need ``SESSION_DIR``: in-memory chat sessions are per
+worker, so a follow-up request on another worker would start over.
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import multiprocessing as mp
+import os
+import secrets
+import tempfile
+import time
+
+import uvicorn
+
+from app.embedding.server import check_authkey, parse_address
+from config import EMBEDDER_ADDRESS, EMBEDDER_AUTHKEY, SESSION_DIR, WORKERS
+
+log = logging.getLogger("raggin.serve")
+
+
+def _run_embedder(address: str, threads: int, authkey: bytes) -> None:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(name)s - %(message)s")
+    from app.embedding.server import EmbeddingServer
+
+    EmbeddingServer(address, authkey=authkey, num_threads=threads).serve_forever()
+
+
+def _wait_for_embedder(address: str, authkey: bytes, proc: mp.Process, timeout: float) -> None:
+    from app.embedding.client import RemoteEmbedder
+
+    deadline = time.monotonic() + timeout
+    client = RemoteEmbedder(address, authkey=authkey, connect_timeout=1.0)
+    while time.monotonic() < deadline:
+        if not proc.is_alive():
+            raise RuntimeError("Embedding server exited during startup")
+        try:
+            if client.ping():
+                return
+        except OSError:
+            time.sleep(0.5)
+    raise TimeoutError(f"Embedding server not reachable at {address} after {timeout:.0f}s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument(
+        "--shared-embedder",
+        action=argparse.BooleanOptionalAction,
+        default=None,
+        help="run BGE‑M3 in one shared process (default: on when --workers > 1)",
+    )
+    parser.add_argument("--embedder-timeout", type=float, default=600.0)
+    args = parser.parse_args()
+    if args.workers > 1 and not SESSION_DIR:
+        parser.error("--workers > 1 needs SESSION_DIR so chat sessions are shared by all workers")
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(name)s - %(message)s")
+
+    shared = args.shared_embedder if args.shared_embedder is not None else args.workers > 1
+    embedder: mp.Process | None = None
+    if shared:
+        address = EMBEDDER_ADDRESS or os.path.join(tempfile.gettempdir(), "raggin-embedder.sock")
+        # a fresh key per launch unless one is configured (required for TCP)
+        authkey = EMBEDDER_AUTHKEY or secrets.token_hex(32).encode()
+        try:
+            check_authkey(parse_address(address), authkey)
+        except ValueError as exc:
+            parser.error(str(exc))
+        embedder = mp.Process(
+            target=_run_embedder,
+            args=(address, os.cpu_count() or 1, authkey),
+            name="raggin-embedder",
+            daemon=True,
+        )
+        embedder.start()
+        _wait_for_embedder(address, authkey, embedder, args.embedder_timeout)
+        log.info("Shared embedding server ready @ %s", address)
+        # uvicorn's workers inherit the environment and read both via config
+        os.environ["EMBEDDER_ADDRESS"] = address
+        os.environ["EMBEDDER_AUTHKEY"] = authkey.decode()
+        # API workers only do I/O + NumPy blending; keep torch from spawning pools
+        os.environ["TORCH_NUM_THREADS"] = "1"
+    else:
+        os.environ.setdefault("TORCH_NUM_THREADS", str(max(1, (os.cpu_count() or 1) // max(1, args.workers))))
+
+    try:
+        uvicorn.run("app.main:app", host=args.host, port=args.port, workers=args.workers)
+    finally:
+        if embedder is not None and embedder.is_alive():
+            embedder.terminate()
+            embedder.join(timeout=10)
+
+
+if __name__ == "__main__":
+    main()
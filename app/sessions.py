@@ -0,0 +1,419 @@
+"""Server-side chat sessions for ``/prompt/generate``.
+
+Without a session the client uploads the whole conversation as
+``history`` on every turn. A request with a ``session_id`` sends only the
+new query. The server appends each answered turn to the session and keeps
+the serialised ``<chat history>`` block up to date incrementally.
+
+* **bounded memory** – at most ``SESSION_MAX_SESSIONS`` sessions in memory,
+  least recently used evicted first. Once a session's turns exceed
+  ``SESSION_COMPACT_CHARS``, the oldest turns are folded into a rolling
+  summary capped at ``SESSION_SUMMARY_CHARS``.
+* **TTL** – sessions idle for ``SESSION_TTL_SECONDS`` are dropped, from memory
+  and disk.
+* **persistence** – with ``SESSION_DIR`` set, each session is also a JSON file
+  written atomically under its own file lock. Sessions then survive restarts
+  and are shared by all workers.
+
+The summary is extractive by default: each old turn is cut to its first
+sentence or so. With ``SESSION_SUMMARY_MODEL`` set, an Ollama model rewrites
+the summary instead, falling back to the extractive one on error. The
+summariser runs outside all locks, on a copy of the turns. Its result is
+applied only if the session was not compacted by someone else meanwhile.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import re
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from filelock import FileLock
+
+from app.metrics import metrics
+from config import (
+    SESSION_COMPACT_CHARS,
+    SESSION_DIR,
+    SESSION_KEEP_TURNS,
+    SESSION_MAX_SESSIONS,
+    SESSION_SUMMARY_CHARS,
+    SESSION_SUMMARY_MODEL,
+    SESSION_TTL_SECONDS,
+)
+
+__all__ = ["ChatSession", "SessionStore", "InvalidSessionIdError", "get_store"]
+
+logger = logging.getLogger(__name__)
+
+_SESSION_ID = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+
+class InvalidSessionIdError(ValueError):
+    """Session ids double as file names – only ``[A-Za-z0-9_-]{8,64}``."""
+
+
+def _render_turn(query: str, response: str) -> str:
+    return f"<query>{query}</query> <response>{response}</response>"
+
+
+def _clip(text: str, limit: int) -> str:
+    """First sentence of *text*, at most *limit* characters."""
+    text = " ".join(text.split())
+    first = _SENTENCE_END.split(text, maxsplit=1)[0]
+    return first if len(first) <= limit else first[: limit - 1] + "…"
+
+
+def extractive_summary(summary: str, turns: List[Dict[str, str]], *, limit: int) -> str:
+    """Append one clipped line per turn to *summary*, dropping the oldest lines beyond *limit*."""
+    lines = [ln for ln in summary.splitlines() if ln]
+    lines += [f"- Q: {_clip(t['query'], 160)} A: {_clip(t['response'], 240)}" for t in turns]
+    while lines and sum(len(ln) + 1 for ln in lines) > limit:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+@dataclass
+class ChatSession:
+    session_id: str
+    created: float = field(default_factory=time.time)
+    updated: float = field(default_factory=time.time)
+    summary: str = ""
+    turns: List[Dict[str, str]] = field(default_factory=list)
+    # rendered turns, kept in step with *turns* so nothing is re‑serialised
+    _rendered: List[str] = field(default_factory=list, repr=False)
+    _chars: int = field(default=0, repr=False)
+
+    def __post_init__(self) -> None:
+        if not self._rendered and self.turns:
+            self._rendered = [_render_turn(t["query"], t["response"]) for t in self.turns]
+            self._chars = sum(map(len, self._rendered))
+
+    def append(self, query: str, response: str) -> None:
+        self.turns.append({"query": query, "response": response})
+        rendered = _render_turn(query, response)
+        self._rendered.append(rendered)
+        self._chars += len(rendered)
+        self.updated = time.time()
+
+    @property
+    def chars(self) -> int:
+        return self._chars + len(self.summary)
+
+    def history_string(self) -> str:
+        """Same block as :func:`utils.history_string`, led by the summary."""
+        items = ([f"<summary>{self.summary}</summary>"] if self.summary else []) + self._rendered
+        return "<chat history>[\\n" + "\\n".join(items) + "]</chat history>"
+
+    def pop_oldest(self, keep: int) -> List[Dict[str, str]]:
+        """Remove and return all but the newest *keep* turns."""
+        cut = max(len(self.turns) - keep, 0)
+        old, self.turns, self._rendered = self.turns[:cut], self.turns[cut:], self._rendered[cut:]
+        self._chars = sum(map(len, self._rendered))
+        return old
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {k: v for k, v in asdict(self).items() if not k.startswith("_")}
+
+
+class SessionStore:
+    """Thread‑safe LRU of :class:`ChatSession` with TTL and optional disk copy."""
+
+    def __init__(
+        self,
+        *,
+        directory: Path | str | None = SESSION_DIR,
+        max_sessions: int = SESSION_MAX_SESSIONS,
+        ttl: float = SESSION_TTL_SECONDS,
+        compact_chars: int = SESSION_COMPACT_CHARS,
+        keep_turns: int = SESSION_KEEP_TURNS,
+        summary_chars: int = SESSION_SUMMARY_CHARS,
+        summarizer: Callable[[str, List[Dict[str, str]]], str] | None = None,
+    ) -> None:
+        self.directory = Path(directory) if directory else None
+        if self.directory is not None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.compact_chars = compact_chars
+        self.keep_turns = keep_turns
+        self.summary_chars = summary_chars
+        self.summarizer = summarizer or self._default_summarizer
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+        self._loaded_mtime: Dict[str, float] = {}
+        self._lock = threading.RLock()
+        self._last_sweep = time.monotonic()
+        # sessions whose summary is being computed in this process
+        self._compacting: set[str] = set()
+
+    # ------------------------------------------------------------------
+    # persistence
+    # ------------------------------------------------------------------
+
+    def _path(self, session_id: str) -> Path:
+        assert self.directory is not None
+        return self.directory / f"{session_id}.json"
+
+    def _lockfile(self, session_id: str) -> FileLock:
+        assert self.directory is not None
+        return FileLock(str(self.directory / f".{session_id}.lock"))
+
+    @contextmanager
+    def _locked(self, session_id: str) -> Iterator[None]:
+        """The store lock, plus the session's file lock when persisted."""
+        with self._lock:
+            if self.directory is None:
+                yield
+                return
+            with self._lockfile(session_id):
+                yield
+
+    def _read(self, session_id: str) -> Optional[ChatSession]:
+        path = self._path(session_id)
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+            self._loaded_mtime[session_id] = path.stat().st_mtime
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            logger.warning("Unreadable session file %s – ignored", path, exc_info=True)
+            return None
+        return ChatSession(**data)
+
+    def _write(self, session: ChatSession) -> None:
+        path = self._path(session.session_id)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(session.to_dict(), ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, path)
+        self._loaded_mtime[session.session_id] = path.stat().st_mtime
+
+    def _unlink(self, session_id: str) -> None:
+        self._loaded_mtime.pop(session_id, None)
+        self._path(session_id).unlink(missing_ok=True)
+
+    # ------------------------------------------------------------------
+    # lookup / eviction
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def new_id() -> str:
+        return secrets.token_urlsafe(16)
+
+    @staticmethod
+    def validate_id(session_id: str) -> str:
+        if not _SESSION_ID.match(session_id):
+            raise InvalidSessionIdError(f"Invalid session id {session_id!r}")
+        return session_id
+
+    def _expired(self, session: ChatSession, now: float) -> bool:
+        return self.ttl > 0 and now - session.updated > self.ttl
+
+    def _lookup(self, session_id: str) -> Optional[ChatSession]:
+        """In-memory copy, refreshed from disk when another worker wrote it since."""
+        session = self._sessions.get(session_id)
+        if self.directory is not None:
+            try:
+                mtime = self._path(session_id).stat().st_mtime
+            except FileNotFoundError:  # deleted or expired by another worker
+                self._sessions.pop(session_id, None)
+                return None
+            if session is None or mtime > self._loaded_mtime.get(session_id, 0.0):
+                session = self._read(session_id) or session
+        if session is None:
+            return None
+        if self._expired(session, time.time()):
+            self._drop(session_id)
+            metrics.incr("session.expired")
+            return None
+        self._sessions[session_id] = session
+        self._sessions.move_to_end(session_id)
+        self._evict()
+        return session
+
+    def _drop(self, session_id: str) -> None:
+        self._sessions.pop(session_id, None)
+        if self.directory is not None:
+            self._unlink(session_id)
+
+    def _evict(self) -> None:
+        # disk copies outlive the memory budget; only TTL removes them
+        while self.max_sessions > 0 and len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+            metrics.incr("session.evicted")
+
+    def sweep(self) -> int:
+        """Drop every expired session (memory and disk); returns how many."""
+        now = time.time()
+        dropped = 0
+        with self._lock:
+            for sid in [sid for sid, s in self._sessions.items() if self._expired(s, now)]:
+                self._drop(sid)
+                dropped += 1
+            if self.directory is not None and self.ttl > 0:
+                for path in self.directory.glob("*.json"):
+                    try:
+                        if now - path.stat().st_mtime > self.ttl:
+                            self._unlink(path.stem)
+                            dropped += 1
+                    except FileNotFoundError:
+                        pass
+                # lock files of sessions gone for a whole TTL are not in use any more
+                for path in self.directory.glob(".*.lock"):
+                    try:
+                        if not self._path(path.name[1:-5]).exists() and now - path.stat().st_mtime > self.ttl:
+                            path.unlink()
+                    except FileNotFoundError:
+                        pass
+        if dropped:
+            metrics.incr("session.expired", dropped)
+        return dropped
+
+    def _maybe_sweep(self) -> None:
+        # piggy‑backs on traffic instead of a timer thread
+        if self.ttl > 0 and time.monotonic() - self._last_sweep > min(self.ttl, 600.0) / 4:
+            self._last_sweep = time.monotonic()
+            self.sweep()
+
+    # ------------------------------------------------------------------
+    # public API
+    # ------------------------------------------------------------------
+
+    def get(self, session_id: str) -> Optional[ChatSession]:
+        self.validate_id(session_id)
+        with self._lock:
+            return self._lookup(session_id)
+
+    def open(self, session_id: str | None = None, *, seed: List[Dict[str, str]] | None = None) -> ChatSession:
+        """Existing session *session_id*, else a new one seeded with *seed* turns."""
+        session_id = self.validate_id(session_id) if session_id else self.new_id()
+        self._maybe_sweep()
+        with self._lock:
+            session = self._lookup(session_id)
+            if session is not None:
+                return session
+            session = ChatSession(session_id)
+            for turn in seed or []:
+                session.append(turn["query"], turn["response"])
+            self._sessions[session_id] = session
+            self._evict()
+            if self.directory is not None:
+                with self._lockfile(session_id):
+                    self._write(session)
+            metrics.incr("session.created")
+            plan = self._compaction_plan(session)
+        return self._compact(session_id, plan) or session if plan else session
+
+    def append(self, session_id: str, query: str, response: str) -> ChatSession:
+        """Record one answered turn; compacts the session past the threshold."""
+        self.validate_id(session_id)
+        # read‑modify‑write under the file lock so workers do not lose turns
+        with self._locked(session_id):
+            session = self._lookup(session_id) or ChatSession(session_id)
+            session.append(query, response)
+            self._sessions[session_id] = session
+            self._evict()
+            if self.directory is not None:
+                self._write(session)
+            plan = self._compaction_plan(session)
+        return self._compact(session_id, plan) or session if plan else session
+
+    def delete(self, session_id: str) -> bool:
+        self.validate_id(session_id)
+        with self._lock:
+            existed = session_id in self._sessions or (
+                self.directory is not None and self._path(session_id).exists()
+            )
+            self._drop(session_id)
+            return existed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "in_memory": len(self._sessions),
+                "chars": sum(s.chars for s in self._sessions.values()),
+                "persisted": len(list(self.directory.glob("*.json"))) if self.directory is not None else None,
+            }
+
+    # ------------------------------------------------------------------
+    # compaction
+    # ------------------------------------------------------------------
+
+    def _compaction_plan(self, session: ChatSession) -> Optional[Tuple[str, List[Dict[str, str]]]]:
+        """``(summary, turns to fold)`` copied under the lock, or None if under the threshold."""
+        if session.chars <= self.compact_chars or len(session.turns) <= self.keep_turns:
+            return None
+        cut = len(session.turns) - self.keep_turns
+        return session.summary, [dict(t) for t in session.turns[:cut]]
+
+    def _compact(self, session_id: str, plan: Tuple[str, List[Dict[str, str]]]) -> Optional[ChatSession]:
+        """Summarise *plan* without holding a lock, then apply it; the compacted session or None."""
+        summary, old = plan
+        with self._lock:
+            if session_id in self._compacting:
+                return None  # another thread of this process is on it
+            self._compacting.add(session_id)
+        try:
+            new_summary = self.summarizer(summary, old)
+            with self._locked(session_id):
+                session = self._lookup(session_id)
+                # compacted (or deleted) elsewhere meanwhile – drop this result
+                if session is None or session.summary != summary or session.turns[: len(old)] != old:
+                    metrics.incr("session.compaction_conflicts")
+                    return None
+                before = session.chars
+                session.pop_oldest(len(session.turns) - len(old))
+                session.summary = new_summary
+                if self.directory is not None:
+                    self._write(session)
+        finally:
+            with self._lock:
+                self._compacting.discard(session_id)
+        metrics.incr("session.compactions")
+        logger.debug("Session %s compacted %d turns: %d → %d chars", session_id, len(old), before, session.chars)
+        return session
+
+    def _default_summarizer(self, summary: str, turns: List[Dict[str, str]]) -> str:
+        if SESSION_SUMMARY_MODEL:
+            try:
+                return self._llm_summary(summary, turns)
+            except Exception:
+                logger.warning("LLM session summary failed – using the extractive one", exc_info=True)
+        return extractive_summary(summary, turns, limit=self.summary_chars)
+
+    def _llm_summary(self, summary: str, turns: List[Dict[str, str]]) -> str:
+        from app.generator.client import get_client
+
+        transcript = "\n".join(_render_turn(t["query"], t["response"]) for t in turns)
+        prompt = (
+            "Update the running summary of a conversation about Next.js with the new turns. "
+            f"Keep the facts, APIs and code decisions; at most {self.summary_chars} characters.\n\n"
+            f"Summary so far:\n{summary or '(empty)'}\n\nNew turns:\n{transcript}\n\nUpdated summary:"
+        )
+        data = get_client().generate({"model": SESSION_SUMMARY_MODEL, "prompt": prompt, "stream": False})
+        text = (data.get("response") or "").strip()
+        if not text:
+            raise ValueError("empty summary")
+        return text[: self.summary_chars]
+
+
+_store: SessionStore | None = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> SessionStore:
+    """Process-wide :class:`SessionStore`."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = SessionStore()
+    return _store
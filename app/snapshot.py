@@ -0,0 +1,347 @@
+"""Prebuilt per-version snapshots for provisioning without the CSV pipeline.
+
+A snapshot directory ``<SNAPSHOT_DIR>/<version>`` holds::
+
+    manifest.json               version, rows, dim, per-file sha256, export timings
+    entities.jsonl              entry_id / title / metadata / version / tag / text / code
+    dense_text_content.npy      float32 (n, dim)
+    dense_code_snippet.npy      float32 (n, dim)
+    sparse_{indptr,indices,values}.npy
+                                ``sparse_title`` as CSR arrays
+    bulk/part-00000.json …      Milvus row-based bulk-insert files ({"rows": [...]})
+
+Importing skips the CSV parse (``eval`` of sparse strings, ``json.loads`` of
+1024-float vectors per row), which dominates the CSV path. Against Milvus
+the ``bulk/`` files are uploaded to its bucket and loaded server-side when
+``MINIO_ENDPOINT`` is set; otherwise entities are inserted in batches.
+
+CLI::
+
+    python -m app.snapshot export downloads/v15.0.0.csv
+    python -m app.snapshot import v15.0.0
+    python -m app.snapshot bench downloads/v15.0.0.csv      # CSV vs snapshot timings
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List
+
+import numpy as np
+import pandas as pd
+
+from app.changes import ChunkRecorder
+from app.downloader.cache import sha256_file
+from app.milvus.schema_manager import MilvusSchemaManager, lexical_text
+from config import (
+    DENSE_REDUCED_DIM,
+    DENSE_VECTOR_DIM,
+    MINIO_ACCESS_KEY,
+    MINIO_BUCKET,
+    MINIO_ENDPOINT,
+    MINIO_SECRET_KEY,
+    MINIO_SECURE,
+    SNAPSHOT_BULK_ROWS,
+    SNAPSHOT_DIR,
+)
+
+__all__ = ["Snapshot", "export_snapshot", "import_snapshot", "SnapshotError"]
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+DENSE_FIELDS = ("dense_text_content", "dense_code_snippet")
+TEXT_FIELDS = ("entry_id", "title", "metadata", "version", "tag", "text_content", "code_content")
+
+
+class SnapshotError(RuntimeError):
+    """Raised for a missing, incompatible or corrupt snapshot."""
+
+
+# -----------------------------------------------------------------------------
+# Export
+# -----------------------------------------------------------------------------
+
+def _csv_entities(csv_path: str | Path) -> List[Dict[str, Any]]:
+    df = pd.read_csv(csv_path)
+    return [MilvusSchemaManager._row_to_entity(row) for _, row in df.iterrows()]
+
+
+def _bulk_row(ent: Dict[str, Any]) -> Dict[str, Any]:
+    row = {k: ent[k] for k in TEXT_FIELDS}
+    row["lexical_text"] = lexical_text(ent["text_content"], ent["code_content"])
+    for fld in DENSE_FIELDS:
+        row[fld] = [float(x) for x in ent[fld]]
+    sparse = ent["sparse_title"]
+    row["sparse_title"] = {"indices": [int(i) for i in sparse], "values": [float(v) for v in sparse.values()]}
+    return row
+
+
+def export_snapshot(
+    csv_path: str | Path,
+    out_dir: str | Path = SNAPSHOT_DIR,
+    *,
+    bulk_rows: int = SNAPSHOT_BULK_ROWS,
+) -> Dict[str, Any]:
+    """Write the snapshot of the version in *csv_path*; returns its manifest."""
+    csv_path = Path(csv_path)
+    version = csv_path.stem
+
+    start = time.perf_counter()
+    entities = _csv_entities(csv_path)
+    csv_parse_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    dest = out_dir / version
+    # written next to dest and renamed into place, so a snapshot is never half‑present
+    work = Path(tempfile.mkdtemp(prefix=f".{version}.", dir=out_dir))
+    try:
+        with open(work / "entities.jsonl", "w", encoding="utf-8") as fh:
+            for ent in entities:
+                fh.write(json.dumps({k: ent[k] for k in TEXT_FIELDS}, ensure_ascii=False) + "\n")
+
+        for fld in DENSE_FIELDS:
+            mat = np.asarray([ent[fld] for ent in entities], dtype=np.float32).reshape(len(entities), DENSE_VECTOR_DIM)
+            np.save(work / f"{fld}.npy", mat)
+
+        indptr = np.zeros(len(entities) + 1, dtype=np.int64)
+        indices: List[int] = []
+        values: List[float] = []
+        for i, ent in enumerate(entities):
+            indices.extend(int(t) for t in ent["sparse_title"])
+            values.extend(float(w) for w in ent["sparse_title"].values())
+            indptr[i + 1] = len(indices)
+        np.save(work / "sparse_indptr.npy", indptr)
+        np.save(work / "sparse_indices.npy", np.asarray(indices, dtype=np.int32))
+        np.save(work / "sparse_values.npy", np.asarray(values, dtype=np.float32))
+
+        (work / "bulk").mkdir()
+        bulk_files = []
+        for part, lo in enumerate(range(0, len(entities), max(1, bulk_rows))):
+            name = f"bulk/part-{part:05d}.json"
+            with open(work / name, "w", encoding="utf-8") as fh:
+                json.dump({"rows": [_bulk_row(e) for e in entities[lo : lo + bulk_rows]]}, fh, ensure_ascii=False)
+            bulk_files.append(name)
+
+        files = sorted(str(p.relative_to(work)) for p in work.rglob("*") if p.is_file())
+        manifest = {
+            "format": FORMAT_VERSION,
+            "version": version,
+            "rows": len(entities),
+            "dim": DENSE_VECTOR_DIM,
+            "created_at": time.time(),
+            "source_csv_sha256": sha256_file(csv_path),
+            "bulk_files": bulk_files,
+            "files": {name: sha256_file(work / name) for name in files},
+            "timings": {
+                "csv_parse_seconds": round(csv_parse_seconds, 3),
+                "export_seconds": round(time.perf_counter() - start, 3),
+            },
+        }
+        (work / "manifest.json").write_text(json.dumps(manifest, indent=1), encoding="utf-8")
+
+        if dest.exists():
+            shutil.rmtree(dest)
+        os.replace(work, dest)
+    except BaseException:
+        shutil.rmtree(work, ignore_errors=True)
+        raise
+    logger.info("Snapshot of %s written → %s (%d rows)", version, dest, len(entities))
+    return manifest
+
+
+# -----------------------------------------------------------------------------
+# Reading
+# -----------------------------------------------------------------------------
+
+class Snapshot:
+    """Read-only view of one snapshot directory."""
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        try:
+            self.manifest: Dict[str, Any] = json.loads((self.path / "manifest.json").read_text(encoding="utf-8"))
+        except (OSError, ValueError) as exc:
+            raise SnapshotError(f"No readable snapshot at {self.path}: {exc}") from exc
+        if self.manifest.get("format") != FORMAT_VERSION:
+            raise SnapshotError(f"Unsupported snapshot format {self.manifest.get('format')!r}")
+        if self.manifest.get("dim") != DENSE_VECTOR_DIM:
+            raise SnapshotError(f"Snapshot dim {self.manifest.get('dim')} != DENSE_VECTOR_DIM {DENSE_VECTOR_DIM}")
+
+    @property
+    def version(self) -> str:
+        return self.manifest["version"]
+
+    @property
+    def rows(self) -> int:
+        return self.manifest["rows"]
+
+    @property
+    def nbytes(self) -> int:
+        """Total size of the files listed in the manifest."""
+        return sum((self.path / name).stat().st_size for name in self.manifest["files"])
+
+    @property
+    def created_at(self) -> float:
+        return float(self.manifest["created_at"])
+
+    def verify(self) -> None:
+        for name, digest in self.manifest["files"].items():
+            if sha256_file(self.path / name) != digest:
+                raise SnapshotError(f"Checksum mismatch for {self.path / name}")
+
+    def entities(self) -> Iterator[Dict[str, Any]]:
+        """``_row_to_entity``-shaped dicts; vectors are views into mapped arrays."""
+        dense = {fld: np.load(self.path / f"{fld}.npy", mmap_mode="r") for fld in DENSE_FIELDS}
+        indptr = np.load(self.path / "sparse_indptr.npy")
+        indices = np.load(self.path / "sparse_indices.npy")
+        values = np.load(self.path / "sparse_values.npy")
+        with open(self.path / "entities.jsonl", "r", encoding="utf-8") as fh:
+            for i, line in enumerate(fh):
+                ent = json.loads(line)
+                lo, hi = indptr[i], indptr[i + 1]
+                ent["sparse_title"] = dict(zip(indices[lo:hi].tolist(), values[lo:hi].tolist()))
+                for fld in DENSE_FIELDS:
+                    ent[fld] = dense[fld][i]
+                yield ent
+
+
+# -----------------------------------------------------------------------------
+# Import
+# -----------------------------------------------------------------------------
+
+def _upload_bulk_files(snap: Snapshot) -> List[str]:
+    """Copy ``bulk/`` into the Milvus bucket; returns object names for bulk insert."""
+    from minio import Minio  # optional – only needed for server-side bulk insert
+
+    client = Minio(MINIO_ENDPOINT, access_key=MINIO_ACCESS_KEY, secret_key=MINIO_SECRET_KEY, secure=MINIO_SECURE)
+    prefix = f"snapshots/{snap.version}/{int(snap.manifest['created_at'])}"
+    objects = []
+    for name in snap.manifest["bulk_files"]:
+        obj = f"{prefix}/{Path(name).name}"
+        client.fput_object(MINIO_BUCKET, obj, str(snap.path / name))
+        objects.append(obj)
+    return objects
+
+
+def import_snapshot(
+    path: str | Path,
+    manager: Any,
+    *,
+    verify: bool = True,
+    **index_params: float,
+) -> Dict[str, Any]:
+    """Provision the snapshot at *path* through a schema *manager*.
+
+    Returns rows, the path taken and timings next to the CSV parse time
+    recorded at export.
+    """
+    total = time.perf_counter()
+    snap = Snapshot(path)
+    if verify:
+        snap.verify()
+    verify_seconds = time.perf_counter() - total
+
+    start = time.perf_counter()
+    # two-stage mode fits reducers over the version – bulk files can't carry them
+    if MINIO_ENDPOINT and hasattr(manager, "build_from_bulk_files") and not DENSE_REDUCED_DIM:
+        mode = "bulk_insert"
+        rows = manager.build_from_bulk_files(snap.version, _upload_bulk_files(snap), **index_params)
+        # the server read the rows – fingerprint them for the change index here
+        recorder = ChunkRecorder(snap.version)
+        recorder.add_many(snap.entities())
+        recorder.commit()
+    else:
+        mode = "insert"
+        rows = manager.build_from_entities(snap.version, snap.entities(), **index_params)
+    build_seconds = time.perf_counter() - start
+
+    result = {
+        "version": snap.version,
+        "rows": rows,
+        "mode": mode,
+        "timings": {
+            "verify_seconds": round(verify_seconds, 3),
+            "build_seconds": round(build_seconds, 3),
+            "total_seconds": round(time.perf_counter() - total, 3),
+            "csv_parse_seconds": snap.manifest["timings"]["csv_parse_seconds"],
+        },
+    }
+    logger.info("Imported snapshot %s: %s", snap.path, result)
+    return result
+
+
+# -----------------------------------------------------------------------------
+# CLI
+# -----------------------------------------------------------------------------
+
+def _bench(csv_path: Path, build: bool) -> Dict[str, float]:
+    """Time CSV → entities against snapshot → entities (and optionally full embedded builds)."""
+    from app.embedded.store import EmbeddedSchemaManager
+
+    out: Dict[str, float] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        manifest = export_snapshot(csv_path, tmp)
+        out.update(manifest["timings"])
+
+        start = time.perf_counter()
+        n = sum(1 for _ in Snapshot(Path(tmp) / csv_path.stem).entities())
+        out["snapshot_load_seconds"] = round(time.perf_counter() - start, 3)
+        out["rows"] = n
+
+        if build:
+            mgr = EmbeddedSchemaManager("bench", index_dir=Path(tmp) / "indexes")
+            start = time.perf_counter()
+            mgr.build_from_csv(csv_path)
+            out["csv_build_seconds"] = round(time.perf_counter() - start, 3)
+            start = time.perf_counter()
+            import_snapshot(Path(tmp) / csv_path.stem, mgr, verify=False)
+            out["snapshot_build_seconds"] = round(time.perf_counter() - start, 3)
+    return out
+
+
+def main(argv: List[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.snapshot", description="Export, import and benchmark per-version snapshots.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p_exp = sub.add_parser("export", help="write a snapshot from a downloaded CSV")
+    p_exp.add_argument("csv")
+    p_exp.add_argument("--out", default=str(SNAPSHOT_DIR))
+
+    p_imp = sub.add_parser("import", help="provision a version from a snapshot")
+    p_imp.add_argument("version_or_path")
+    p_imp.add_argument("--no-verify", action="store_true")
+
+    p_bench = sub.add_parser("bench", help="compare CSV and snapshot timings")
+    p_bench.add_argument("csv")
+    p_bench.add_argument("--build", action="store_true", help="also time full embedded index builds")
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    if args.cmd == "export":
+        result: Dict[str, Any] = export_snapshot(args.csv, args.out)
+        result = {k: result[k] for k in ("version", "rows", "timings")}
+    elif args.cmd == "import":
+        from app.routes.version import _manager
+
+        path = Path(args.version_or_path)
+        if not path.is_dir():
+            path = SNAPSHOT_DIR / args.version_or_path
+        result = import_snapshot(path, _manager(), verify=not args.no_verify)
+    else:
+        result = _bench(Path(args.csv), args.build)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Startup phase timing and readiness state.
+
+Liveness (``GET /``) answers as soon as the app is up; readiness
+(``GET /ready``) only once the embedding model is loaded and warmed up.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator
+
+from app.metrics import metrics
+
+__all__ = ["StartupTracker", "startup"]
+
+logger = logging.getLogger(__name__)
+
+
+class StartupTracker:
+    """Record how long each startup phase took and whether we are ready."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._phases: Dict[str, float] = {}
+        self._ready = threading.Event()
+        self._error: str | None = None
+        self._t0 = time.perf_counter()
+
+    def record(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self._phases[name] = round(seconds, 4)
+        metrics.set(f"startup.{name}.seconds", seconds)
+        logger.info("startup phase %-24s %.3fs", name, seconds)
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def mark_ready(self) -> None:
+        self.record("total_until_ready", time.perf_counter() - self._t0)
+        self._ready.set()
+
+    def mark_failed(self, exc: BaseException) -> None:
+        with self._lock:
+            self._error = f"{type(exc).__name__}: {exc}"
+        logger.error("startup failed: %s", self._error)
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def wait(self, timeout: float | None = None) -> bool:
+        return self._ready.wait(timeout)
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"ready": self.ready, "error": self._error, "phases": dict(self._phases)}
+
+
+startup = StartupTracker()
@@ -0,0 +1,82 @@
+"""Deterministic hashing embedder standing in for BGE‑M3 in load tests.
+
+Speaks the same ``multiprocessing.connection`` protocol as
+:mod:`app.embedding.server`, so the API uses it through ``EMBEDDER_ADDRESS``
+exactly like the real shared embedding process – without torch or model
+weights. Texts sharing tokens get similar vectors, so fixture queries still
+retrieve the right entries.
+
+    python -m bench.fake_embedder /tmp/raggin-bench-embedder.sock
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import logging
+import re
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+
+from app.embedding.server import EmbeddingServer
+from config import DENSE_VECTOR_DIM
+
+__all__ = ["HashEmbedder", "FakeEmbeddingServer"]
+
+_TOKEN = re.compile(r"\w+")
+
+
+def _bucket(token: str, size: int) -> int:
+    return int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "little") % size
+
+
+class HashEmbedder:
+    """``encode_queries``-compatible embedder built on the hashing trick."""
+
+    def __init__(self, dim: int = DENSE_VECTOR_DIM, *, vocab: int = 250_000, latency_ms: float = 0.0) -> None:
+        self.dim = dim
+        self.vocab = vocab
+        self.latency_ms = latency_ms
+
+    def encode_one(self, text: str) -> tuple[np.ndarray, Dict[str, float]]:
+        tokens = _TOKEN.findall(text.lower())
+        dense = np.zeros(self.dim, dtype=np.float32)
+        sparse: Dict[str, float] = {}
+        for tok in tokens:
+            h = _bucket(tok, self.dim * 2)
+            dense[h % self.dim] += 1.0 if h < self.dim else -1.0
+            key = str(_bucket(tok, self.vocab))
+            sparse[key] = sparse.get(key, 0.0) + 1.0 / len(tokens)
+        norm = np.linalg.norm(dense)
+        return (dense / norm if norm else dense), sparse
+
+    def encode_queries(self, queries: List[str], **_: Any) -> Dict[str, Any]:
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)  # one "forward pass" per batch
+        encoded = [self.encode_one(q) for q in queries]
+        return {
+            "dense_vecs": np.stack([d for d, _ in encoded]) if encoded else np.zeros((0, self.dim), np.float32),
+            "lexical_weights": [s for _, s in encoded],
+        }
+
+
+class FakeEmbeddingServer(EmbeddingServer):
+    """:class:`EmbeddingServer` with the hashing embedder instead of BGE‑M3."""
+
+    def __init__(self, address: str, *, latency_ms: float = 0.0, **kw: Any) -> None:
+        super().__init__(address, **kw)
+        self.latency_ms = latency_ms
+
+    def _load_model(self) -> HashEmbedder:
+        return HashEmbedder(latency_ms=self.latency_ms)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Hashing stand-in for the shared embedding server.")
+    parser.add_argument("address", help="unix socket path or host:port")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="simulated time per micro-batch")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    FakeEmbeddingServer(args.address, latency_ms=args.latency_ms).serve_forever()
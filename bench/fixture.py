@@ -0,0 +1,83 @@
+"""Synthetic version CSV with the real dataset columns, for offline benchmarks.
+
+Rows look like the Kaggle export – text with ``code_snippet_N`` markers, a
+``code_content`` list of snippet dicts, ``sparse_title`` as a list of
+``(token, weight)`` tuples and JSON dense vectors – embedded with
+:class:`bench.fake_embedder.HashEmbedder`, so queries sent through the fake
+embedding server retrieve matching rows.
+
+    python -m bench.fixture downloads/v0.0.1.csv --rows 2000
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+from pathlib import Path
+from typing import List
+
+import pandas as pd
+
+from bench.fake_embedder import HashEmbedder
+
+__all__ = ["make_fixture_csv", "QUERIES"]
+
+APIS = [
+    "revalidatePath", "generateStaticParams", "useRouter", "usePathname", "redirect",
+    "notFound", "cookies", "headers", "NextResponse", "middleware", "generateMetadata",
+    "Image", "Link", "Script", "useSearchParams", "revalidateTag", "unstable_cache",
+    "draftMode", "useFormStatus", "loading", "error", "layout", "route handlers",
+]
+TOPICS = ["routing", "caching", "data fetching", "rendering", "styling", "deployment", "authentication"]
+
+# sample questions for the load generator – each mentions fixture vocabulary
+QUERIES = [f"How do I use {api} for {topic} in the app router?" for api in APIS for topic in TOPICS[:3]]
+
+
+def make_fixture_csv(path: str | Path, *, rows: int = 1000, version: str | None = None, seed: int = 0) -> Path:
+    path = Path(path)
+    version = version or path.stem
+    rng = random.Random(seed)
+    emb = HashEmbedder()
+
+    records: List[dict] = []
+    for i in range(rows):
+        api, topic = rng.choice(APIS), rng.choice(TOPICS)
+        title = f"{api} – {topic} ({i})"
+        code = f"import {{ {api} }} from 'next/navigation'\n\nexport default function Page() {{\n  {api}()\n}}"
+        text = (
+            f"# {title}\n\nUse `{api}` when working on {topic}. "
+            + " ".join(rng.choice(APIS + TOPICS) for _ in range(60))
+            + "\n\n```code_snippet_1```\n"
+        )
+        snippets = [{"language": "tsx", "filename": f"app/{topic.replace(' ', '-')}/page.tsx", "switcher": False, "code": code}]
+        dense_text, _ = emb.encode_one(f"{title} {text}")
+        dense_code, _ = emb.encode_one(code)
+        records.append(
+            {
+                "entry_id": f"{version}-{i}",
+                "title": title,
+                "metadata": json.dumps({"section": topic, "api": api}),
+                "version": version,
+                "text_content": text,
+                "code_content": repr(snippets),
+                "sparse_title": repr([(int(k), round(v, 4)) for k, v in emb.encode_one(title)[1].items()]),
+                "dense_text_content": json.dumps([round(float(x), 5) for x in dense_text]),
+                "dense_code_snippet": json.dumps([round(float(x), 5) for x in dense_code]),
+                "tag": rng.choice(["app", "pages"]),
+            }
+        )
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    pd.DataFrame.from_records(records).to_csv(path, index=False)
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic version CSV.")
+    parser.add_argument("path")
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(make_fixture_csv(args.path, rows=args.rows, seed=args.seed))
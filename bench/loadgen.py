@@ -0,0 +1,157 @@
+"""Closed-loop load generator for the RAGGIN HTTP API.
+
+For each concurrency level, that many clients send requests back to back for
+a fixed duration; the report gives throughput, latency percentiles and error
+counts per endpoint:
+
+    python -m bench.loadgen http://localhost:8000 --version v0.0.1 \\
+        --endpoint search --endpoint generate --concurrency 1,4,16 --duration 20
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import itertools
+import json
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List
+
+import aiohttp
+import numpy as np
+
+__all__ = ["run_level", "run", "payload_factory", "format_report"]
+
+ENDPOINTS = {
+    "search": "/search",
+    "enhance": "/prompt/enhance",
+    "generate": "/prompt/generate",
+}
+
+
+def payload_factory(endpoint: str, version: str, queries: List[str], *, model: str = "mock") -> Callable[[], Dict[str, Any]]:
+    """Round-robin request bodies for *endpoint*."""
+    cycle = itertools.cycle(queries)
+
+    def make() -> Dict[str, Any]:
+        q = next(cycle)
+        if endpoint == "search":
+            return {"version_name": version, "text_query": q, "code_query": "", "top_k": 5}
+        if endpoint == "enhance":
+            return {"version_name": version, "query": q}
+        return {"version_name": version, "query": q, "model": model}
+
+    return make
+
+
+async def run_level(
+    session: aiohttp.ClientSession,
+    url: str,
+    make_payload: Callable[[], Dict[str, Any]],
+    *,
+    concurrency: int,
+    duration: float,
+) -> Dict[str, Any]:
+    """Drive *url* with *concurrency* clients for *duration* seconds."""
+    latencies: List[float] = []
+    errors: Counter = Counter()
+    deadline = time.perf_counter() + duration
+
+    async def client() -> None:
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                async with session.post(url, json=make_payload()) as resp:
+                    await resp.read()
+                    if resp.status >= 400:
+                        errors[str(resp.status)] += 1
+                        continue
+            except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+                errors[type(exc).__name__] += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    lat = np.asarray(latencies) * 1000
+    total = len(latencies) + sum(errors.values())
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "ok": len(latencies),
+        "errors": dict(errors),
+        "error_rate": round(sum(errors.values()) / total, 4) if total else 0.0,
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "p50_ms": round(float(np.percentile(lat, 50)), 1) if len(lat) else None,
+        "p95_ms": round(float(np.percentile(lat, 95)), 1) if len(lat) else None,
+        "p99_ms": round(float(np.percentile(lat, 99)), 1) if len(lat) else None,
+        "max_ms": round(float(lat.max()), 1) if len(lat) else None,
+    }
+
+
+async def run(
+    base_url: str,
+    *,
+    version: str,
+    endpoints: List[str],
+    levels: List[int],
+    duration: float,
+    queries: List[str],
+    model: str = "mock",
+    timeout: float = 120.0,
+) -> Dict[str, List[Dict[str, Any]]]:
+    report: Dict[str, List[Dict[str, Any]]] = {}
+    conn = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(connector=conn, timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+        for ep in endpoints:
+            url = base_url.rstrip("/") + ENDPOINTS[ep]
+            make = payload_factory(ep, version, queries, model=model)
+            report[ep] = [
+                await run_level(session, url, make, concurrency=c, duration=duration) for c in levels
+            ]
+    return report
+
+
+def format_report(report: Dict[str, List[Dict[str, Any]]]) -> str:
+    cols = ("concurrency", "ok", "throughput_rps", "p50_ms", "p95_ms", "p99_ms", "error_rate")
+    lines = []
+    for ep, rows in report.items():
+        lines.append(f"\n{ep}")
+        lines.append("  " + "  ".join(f"{c:>14}" for c in cols))
+        for row in rows:
+            lines.append("  " + "  ".join(f"{str(row[c]):>14}" for c in cols))
+    return "\n".join(lines)
+
+
+def main(argv: List[str] | None = None) -> None:
+    from bench.fixture import QUERIES
+
+    parser = argparse.ArgumentParser(description="Closed-loop load generator for the RAGGIN HTTP API.")
+    parser.add_argument("base_url")
+    parser.add_argument("--version", required=True)
+    parser.add_argument("--endpoint", action="append", choices=sorted(ENDPOINTS), default=None)
+    parser.add_argument("--concurrency", default="1,4,16", help="comma-separated levels")
+    parser.add_argument("--duration", type=float, default=15.0, help="seconds per level")
+    parser.add_argument("--model", default="mock")
+    parser.add_argument("--json", action="store_true", help="print the raw JSON report")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(
+        run(
+            args.base_url,
+            version=args.version,
+            endpoints=args.endpoint or ["search", "generate"],
+            levels=[int(c) for c in args.concurrency.split(",")],
+            duration=args.duration,
+            queries=QUERIES,
+            model=args.model,
+        )
+    )
+    print(json.dumps(report, indent=2) if args.json else format_report(report))
+
+
+if __name__ == "__main__":
+    main()
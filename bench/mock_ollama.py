@@ -0,0 +1,130 @@
+"""Mock Ollama server with configurable time-to-first-token and token rate.
+
+Implements the endpoints RAGGIN uses – ``/api/generate`` (streaming NDJSON
+and non-streaming), ``/api/ps`` and ``/api/tags`` – and simulates model
+loading: the first request for a model pays ``--load-ms`` once, a request
+without a prompt just loads it (the keep-alive warm-up call).
+
+    python -m bench.mock_ollama --port 11500 --ttft-ms 300 --tokens-per-s 40
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import time
+from typing import Any, Dict
+
+from aiohttp import web
+
+__all__ = ["MockOllama", "create_app"]
+
+
+class MockOllama:
+    def __init__(
+        self,
+        *,
+        ttft_ms: float = 200.0,
+        tokens_per_s: float = 50.0,
+        tokens: int = 64,
+        load_ms: float = 0.0,
+        max_parallel: int = 0,
+    ) -> None:
+        self.ttft = ttft_ms / 1000
+        self.token_interval = 1.0 / tokens_per_s if tokens_per_s > 0 else 0.0
+        self.tokens = tokens
+        self.load = load_ms / 1000
+        # like OLLAMA_NUM_PARALLEL: extra requests queue inside the server
+        self._slots = asyncio.Semaphore(max_parallel) if max_parallel > 0 else None
+        self.loaded: Dict[str, float] = {}
+        self.requests = 0
+
+    async def _ensure_loaded(self, model: str) -> None:
+        if model not in self.loaded:
+            await asyncio.sleep(self.load)
+            self.loaded[model] = time.time()
+
+    def _final(self, model: str, started: float, n: int, text: str = "") -> Dict[str, Any]:
+        return {
+            "model": model,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "response": text,
+            "done": True,
+            "done_reason": "stop",
+            "total_duration": int((time.perf_counter() - started) * 1e9),
+            "eval_count": n,
+        }
+
+    async def generate(self, request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        model = body.get("model", "mock")
+        started = time.perf_counter()
+        self.requests += 1
+        await self._ensure_loaded(model)
+        if not body.get("prompt"):  # load / keep-alive only
+            return web.json_response(self._final(model, started, 0))
+
+        n = int((body.get("options") or {}).get("num_predict") or self.tokens)
+        if self._slots is not None:
+            await self._slots.acquire()
+        try:
+            if body.get("stream", True):
+                return await self._stream(request, model, started, n)
+            await asyncio.sleep(self.ttft + self.token_interval * max(n - 1, 0))
+            return web.json_response(self._final(model, started, n, " ".join(f"tok{i}" for i in range(n))))
+        finally:
+            if self._slots is not None:
+                self._slots.release()
+
+    async def _stream(self, request: web.Request, model: str, started: float, n: int) -> web.StreamResponse:
+        resp = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+        await resp.prepare(request)
+        await asyncio.sleep(self.ttft)
+        for i in range(n):
+            if i:
+                await asyncio.sleep(self.token_interval)
+            chunk = {"model": model, "response": f"tok{i} ", "done": False}
+            await resp.write(json.dumps(chunk).encode() + b"\n")
+        await resp.write(json.dumps(self._final(model, started, n)).encode() + b"\n")
+        await resp.write_eof()
+        return resp
+
+    async def ps(self, _: web.Request) -> web.Response:
+        return web.json_response({"models": [{"name": m, "model": m} for m in self.loaded]})
+
+    async def tags(self, _: web.Request) -> web.Response:
+        return web.json_response({"models": [{"name": m, "model": m} for m in self.loaded]})
+
+
+def create_app(mock: MockOllama) -> web.Application:
+    app = web.Application()
+    app.router.add_post("/api/generate", mock.generate)
+    app.router.add_get("/api/ps", mock.ps)
+    app.router.add_get("/api/tags", mock.tags)
+    return app
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Mock Ollama server for load tests.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument("--ttft-ms", type=float, default=200.0, help="time to first token")
+    parser.add_argument("--tokens-per-s", type=float, default=50.0)
+    parser.add_argument("--tokens", type=int, default=64, help="tokens per answer unless num_predict is set")
+    parser.add_argument("--load-ms", type=float, default=0.0, help="one-time model load per model")
+    parser.add_argument("--max-parallel", type=int, default=0, help="concurrent generations (0 = unlimited)")
+    args = parser.parse_args(argv)
+
+    mock = MockOllama(
+        ttft_ms=args.ttft_ms,
+        tokens_per_s=args.tokens_per_s,
+        tokens=args.tokens,
+        load_ms=args.load_ms,
+        max_parallel=args.max_parallel,
+    )
+    web.run_app(create_app(mock), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""End-to-end throughput test on a plain Linux box – no Milvus, Ollama or GPU.
+
+Starts, in a scratch directory:
+
+* a fixture version CSV (``bench.fixture``) built into the embedded backend,
+  which stands in for Milvus with the real schema fields;
+* the hashing embedding server (``bench.fake_embedder``) on the shared
+  embedder socket;
+* the mock Ollama server (``bench.mock_ollama``);
+* the API itself under uvicorn, configured through the usual env vars;
+
+then drives it with ``bench.loadgen`` and prints one table per endpoint:
+
+    python -m bench.run --rows 2000 --workers 2 --concurrency 1,8,32 --ttft-ms 300
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import secrets
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import requests
+
+from bench.fixture import QUERIES, make_fixture_csv
+from bench.loadgen import format_report, run
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_http(url: str, timeout: float, procs: List[subprocess.Popen]) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        for p in procs:
+            if p.poll() is not None:
+                raise RuntimeError(f"{p.args} exited with {p.returncode} during startup")
+        try:
+            if requests.get(url, timeout=1).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.25)
+    raise TimeoutError(f"{url} not ready after {timeout:.0f}s")
+
+
+def _wait_path(path: Path, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while not path.exists():
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"{path} did not appear after {timeout:.0f}s")
+        time.sleep(0.1)
+
+
+def _env(work: Path, ollama_port: int, *, cache: bool = False) -> Dict[str, str]:
+    return {
+        **os.environ,
+        "PYTHONPATH": str(ROOT),
+        "SEARCH_BACKEND": "embedded",
+        "EMBEDDED_INDEX_DIR": str(work / "indexes"),
+        "DOWNLOADS_DIR": str(work / "downloads"),
+        "DOWNLOAD_CACHE_DIR": str(work / "cache"),
+        "SNAPSHOT_DIR": str(work / "snapshots"),
+        "SUPPORTED_VERSIONS_FILE": str(work / "supported_versions.txt"),
+        "MODEL_CACHE_DIR": str(work / "model"),
+        "EMBEDDER_ADDRESS": str(work / "embedder.sock"),
+        "EMBEDDER_AUTHKEY": secrets.token_hex(16),
+        "OLLAMA_API": f"http://127.0.0.1:{ollama_port}/api/generate",
+        "OLLAMA_HEALTH_INTERVAL": "2",
+        "EAGER_MODEL_LOAD": "1",
+        # repeated fixture queries would otherwise measure cache hits
+        "CACHE_PATH": str(work / "cache.sqlite") if cache else "",
+    }
+
+
+def main(argv: List[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="End-to-end throughput test with local stand-ins for Milvus, Ollama and BGE-M3.")
+    parser.add_argument("--workdir", help="scratch directory (default: a new temp dir)")
+    parser.add_argument("--version", default="v0.0.1")
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers")
+    parser.add_argument("--endpoint", action="append", choices=["search", "enhance", "generate"], default=None)
+    parser.add_argument("--concurrency", default="1,4,16")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per level")
+    parser.add_argument("--ttft-ms", type=float, default=200.0)
+    parser.add_argument("--tokens-per-s", type=float, default=50.0)
+    parser.add_argument("--tokens", type=int, default=32)
+    parser.add_argument("--ollama-max-parallel", type=int, default=4)
+    parser.add_argument("--embed-latency-ms", type=float, default=0.0)
+    parser.add_argument("--cache", action="store_true", help="enable the persistent cache tier")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args(argv)
+
+    work = Path(args.workdir or tempfile.mkdtemp(prefix="raggin-bench-")).resolve()
+    work.mkdir(parents=True, exist_ok=True)
+    ollama_port, api_port = _free_port(), _free_port()
+    env = _env(work, ollama_port, cache=args.cache)
+
+    csv = work / "downloads" / f"{args.version}.csv"
+    if not csv.exists():
+        make_fixture_csv(csv, rows=args.rows, version=args.version)
+    (work / "supported_versions.txt").write_text(args.version + "\n", encoding="utf-8")
+    # build in a child so config picks up the scratch paths from the env
+    subprocess.run(
+        [sys.executable, "-c", "import sys; from app.embedded.store import EmbeddedSchemaManager as M; "
+         "print(M('nextjs_docs').build_from_csv(sys.argv[1]))", str(csv)],
+        env=env, check=True, cwd=ROOT, stdout=subprocess.DEVNULL,
+    )
+
+    log = open(work / "services.log", "ab")
+    procs: List[subprocess.Popen] = []
+    try:
+        procs.append(subprocess.Popen(
+            [sys.executable, "-m", "bench.mock_ollama", "--port", str(ollama_port),
+             "--ttft-ms", str(args.ttft_ms), "--tokens-per-s", str(args.tokens_per_s),
+             "--tokens", str(args.tokens), "--max-parallel", str(args.ollama_max_parallel)],
+            env=env, cwd=ROOT, stdout=log, stderr=log,
+        ))
+        procs.append(subprocess.Popen(
+            [sys.executable, "-m", "bench.fake_embedder", env["EMBEDDER_ADDRESS"],
+             "--latency-ms", str(args.embed_latency_ms)],
+            env=env, cwd=ROOT, stdout=log, stderr=log,
+        ))
+        _wait_path(Path(env["EMBEDDER_ADDRESS"]), 30)
+        procs.append(subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(api_port),
+             "--workers", str(args.workers), "--log-level", "warning"],
+            env=env, cwd=ROOT, stdout=log, stderr=log,
+        ))
+        base = f"http://127.0.0.1:{api_port}"
+        _wait_http(f"http://127.0.0.1:{ollama_port}/api/ps", 30, procs)
+        _wait_http(f"{base}/ready", 120, procs)
+
+        report = asyncio.run(
+            run(
+                base,
+                version=args.version,
+                endpoints=args.endpoint or ["search", "generate"],
+                levels=[int(c) for c in args.concurrency.split(",")],
+                duration=args.duration,
+                queries=QUERIES,
+            )
+        )
+        if args.json:
+            print(json.dumps({"report": report, "metrics": requests.get(f"{base}/metrics", timeout=5).json()}, indent=2))
+        else:
+            print(format_report(report))
+            print(f"\nservice logs: {work / 'services.log'}")
+    finally:
+        for p in reversed(procs):
+            p.terminate()
+        for p in procs:
+            try:
+                p.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                p.kill()
+        log.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""``sparse_title`` pruning against the unpruned lexical index.
+
+Builds a version into the embedded backend once per build-side setting and
+reports posting-list size, per-query latency and recall@k for each query-side
+setting. Recall is measured against the unpruned index with unpruned queries:
+
+    python -m bench.sparse_pruning --rows 20000 --build-top-n 0,16,8 --query-drop 0,0.2,0.4
+    python -m bench.sparse_pruning --csv downloads/v15.0.0.csv --build-threshold 0,0.02
+
+Without ``--csv`` a fixture version is generated (``bench.fixture``), and the
+fixture questions, encoded with the hashing embedder, are the queries. Its
+weights are nearly uniform, so real CSVs show the effect far better. With a
+real CSV the queries are the stored title vectors of sampled rows.
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from app.embedded.store import VersionIndex, write_version_index
+from app.embedding.sparse import prune_sparse
+from app.milvus.schema_manager import MilvusSchemaManager
+from bench.fake_embedder import HashEmbedder
+from bench.fixture import QUERIES, make_fixture_csv
+
+
+def _queries(entities: List[Dict], *, from_fixture: bool, count: int, seed: int) -> List[Dict]:
+    if from_fixture:
+        emb = HashEmbedder()
+        return [emb.encode_one(q)[1] for q in QUERIES]
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(entities), min(count, len(entities)), replace=False)
+    return [entities[i]["sparse_title"] for i in rows]
+
+
+def _run(idx: VersionIndex, queries: List[Dict], top_k: int, repeat: int) -> tuple[List[List[int]], List[float]]:
+    ranked, latencies = [], []
+    for _ in range(repeat):
+        ranked = []
+        for q in queries:
+            start = time.perf_counter()
+            hits = idx.sparse_search(q, top_k)
+            latencies.append((time.perf_counter() - start) * 1000)
+            ranked.append([row for row, _ in hits])
+    return ranked, latencies
+
+
+def _recall(truth: List[List[int]], got: List[List[int]]) -> float:
+    return statistics.mean(len(set(t) & set(g)) / max(len(t), 1) for t, g in zip(truth, got))
+
+
+def _postings_bytes(idx: VersionIndex) -> int:
+    return sum(f.stat().st_size for f in idx.path.glob("sparse_*.npy"))
+
+
+def main(argv: List[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark sparse_title pruning at build and query time.")
+    parser.add_argument("--csv", help="version CSV to build (default: a generated fixture)")
+    parser.add_argument("--rows", type=int, default=5000, help="fixture rows")
+    parser.add_argument("--build-top-n", default="0,16,8", help="per-title top-N values to try (0 = off)")
+    parser.add_argument("--build-threshold", default="0", help="per-title weight thresholds to try")
+    parser.add_argument("--build-drop", default="0", help="drop_ratio_build values to try")
+    parser.add_argument("--query-top-n", default="0", help="per-query top-N values to try")
+    parser.add_argument("--query-drop", default="0,0.2,0.4", help="drop_ratio_search values to try")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200, help="sampled queries with --csv")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv = Path(args.csv) if args.csv else make_fixture_csv(Path(tmp) / "bench-sparse.csv", rows=args.rows)
+        entities = [MilvusSchemaManager._row_to_entity(row) for _, row in pd.read_csv(csv).iterrows()]
+        queries = _queries(entities, from_fixture=not args.csv, count=args.queries, seed=0)
+
+        def build(name: str, **prune) -> VersionIndex:
+            pruned = [{**ent, "sparse_title": prune_sparse(ent["sparse_title"], **prune)} for ent in entities]
+            return VersionIndex(write_version_index(pruned, Path(tmp) / name, ann="exact"))
+
+        base = build("full")
+        truth, _ = _run(base, queries, args.top_k, 1)
+        base_bytes = _postings_bytes(base)
+        header = (
+            f"{'build':<22}{'query':<16}{'postings MB':>12}{'size':>7}"
+            f"{'p50 ms':>9}{'mean ms':>9}{'recall@' + str(args.top_k):>11}"
+        )
+        print(f"{len(entities)} rows, {len(queries)} queries\n{header}\n{'-' * len(header)}")
+
+        for top_n in (int(v) for v in args.build_top_n.split(",")):
+            for threshold in (float(v) for v in args.build_threshold.split(",")):
+                for drop in (float(v) for v in args.build_drop.split(",")):
+                    label = f"n={top_n} t={threshold:g} d={drop:g}"
+                    idx = build(label.replace(" ", "_"), top_n=top_n, threshold=threshold, drop_ratio=drop)
+                    size = _postings_bytes(idx)
+                    for q_top_n in (int(v) for v in args.query_top_n.split(",")):
+                        for q_drop in (float(v) for v in args.query_drop.split(",")):
+                            pruned = [prune_sparse(q, top_n=q_top_n, drop_ratio=q_drop) for q in queries]
+                            got, lat = _run(idx, pruned, args.top_k, args.repeat)
+                            print(
+                                f"{label:<22}{f'n={q_top_n} d={q_drop:g}':<16}{size / 2**20:>12.2f}"
+                                f"{size / base_bytes:>7.2f}{statistics.median(lat):>9.3f}"
+                                f"{statistics.mean(lat):>9.3f}{_recall(truth, got):>11.3f}"
+                            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Two-stage dense retrieval against plain full-dimension search.
+
+Builds a version into the embedded backend once per configuration and reports
+resident index size, per-query latency and recall@k. Recall is measured
+against exact full-dimension search:
+
+    python -m bench.two_stage --rows 20000 --dims 128,256 --factors 4,8,16
+    python -m bench.two_stage --csv downloads/v15.0.0.csv --reductions pca,truncate
+
+Without ``--csv`` a fixture version is generated (``bench.fixture``), and the
+fixture questions, embedded with the hashing embedder, are the queries. With
+a real CSV the queries are stored vectors with Gaussian noise added
+(``--noise``), so no model is needed.
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from app.embedded.store import VersionIndex, write_version_index
+from app.milvus.schema_manager import MilvusSchemaManager
+from bench.fake_embedder import HashEmbedder
+from bench.fixture import QUERIES, make_fixture_csv
+
+FIELD = "dense_text_content"
+
+
+def _queries(entities: List[Dict], *, from_fixture: bool, count: int, noise: float, seed: int) -> np.ndarray:
+    if from_fixture:
+        emb = HashEmbedder()
+        return np.stack([emb.encode_one(q)[0] for q in QUERIES])
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(entities), min(count, len(entities)), replace=False)
+    vecs = np.asarray([entities[i][FIELD] for i in rows], dtype=np.float32)
+    vecs /= np.linalg.norm(vecs, axis=1, keepdims=True).clip(1e-12)
+    return vecs + rng.normal(0, noise, vecs.shape).astype(np.float32)
+
+
+def _run(idx: VersionIndex, queries: np.ndarray, top_k: int, repeat: int) -> tuple[List[List[int]], List[float]]:
+    ranked, latencies = [], []
+    for _ in range(repeat):
+        ranked = []
+        for q in queries:
+            start = time.perf_counter()
+            hits = idx.dense_search(FIELD, q, top_k)
+            latencies.append((time.perf_counter() - start) * 1000)
+            ranked.append([row for row, _ in hits])
+    return ranked, latencies
+
+
+def _recall(truth: List[List[int]], got: List[List[int]]) -> float:
+    return statistics.mean(len(set(t) & set(g)) / max(len(t), 1) for t, g in zip(truth, got))
+
+
+def main(argv: List[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark two-stage dense retrieval (reduced ANN + full rescoring).")
+    parser.add_argument("--csv", help="version CSV to build (default: a generated fixture)")
+    parser.add_argument("--rows", type=int, default=5000, help="fixture rows")
+    parser.add_argument("--dims", default="128,256", help="reduced dimensions to try")
+    parser.add_argument("--reductions", default="pca,truncate")
+    parser.add_argument("--factors", default="4,8,16", help="candidate pool = top_k × factor")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--ann", default="exact", choices=["exact", "hnsw"])
+    parser.add_argument("--queries", type=int, default=200, help="sampled queries with --csv")
+    parser.add_argument("--noise", type=float, default=0.02, help="per-dimension query noise with --csv")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv = Path(args.csv) if args.csv else make_fixture_csv(Path(tmp) / "bench-two-stage.csv", rows=args.rows)
+        entities = [MilvusSchemaManager._row_to_entity(row) for _, row in pd.read_csv(csv).iterrows()]
+        queries = _queries(entities, from_fixture=not args.csv, count=args.queries, noise=args.noise, seed=0)
+
+        def build(name: str, **kw) -> VersionIndex:
+            start = time.perf_counter()
+            dest = write_version_index(entities, Path(tmp) / name, ann=args.ann, **kw)
+            idx = VersionIndex(dest)
+            idx.build_seconds = time.perf_counter() - start
+            return idx
+
+        base = build("full", reduced_dim=0)
+        truth, base_lat = _run(base, queries, args.top_k, args.repeat)
+        header = f"{'config':<22}{'index MB':>10}{'build s':>9}{'p50 ms':>9}{'mean ms':>9}{'recall@' + str(args.top_k):>11}"
+        print(f"{len(entities)} rows, {len(queries)} queries, ann={args.ann}\n{header}\n{'-' * len(header)}")
+
+        def row(label: str, idx: VersionIndex, lat: List[float], recall: float) -> None:
+            print(
+                f"{label:<22}{idx.nbytes / 2**20:>10.1f}{idx.build_seconds:>9.2f}"
+                f"{statistics.median(lat):>9.3f}{statistics.mean(lat):>9.3f}{recall:>11.3f}"
+            )
+
+        row("full 1024-d", base, base_lat, 1.0)
+        for reduction in args.reductions.split(","):
+            for dim in (int(d) for d in args.dims.split(",")):
+                idx = build(f"{reduction}{dim}", reduced_dim=dim, reduction=reduction)
+                for factor in (int(f) for f in args.factors.split(",")):
+                    idx.rescore_factor = factor
+                    got, lat = _run(idx, queries, args.top_k, args.repeat)
+                    row(f"{reduction}-{dim} ×{factor}", idx, lat, _recall(truth, got))
+
+
+if __name__ == "__main__":
+    main()
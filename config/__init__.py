@@ -22,6 +22,18 @@ SUPPORTED_VERSIONS_FILE: Path = Path(
     os.getenv("SUPPORTED_VERSIONS_FILE", CONFIG_DIR / "supported_versions.txt")
 ).resolve()
 
+# Content‑addressed cache of downloaded version CSVs. DOWNLOAD_MIRROR replaces
+# Kaggle Hub with a local directory, a tarball or an http(s) base URL
+# (air‑gapped installs); an optional SHA256SUMS file there is verified.
+DOWNLOAD_CACHE_DIR: Path = Path(
+    os.getenv("DOWNLOAD_CACHE_DIR", PROJECT_ROOT / ".cache" / "downloads")
+).resolve()
+DOWNLOAD_MIRROR: str = os.getenv("DOWNLOAD_MIRROR", "")
+DOWNLOAD_WORKERS: int = int(os.getenv("DOWNLOAD_WORKERS", "4"))
+
+# seconds between checks of supported_versions.txt / DOWNLOADS_DIR for changes
+REGISTRY_REFRESH_SECONDS: float = float(os.getenv("REGISTRY_REFRESH_SECONDS", "5"))
+
 MODEL_CACHE_DIR: Path = Path(
     os.getenv("MODEL_CACHE_DIR", PROJECT_ROOT / "models" / "bge-m3")
 ).resolve()
@@ -33,9 +45,234 @@ MODEL_CACHE_DIR: Path = Path(
 # Milvus
 MILVUS_URI: str = os.getenv("MILVUS_URI", "http://standalone:19530")
 
+# Prebuilt per‑version snapshots (python -m app.snapshot / POST /version/import).
+# With MINIO_ENDPOINT set, Milvus imports use server‑side bulk insert from the
+# bucket Milvus itself reads ("a-bucket" by default); otherwise batched inserts.
+SNAPSHOT_DIR: Path = Path(os.getenv("SNAPSHOT_DIR", PROJECT_ROOT / "snapshots")).resolve()
+SNAPSHOT_BULK_ROWS: int = int(os.getenv("SNAPSHOT_BULK_ROWS", "5000"))
+MINIO_ENDPOINT: str = os.getenv("MINIO_ENDPOINT", "")
+MINIO_ACCESS_KEY: str = os.getenv("MINIO_ACCESS_KEY", "minioadmin")
+MINIO_SECRET_KEY: str = os.getenv("MINIO_SECRET_KEY", "minioadmin")
+MINIO_BUCKET: str = os.getenv("MINIO_BUCKET", "a-bucket")
+MINIO_SECURE: bool = os.getenv("MINIO_SECURE", "0").lower() in ("1", "true", "yes")
+
+# Local project ingest (python -m app.ingest.pipeline): markdown and source files are
+# chunked into the dataset layout and embedded in batches across worker
+# processes; vectors are cached by content hash so re-runs embed only changes.
+INGEST_CACHE_DIR: Path = Path(
+    os.getenv("INGEST_CACHE_DIR", PROJECT_ROOT / ".cache" / "ingest")
+).resolve()
+INGEST_WORKERS: int = int(os.getenv("INGEST_WORKERS", "1"))
+INGEST_BATCH_SIZE: int = int(os.getenv("INGEST_BATCH_SIZE", "32"))
+INGEST_CHUNK_CHARS: int = int(os.getenv("INGEST_CHUNK_CHARS", "4000"))
+INGEST_MAX_FILE_BYTES: int = int(os.getenv("INGEST_MAX_FILE_BYTES", str(1 << 20)))
+
+# Retrieval backend: "milvus" (standalone server) or "embedded" (in‑process,
+# memory‑mapped NumPy indices under EMBEDDED_INDEX_DIR)
+SEARCH_BACKEND: str = os.getenv("SEARCH_BACKEND", "milvus").lower()
+
+EMBEDDED_INDEX_DIR: Path = Path(
+    os.getenv("EMBEDDED_INDEX_DIR", PROJECT_ROOT / "indexes")
+).resolve()
+
+# "exact" (brute force) or "hnsw" (requires the optional hnswlib package)
+EMBEDDED_ANN: str = os.getenv("EMBEDDED_ANN", "exact").lower()
+
+# Per‑version residency: versions are loaded on first use and the least
+# recently used ones are released once the budget is exceeded.
+RESIDENCY_MEMORY_BUDGET_MB: int = int(os.getenv("RESIDENCY_MEMORY_BUDGET_MB", "4096"))
+RESIDENCY_MAX_VERSIONS: int = int(os.getenv("RESIDENCY_MAX_VERSIONS", "0"))  # 0 → no limit
+# Milvus loads are shared by all workers, so the budget is enforced once, in a
+# ledger file that every worker on the host updates under a file lock.
+RESIDENCY_LEDGER_PATH: str = os.getenv("RESIDENCY_LEDGER_PATH", str(PROJECT_ROOT / ".cache" / "residency.json"))
+
+# threads shared by all requests for the concurrent per‑modality ANN calls
+SEARCH_FANOUT_WORKERS: int = int(os.getenv("SEARCH_FANOUT_WORKERS", "12"))
+
+# Two-stage dense retrieval (0 disables it): ingest also stores both dense
+# fields reduced to DENSE_REDUCED_DIM dimensions ("pca" fitted per version and
+# field on up to DENSE_PCA_SAMPLE_ROWS rows, or "truncate"). The ANN index is
+# built on those; top_k × DENSE_RESCORE_FACTOR candidates are rescored with
+# the full vectors. Milvus keeps the full vectors memory-mapped and unindexed
+# (FLAT), and the fitted PCA reducers under DENSE_REDUCER_DIR. Changing
+# these needs a rebuild of the versions.
+DENSE_REDUCED_DIM: int = int(os.getenv("DENSE_REDUCED_DIM", "0"))
+DENSE_REDUCTION: str = os.getenv("DENSE_REDUCTION", "pca").lower()
+DENSE_PCA_SAMPLE_ROWS: int = int(os.getenv("DENSE_PCA_SAMPLE_ROWS", "20000"))
+DENSE_RESCORE_FACTOR: int = int(os.getenv("DENSE_RESCORE_FACTOR", "8"))
+DENSE_REDUCER_DIR: Path = Path(
+    os.getenv("DENSE_REDUCER_DIR", EMBEDDED_INDEX_DIR / "reducers")
+).resolve()
+
+# sparse_title pruning (0 disables a rule). At ingest (BUILD) and on the query
+# vector (QUERY), tokens with a weight below the threshold are dropped and at
+# most TOP_N are kept. The drop ratios are Milvus' drop_ratio_build /
+# drop_ratio_search: the fraction of the smallest weights ignored by the
+# index build / the search. The embedded backend honours them too. Both can
+# be overridden per request.
+SPARSE_PRUNE_TOP_N_BUILD: int = int(os.getenv("SPARSE_PRUNE_TOP_N_BUILD", "0"))
+SPARSE_PRUNE_THRESHOLD_BUILD: float = float(os.getenv("SPARSE_PRUNE_THRESHOLD_BUILD", "0"))
+SPARSE_PRUNE_TOP_N_QUERY: int = int(os.getenv("SPARSE_PRUNE_TOP_N_QUERY", "0"))
+SPARSE_PRUNE_THRESHOLD_QUERY: float = float(os.getenv("SPARSE_PRUNE_THRESHOLD_QUERY", "0"))
+SPARSE_DROP_RATIO_BUILD: float = float(os.getenv("SPARSE_DROP_RATIO_BUILD", "0"))
+SPARSE_DROP_RATIO_SEARCH: float = float(os.getenv("SPARSE_DROP_RATIO_SEARCH", "0"))
+
+# Response compression, negotiated with Accept-Encoding in preference order
+# (zstd needs the optional zstandard package); empty disables it. Bodies
+# below the minimum and streamed responses are sent as is.
+RESPONSE_COMPRESSION: list[str] = [
+    e.strip().lower() for e in os.getenv("RESPONSE_COMPRESSION", "zstd,gzip").split(",") if e.strip()
+]
+RESPONSE_COMPRESSION_MIN_BYTES: int = int(os.getenv("RESPONSE_COMPRESSION_MIN_BYTES", "1024"))
+RESPONSE_GZIP_LEVEL: int = int(os.getenv("RESPONSE_GZIP_LEVEL", "5"))
+RESPONSE_ZSTD_LEVEL: int = int(os.getenv("RESPONSE_ZSTD_LEVEL", "3"))
+
+# query planner: a text / code query shorter than this (after stripping) is
+# treated as empty and its modalities are not embedded or searched
+PLANNER_MIN_QUERY_CHARS: int = int(os.getenv("PLANNER_MIN_QUERY_CHARS", "2"))
+
+# metadata keys that get a JSON‑path scalar index ("key:cast_type", comma
+# separated) so filter_expr on metadata["key"] avoids a full scan
+METADATA_INDEX_KEYS: list[tuple[str, str]] = [
+    (k.strip(), t.strip() or "varchar")
+    for k, _, t in (item.partition(":") for item in os.getenv("METADATA_INDEX_KEYS", "page:varchar,language:varchar").split(","))
+    if k.strip()
+]
+
+# BM25 lexical channel over text_content + code_content. Off unless the request
+# sets SearchRequest.bm25_weight (default 0.0).
+# Milvus uses its native analyzer + BM25 function; the embedded backend a local
+# inverted index. Raw BM25 scores are divided by the scale before blending.
+BM25_ANALYZER: str = os.getenv("BM25_ANALYZER", "standard")
+BM25_K1: float = float(os.getenv("BM25_K1", "1.2"))
+BM25_B: float = float(os.getenv("BM25_B", "0.75"))
+BM25_SCORE_SCALE: float = float(os.getenv("BM25_SCORE_SCALE", "10"))
+
+# Uploaded files are split into syntax-aware chunks that are embedded in one
+# batch and searched as separate code vectors; the budget caps the work.
+CODE_QUERY_CHUNK_BUDGET: int = int(os.getenv("CODE_QUERY_CHUNK_BUDGET", "16"))
+CODE_QUERY_CHUNK_CHARS: int = int(os.getenv("CODE_QUERY_CHUNK_CHARS", "2000"))
+
+# Optional cross‑encoder rerank stage (SearchRequest.rerank). Set
+# RERANKER_ONNX_PATH to a directory with model.onnx + tokenizer.json to run
+# through onnxruntime instead of torch.
+RERANKER_MODEL: str = os.getenv("RERANKER_MODEL", "BAAI/bge-reranker-v2-m3")
+RERANKER_ONNX_PATH: str = os.getenv("RERANKER_ONNX_PATH", "")
+RERANKER_BATCH_SIZE: int = int(os.getenv("RERANKER_BATCH_SIZE", "8"))
+RERANKER_MAX_LENGTH: int = int(os.getenv("RERANKER_MAX_LENGTH", "512"))
+RERANK_CANDIDATES: int = int(os.getenv("RERANK_CANDIDATES", "30"))
+RERANK_BUDGET_MS: float = float(os.getenv("RERANK_BUDGET_MS", "300"))
+# Load the reranker during warm-up. Otherwise the first rerank request starts
+# the load in the background and falls back to the blended order meanwhile.
+RERANKER_PRELOAD: bool = os.getenv("RERANKER_PRELOAD", "0").lower() not in ("0", "false", "no")
+
 # Ollama
 OLLAMA_API: str = os.getenv("OLLAMA_API", "http://localhost:11434/api/generate")
 
+# Several Ollama hosts (comma‑separated base URLs). Defaults to the host of
+# OLLAMA_API. Requests are routed to a host that already has the model loaded.
+OLLAMA_BACKENDS: list[str] = [
+    u.strip().rstrip("/")
+    for u in os.getenv("OLLAMA_BACKENDS", OLLAMA_API.split("/api/")[0]).split(",")
+    if u.strip()
+]
+OLLAMA_HEALTH_INTERVAL: float = float(os.getenv("OLLAMA_HEALTH_INTERVAL", "10"))
+
+# generator client: keep‑alive pool, per‑model concurrency and queue limits
+OLLAMA_POOL_SIZE: int = int(os.getenv("OLLAMA_POOL_SIZE", "16"))
+OLLAMA_MAX_CONCURRENCY: int = int(os.getenv("OLLAMA_MAX_CONCURRENCY", "2"))  # per model and backend
+OLLAMA_MAX_QUEUE: int = int(os.getenv("OLLAMA_MAX_QUEUE", "8"))
+OLLAMA_QUEUE_TIMEOUT: float = float(os.getenv("OLLAMA_QUEUE_TIMEOUT", "120"))
+OLLAMA_TIMEOUT: float = float(os.getenv("OLLAMA_TIMEOUT", "600"))
+
+# Server-side chat sessions (GeneratorRequest.session_id): LRU of in-memory
+# sessions with an idle TTL; past SESSION_COMPACT_CHARS all but the newest
+# SESSION_KEEP_TURNS turns are folded into a rolling summary (extractive, or
+# written by SESSION_SUMMARY_MODEL). SESSION_DIR persists them across
+# restarts and workers; app.serve requires it with more than one worker.
+SESSION_DIR: str = os.getenv("SESSION_DIR", "")
+SESSION_MAX_SESSIONS: int = int(os.getenv("SESSION_MAX_SESSIONS", "1000"))
+SESSION_TTL_SECONDS: float = float(os.getenv("SESSION_TTL_SECONDS", "86400"))
+SESSION_COMPACT_CHARS: int = int(os.getenv("SESSION_COMPACT_CHARS", "16000"))
+SESSION_KEEP_TURNS: int = int(os.getenv("SESSION_KEEP_TURNS", "4"))
+SESSION_SUMMARY_CHARS: int = int(os.getenv("SESSION_SUMMARY_CHARS", "4000"))
+SESSION_SUMMARY_MODEL: str = os.getenv("SESSION_SUMMARY_MODEL", "")
+
+# Pipelined /prompt/generate: warm the model while retrieval runs and keep it
+# resident for OLLAMA_KEEP_ALIVE. Per request via additional_options.pipelined.
+PIPELINED_GENERATION: bool = os.getenv("PIPELINED_GENERATION", "0").lower() in ("1", "true", "yes")
+OLLAMA_KEEP_ALIVE: str = os.getenv("OLLAMA_KEEP_ALIVE", "10m")
+
+# Cancellation of /prompt/generate and /prompt/enhance: the client connection
+# is polled every CANCEL_POLL_SECONDS while the pipeline runs. POST
+# /prompt/cancel/{request_id} cancels explicitly; with several workers it
+# leaves a marker in CANCEL_DIR for the worker that owns the request.
+CANCEL_POLL_SECONDS: float = float(os.getenv("CANCEL_POLL_SECONDS", "0.25"))
+CANCEL_DIR: str = os.getenv("CANCEL_DIR", str(PROJECT_ROOT / ".cache" / "cancel"))
+
+# --------------------------------------------------------------------------- #
+# startup
+# --------------------------------------------------------------------------- #
+
+# Load + warm up BGE‑M3 in a background thread at startup instead of on the
+# first /search request. /ready reports 503 until this has finished.
+EAGER_MODEL_LOAD: bool = os.getenv("EAGER_MODEL_LOAD", "1").lower() not in ("0", "false", "no")
+
+# --------------------------------------------------------------------------- #
+# multi‑worker serving
+# --------------------------------------------------------------------------- #
+
+# uvicorn worker count (uvicorn itself honours WEB_CONCURRENCY as well)
+WORKERS: int = int(os.getenv("WEB_CONCURRENCY", "1"))
+
+# Torch intra‑op threads for the process that runs BGE‑M3. Default splits the
+# cores evenly between workers so they don't oversubscribe the CPU.
+TORCH_NUM_THREADS: int = int(
+    os.getenv("TORCH_NUM_THREADS", max(1, (os.cpu_count() or 1) // max(1, WORKERS)))
+)
+
+# Shared embedding process: a unix socket path or host:port. Empty → every
+# worker loads its own copy of BGE‑M3 in‑process. The connection is pickle
+# based, so it is authenticated with EMBEDDER_AUTHKEY: app.serve generates a
+# random key per launch and hands it to its workers; a TCP address or a
+# separately started server needs an explicit key.
+EMBEDDER_ADDRESS: str = os.getenv("EMBEDDER_ADDRESS", "")
+EMBEDDER_AUTHKEY: bytes = os.getenv("EMBEDDER_AUTHKEY", "").encode()
+EMBEDDER_MAX_BATCH: int = int(os.getenv("EMBEDDER_MAX_BATCH", "32"))
+
+# --------------------------------------------------------------------------- #
+# persistent cache tier
+# --------------------------------------------------------------------------- #
+
+# SQLite file (WAL, memory-mapped reads) shared by all workers and kept across
+# restarts; empty disables it. Entries are evicted least recently used first
+# once CACHE_BUDGET_MB is exceeded; the most recently used CACHE_WARM_ENTRIES
+# are loaded into the in-process tier at startup. Namespaces: query
+# embeddings, search results and deterministic (temperature 0 or seeded)
+# generations.
+CACHE_PATH: str = os.getenv("CACHE_PATH", str(PROJECT_ROOT / ".cache" / "tier.sqlite"))
+CACHE_BUDGET_MB: int = int(os.getenv("CACHE_BUDGET_MB", "512"))
+CACHE_MMAP_MB: int = int(os.getenv("CACHE_MMAP_MB", "256"))
+CACHE_MEMORY_ENTRIES: int = int(os.getenv("CACHE_MEMORY_ENTRIES", "4096"))
+CACHE_WARM_ENTRIES: int = int(os.getenv("CACHE_WARM_ENTRIES", "2000"))
+CACHE_NAMESPACES: frozenset[str] = frozenset(
+    n.strip() for n in os.getenv("CACHE_NAMESPACES", "embedding,search,answer").split(",") if n.strip()
+)
+# part of every embedding cache key – change it when the model changes
+EMBEDDING_MODEL_ID: str = os.getenv("EMBEDDING_MODEL_ID", "BAAI/bge-m3")
+
+# --------------------------------------------------------------------------- #
+# cross-version change index
+# --------------------------------------------------------------------------- #
+
+# SQLite file with per-chunk fingerprints (content hash, float16 dense
+# vectors) of every ingested version and the added / removed / changed chunks
+# between adjacent versions, served by /search/diff; empty disables it.
+# Changed chunks whose embeddings moved less than CHANGE_MIN_DISTANCE (cosine
+# distance) are hidden by default – formatting and typo fixes.
+CHANGE_INDEX_PATH: str = os.getenv("CHANGE_INDEX_PATH", str(PROJECT_ROOT / ".cache" / "changes.sqlite"))
+CHANGE_MIN_DISTANCE: float = float(os.getenv("CHANGE_MIN_DISTANCE", "0.02"))
+
 # --------------------------------------------------------------------------- #
 # constants
 # --------------------------------------------------------------------------- #
@@ -0,0 +1,51 @@
+"""Change index fed from snapshot imports (numpy-backed entities)."""
+
+import pandas as pd
+import pytest
+
+import app.changes as changes
+from app.changes import ChangeIndex, ChunkRecorder
+from app.embedded.store import EmbeddedSchemaManager
+from app.registry import registry
+from app.snapshot import Snapshot, export_snapshot, import_snapshot
+from bench.fixture import make_fixture_csv
+
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    idx = ChangeIndex(tmp_path / "changes.sqlite")
+    monkeypatch.setattr(changes, "_index", idx)
+    monkeypatch.setattr(registry, "supported", lambda: ("v13.0.0", "v13.0.1"))
+    return idx
+
+
+def _snapshot(tmp_path, version, *, edit=False):
+    csv = make_fixture_csv(tmp_path / "csv" / f"{version}.csv", rows=40)
+    if edit:
+        df = pd.read_csv(csv)
+        df.loc[0, "text_content"] += " now cached by default"
+        df.drop(index=[1]).to_csv(csv, index=False)
+    export_snapshot(csv, tmp_path / "snapshots")
+    return tmp_path / "snapshots" / version
+
+
+def test_snapshot_import_records_chunks_and_pair(tmp_path, index):
+    mgr = EmbeddedSchemaManager("nextjs_docs", index_dir=tmp_path / "indexes")
+    import_snapshot(_snapshot(tmp_path, "v13.0.0"), mgr)
+    import_snapshot(_snapshot(tmp_path, "v13.0.1", edit=True), mgr)
+
+    stats = index.stats()
+    assert stats["versions"] == {"v13.0.0": 40, "v13.0.1": 39}
+    diff = index.diff("v13.0.0", "v13.0.1", min_distance=0.0)
+    assert {k: diff["counts"][k] for k in ("added", "removed", "changed")} == {"added": 0, "removed": 1, "changed": 1}
+    changed = next(c for c in diff["changes"] if c["status"] == "changed")
+    assert changed["to"]["text_content"].endswith("now cached by default")
+
+
+def test_recorder_accepts_mapped_vectors(tmp_path, index):
+    # the bulk-insert path fingerprints Snapshot.entities() directly
+    snap = Snapshot(_snapshot(tmp_path, "v13.0.0"))
+    recorder = ChunkRecorder(snap.version, index)
+    recorder.add_many(snap.entities())
+    recorder.commit()
+    assert index.stats()["versions"] == {"v13.0.0": 40}
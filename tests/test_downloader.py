@@ -0,0 +1,154 @@
+"""Download cache and offline mirrors (directory and tarball), no network."""
+
+import hashlib
+import tarfile
+
+import pytest
+
+from app.downloader.kaggle_downloader import KaggleDocumentationDownloader
+from app.downloader.sources import DirectorySource, HttpSource, Source, TarballSource, source_for
+
+CSV = b"title,text_content\nRouting,Pages live in app/\n"
+
+
+class _Reply:
+    def __init__(self, status, body=b"", headers=None):
+        self.status_code, self.body, self.headers = status, body, headers or {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise AssertionError(f"HTTP {self.status_code}")
+
+    def iter_content(self, _size):
+        yield self.body
+
+
+class _Mirror:
+    """Serves *body* under *etag* and honours Range / If-Range like a real server."""
+
+    def __init__(self, body, etag):
+        self.body, self.etag, self.requests = body, etag, []
+
+    def get(self, url, headers=None, **_kw):
+        headers = headers or {}
+        self.requests.append(headers)
+        rng = headers.get("Range")
+        if not rng or headers.get("If-Range") != self.etag:
+            return _Reply(200, self.body, {"ETag": self.etag})
+        start = int(rng[len("bytes="):-1])
+        if start >= len(self.body):
+            return _Reply(416, headers={"Content-Range": f"bytes */{len(self.body)}"})
+        return _Reply(206, self.body[start:], {"ETag": self.etag})
+
+
+@pytest.fixture
+def mirror(tmp_path):
+    root = tmp_path / "mirror"
+    root.mkdir()
+    (root / "v15.0.0.csv").write_bytes(CSV)
+    (root / "SHA256SUMS").write_text(f"{hashlib.sha256(CSV).hexdigest()}  v15.0.0.csv\n")
+    return root
+
+
+@pytest.fixture
+def tarball(tmp_path, mirror):
+    archive = tmp_path / "mirror.tar.gz"
+    with tarfile.open(archive, "w:gz") as tar:
+        for path in mirror.iterdir():
+            tar.add(path, arcname=f"nextjs/{path.name}")
+    return archive
+
+
+def _downloader(tmp_path, mirror):
+    return KaggleDocumentationDownloader(mirror=str(mirror), cache_dir=tmp_path / "cache")
+
+
+def test_source_for_picks_the_mirror_kind(tmp_path, mirror, tarball):
+    assert isinstance(source_for(str(mirror), dataset_id="x", partial_dir=tmp_path), DirectorySource)
+    assert isinstance(source_for(str(tarball), dataset_id="x", partial_dir=tmp_path), TarballSource)
+
+
+def test_unchanged_file_is_served_from_the_cache(tmp_path, mirror, monkeypatch):
+    dl = _downloader(tmp_path, mirror)
+    first = dl.load_and_save_version("15.0.0", tmp_path / "out1")
+    assert first.read_bytes() == CSV
+
+    def no_transfer(name):
+        raise AssertionError(f"'{name}' transferred again")
+
+    monkeypatch.setattr(dl.source, "open", no_transfer)
+    second = dl.load_and_save_version("v15.0.0", tmp_path / "out2")
+    assert second.read_bytes() == CSV
+
+
+def test_tarball_mirror_verifies_checksum_and_closes_archive(tmp_path, tarball, monkeypatch):
+    opened = []
+    real_open = tarfile.open
+    monkeypatch.setattr(tarfile, "open", lambda *a, **kw: opened.append(real_open(*a, **kw)) or opened[-1])
+
+    dl = _downloader(tmp_path, tarball)
+    assert dl.load_and_save_version("15.0.0", tmp_path / "out").read_bytes() == CSV
+    assert dl.source.expected_sha256("v15.0.0.csv") == hashlib.sha256(CSV).hexdigest()
+    with pytest.raises(FileNotFoundError):
+        dl.source.fingerprint("v14.0.0.csv")
+    assert opened and all(tar.closed for tar in opened)
+
+
+def test_checksum_mismatch_is_not_cached(tmp_path, mirror):
+    (mirror / "SHA256SUMS").write_text(f"{'0' * 64}  v15.0.0.csv\n")
+    dl = _downloader(tmp_path, mirror)
+    with pytest.raises(RuntimeError, match="Checksum mismatch"):
+        dl.load_and_save_version("15.0.0", tmp_path / "out")
+    assert dl.cache.lookup(dl.source.fingerprint("v15.0.0.csv")) is None
+
+
+def test_source_requires_every_abstract_method():
+    class Partial(Source):
+        def fingerprint(self, name):
+            return name
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+def _http(tmp_path, mirror, partial=b"", validator=None):
+    src = HttpSource("http://mirror.invalid/csv", tmp_path)
+    src._session = mirror
+    part = tmp_path / (hashlib.sha1(b"http://mirror.invalid/csv/v15.0.0.csv").hexdigest() + ".part")
+    if partial:
+        part.write_bytes(partial)
+    if validator is not None:
+        part.with_suffix(".validator").write_text(validator)
+    return src
+
+
+def _read(src):
+    with src.open("v15.0.0.csv") as fh:
+        return fh.read()
+
+
+def test_http_resume_appends_only_while_the_file_is_unchanged(tmp_path):
+    mirror = _Mirror(CSV, '"v1"')
+    assert _read(_http(tmp_path, mirror, CSV[:10], '"v1"')) == CSV
+    assert mirror.requests[-1] == {"Range": "bytes=10-", "If-Range": '"v1"'}
+
+    changed = _Mirror(CSV.upper(), '"v2"')
+    assert _read(_http(tmp_path, changed, CSV[:10], '"v1"')) == CSV.upper()
+    assert _read(_http(tmp_path, changed, CSV[:10])) == CSV.upper()  # no validator → no Range
+    assert changed.requests[-1] == {}
+
+
+def test_http_416_is_trusted_only_for_a_complete_partial(tmp_path):
+    mirror = _Mirror(CSV, '"v1"')
+    assert _read(_http(tmp_path, mirror, CSV, '"v1"')) == CSV
+
+    src = _http(tmp_path, _Mirror(CSV[:20], '"v1"'), CSV, '"v1"')
+    with pytest.raises(IOError):
+        _read(src)
+    assert not list(tmp_path.glob("*.part"))
@@ -0,0 +1,16 @@
+"""Embedded backend filter expressions (the Milvus subset)."""
+
+from app.embedded.filters import compile_filter
+
+
+def test_non_ascii_literals_match_verbatim():
+    assert compile_filter('title == "Größe"')({"title": "Größe"})
+    assert compile_filter('title like "日本%"')({"title": "日本語"})
+    assert not compile_filter('title like "日本%"')({"title": "中文"})
+
+
+def test_string_escapes():
+    assert compile_filter(r'title == "say \"hi\""')({"title": 'say "hi"'})
+    assert compile_filter(r"title == 'it\'s'")({"title": "it's"})
+    assert compile_filter(r'title == "a\\b"')({"title": "a\\b"})
+    assert compile_filter(r'title == "a\nb"')({"title": "a\nb"})
@@ -1,17 +1,17 @@
-from __future__ import annotations
-
 """Utility helpers used across the RAG‑in‑Next.js project.
     from utils import normalize_distance, generate
 """
 
+from __future__ import annotations
+
 from typing import List
 import ast
 import math
 import re
-import requests
 
-from config import OLLAMA_API
+from app.cancellation import CancelToken
 from app.classes.schemas import ChatHistory
+from app.generator.client import get_client
 
 __all__ = [
     # distance
@@ -19,6 +19,7 @@ __all__ = [
     # prompt helpers
     "parse_code_content",
     "place_snippets_in_text",
+    "render_chunk",
     "get_retrieved_data",
     "split_text_and_code",
     "history_string",
@@ -67,14 +68,15 @@ def place_snippets_in_text(text_content: str, code_content_json: list) -> str:
     return updated
 
 
+def render_chunk(chunk: dict) -> str:
+    """Re‑assemble one retrieved chunk (text with its code snippets inlined)."""
+    code_list = parse_code_content(chunk["code_content"])
+    return place_snippets_in_text(chunk["text_content"], code_list)
+
+
 def get_retrieved_data(chunks: List[dict]) -> str:
     """Re‑assemble original docs (text + code) into a single context string."""
-    data = []
-    for chunk in chunks:
-        code_list = parse_code_content(chunk["code_content"])
-        combined = place_snippets_in_text(chunk["text_content"], code_list)
-        data.append(combined)
-    return "\n\n".join(data)
+    return "\n\n".join(render_chunk(chunk) for chunk in chunks)
 
 
 def split_text_and_code(document: str):  # noqa: D401 – util splitter
@@ -125,9 +127,22 @@ def generate(
     context: List[dict],
     history: List[ChatHistory],
     options: dict | None = None,
+    *,
+    history_str: str | None = None,
+    rendered_context: str | None = None,
+    cancel: CancelToken | None = None,
 ):
-    """Query the Ollama API and return its JSON response augmented with titles."""
-    context_str = history_string(history) + get_retrieved_data(context)
+    """Query the Ollama API and return its JSON response augmented with titles.
+
+    *history_str* / *rendered_context* let a caller pass parts it already
+    serialised (see the pipelined generation mode). *cancel* is the request's
+    :class:`~app.cancellation.CancelToken`; it aborts the Ollama call.
+    """
+    if history_str is None:
+        history_str = history_string(history)
+    if rendered_context is None:
+        rendered_context = get_retrieved_data(context)
+    context_str = history_str + rendered_context
     full_prompt = f"""
 You are a helpful and friendly Next.js assistant.
 Answer **only** with information grounded in the context below. If unsure, reply "I don't know".
@@ -145,8 +160,6 @@ Question:\n{prompt}
     if options:
         payload["options"] = options
 
-    resp = requests.post(OLLAMA_API, json=payload, timeout=600)
-    resp.raise_for_status()
-    data = resp.json()
+    data = get_client().generate(payload, cancel=cancel)
     data["retrieved_data"] = _get_reference(context=context)
     return data
\ No newline at end of file